@@ -1,27 +1,34 @@
+import contextlib
 import streamlit as st
-from utils import load_file
-from data_processing import (
-    get_initial_info,  # Функция для получения начальной информации
-    create_plot,  # Функция для создания графика
+from utils import (
+    get_current_time_specific_info,  # Популярные категории в текущее время суток
 )
+from data_processing import create_plot  # Функция для создания графика
+from interaction_store import get_interaction_store  # Журнал взаимодействий
+from snapshot import load_snapshot  # Снимок предрассчитанного состояния
+from stats_updates import get_stats_updater  # Обновление статистики видео
+from title_embeddings import load_title_index  # Эмбеддинги названий видео
+from coviews import load_coview_index  # Совместные просмотры видео
+from user_state import UserState, get_user_state_store  # Состояния пользователей
+from compute_backends import available_backends  # Движки агрегаций
+from metrics import REGISTRY, profile, track  # Метрики этапов и профилирование
+from slate_sampler import SAMPLING_MODES, SlateSampler  # Выбор видео подборки
 from videos_interactions import (
     show_ten_videos,
     show_video_info,
 )  # Функции для работы с видео
 from recommendation_engine import (
     first_recommend_categories,  # Рекомендации категорий при первом запуске
-    recommend_categories,  # Рекомендации категорий на основе взаимодействий
+    CategoryWeights,  # Инкрементальные веса категорий пользователя
     recommend_subcategories,  # Рекомендации подкатегорий
 )
-import pandas as pd
 from datetime import datetime
 import uuid
-import numpy as np
 import plotly.express as px  # Добавляем plotly для визуализации
 
 
 # Функция для отображения страницы пользователя
-def display_page(df_logs_5, df_video, user_id):
+def display_page(snapshot, title_index, coview_index, user_id):
     # Кнопка "Обновить страницу" в боковой панели
     page_relaunch_button = st.sidebar.button(
         "Обновить страницу", key=f"update_page_{datetime.now()}"
@@ -37,9 +44,54 @@ def display_page(df_logs_5, df_video, user_id):
     if "first_launch" not in st.session_state:
         st.session_state.first_launch = True  # Устанавливаем флаг первого запуска
 
-    df_ranks, df_ranks_grouped = get_initial_info(
-        df_logs_5, df_video
-    )  # Получаем ранги категорий
+    # Ранги категорий и индексы из снимка, общего для всех сессий
+    videos = snapshot.videos
+    df_ranks, df_ranks_grouped = snapshot.df_ranks, snapshot.df_ranks_grouped
+    category_index = snapshot.category_index
+    time_cube = snapshot.time_cube
+    region_priors = snapshot.region_priors
+
+    # Состояние пользователя из общего хранилища, переживает переподключение
+    user_states = get_user_state_store()
+    # Позиции видео записей переводятся в позиции каталога текущего снимка
+    user_states.set_catalog(videos.df["video_code"].to_numpy())
+    user_state = user_states.get(user_id)
+    if (
+        "region" not in st.session_state
+        and user_state is not None
+        and user_state.region in region_priors
+    ):
+        st.session_state.region = user_state.region  # Продолжаем с прежним регионом
+
+    # Регион пользователя; без выбора используются общие ранги
+    region = st.sidebar.selectbox(
+        "Ваш регион",
+        options=[None, *region_priors.regions],
+        format_func=lambda region: "Не выбран" if region is None else region,
+        key="region",
+    )
+    # Режим выбора категорий подборки; генератор свой у каждой сессии
+    sampling_mode = st.sidebar.selectbox(
+        "Режим подборки",
+        options=SAMPLING_MODES,
+        format_func={
+            "proportional": "Пропорционально весам",
+            "epsilon_greedy": "Epsilon-greedy",
+            "thompson": "Thompson sampling",
+        }.get,
+        key="sampling_mode",
+    )
+    if st.session_state.get("slate_sampler_mode") != sampling_mode:
+        st.session_state.slate_sampler_mode = sampling_mode
+        st.session_state.slate_sampler = SlateSampler(category_index, sampling_mode)
+    sampler = st.session_state.slate_sampler
+
+    first_recommendation = first_recommend_categories(
+        df_ranks_grouped,
+        current_popularity=get_current_time_specific_info(time_cube, region),
+        region=region,
+        region_priors=region_priors,
+    )  # Первая рекомендация с учётом региона и времени суток
 
     # Если это первый запуск или нажата кнопка обновления страницы
     if st.session_state.first_launch:
@@ -52,17 +104,33 @@ def display_page(df_logs_5, df_video, user_id):
             st.plotly_chart(fig)  # Отображаем график
         st.session_state.first_launch = False  # Сбрасываем флаг после первого запуска
 
+    # Инкрементальные веса категорий текущего пользователя
+    # При смене региона веса пересчитываются от ранга нового региона
+    if user_state is None or user_state.region != region:
+        weights = CategoryWeights(
+            first_recommendation
+        )  # Начальные веса берём из первой рекомендации с учётом времени суток
+        weights.update_many(
+            get_interaction_store().user_history(user_id)
+        )  # Учитываем уже сохранённые взаимодействия пользователя
+        if user_state is None:
+            user_state = UserState(user_id, weights, region)
+        else:
+            user_state.weights, user_state.region = weights, region
+        user_states.put(user_state)
+
     # Проверка условия для вывода рекомендаций
     if st.session_state.first_launch:
-        number_videos_from_cat = first_recommend_categories(
-            df_ranks_grouped
-        )  # Первая рекомендация категорий
+        number_videos_from_cat = first_recommendation  # Первая рекомендация категорий
     else:
-        if "interactions_data" not in st.session_state:
-            st.session_state.interactions_data = pd.DataFrame()
-        number_videos_from_cat = recommend_categories(
-            df_ranks_grouped, st.session_state.interactions_data
-        )  # Рекомендации на основе взаимодействий
+        try:
+            with track("recommend_categories"):
+                number_videos_from_cat = (
+                    user_state.weights.recommend()
+                )  # Рекомендации на основе взаимодействий
+        except ValueError:
+            # Все веса обнулились — возвращаемся к первой рекомендации
+            number_videos_from_cat = first_recommendation
 
     # Визуализация вероятностей категорий в процентах
     with st.expander("Вероятности категорий в процентах", expanded=True):
@@ -84,17 +152,31 @@ def display_page(df_logs_5, df_video, user_id):
         )
         st.plotly_chart(fig_percentage)  # Отображаем график
 
+    # Подкатегории, близкие к понравившимся видео
+    liked_positions = user_state.liked_positions
+    if liked_positions:
+        with st.expander("Подкатегории, которые могут понравиться", expanded=False):
+            st.dataframe(
+                recommend_subcategories(title_index, liked_positions),
+                hide_index=True,
+            )
+
     # Инициализация 'selected_video' в session_state, если отсутствует
     if "selected_video" not in st.session_state:
         st.session_state.selected_video = None
     if st.session_state.selected_video is None:
         show_ten_videos(
-            st.session_state.df_video, number_videos_from_cat
+            videos.df,
+            number_videos_from_cat,
+            sampler,
+            user_state,
+            title_index,
+            coview_index,
         )  # Показать 10 видео
 
     # Отображаем информацию о видео, с которым пользователь взаимодействует
-    if st.session_state.selected_video:
-        show_video_info(df_video, user_id)
+    if st.session_state.selected_video is not None:
+        show_video_info(videos.df, user_state)
 
 
 # Основная функция Streamlit
@@ -105,27 +187,59 @@ def main():
         "Первый запуск может занять некоторое время. Пожалуйста, подождите..."
     )  # Сообщение о загрузке
 
-    # Загрузка логов
-    df_logs_5 = load_file("data/sample.parquet", file_type="parquet")
-    # Загрузка информации о видео
-    df_video = load_file("data/video_stat.parquet", file_type="parquet")
-    if "df_video" not in st.session_state:
-        st.session_state.df_video = (
-            df_video  # Сохранение информации о видео в session_state
+    # Движок агрегаций по логам: ?backend=duckdb или ?backend=polars в адресе
+    backend = st.query_params.get("backend", "pandas")
+    if backend not in available_backends():
+        st.sidebar.warning(
+            f"Движок агрегаций {backend} недоступен, используется pandas"
         )
+        backend = "pandas"
+    # Каталог, ранги категорий, индекс популярности, куб популярности по часам
+    # и ранги по регионам отображаются из снимка; снимок пересчитывается,
+    # только если изменились файлы логов или каталога
+    snapshot = load_snapshot("data/sample.parquet", "data/video_stat.parquet", backend)
+    # Статистика видео обновляется в фоне из файлов в data/video_stat.parquet.deltas/
+    get_stats_updater(snapshot, snapshot.path)
+    # Эмбеддинги названий, подкатегории и индекс похожих видео
+    title_index = load_title_index(
+        snapshot.videos.df, "data/video_stat.parquet", snapshot.videos.fingerprint
+    )
+    # Соседи видео по совместным просмотрам зрителей
+    coview_index = load_coview_index(
+        snapshot.videos.df,
+        "data/sample.parquet",
+        "data/video_stat.parquet",
+        snapshot.path,
+    )
 
     loading_message.empty()  # Удаление сообщения о загрузке
 
-    # Генерация уникального user_id и сохранение в session_state
+    # Генерация уникального user_id и сохранение в session_state;
+    # ?user_id=... в адресе продолжает сохранённое состояние пользователя
     if "user_id" not in st.session_state:
-        st.session_state.user_id = str(
+        st.session_state.user_id = st.query_params.get("user_id") or str(
             uuid.uuid4()
         )  # Генерация уникального ID пользователя
 
     user_id = st.session_state.user_id  # Получение ID пользователя
+    st.query_params["user_id"] = user_id  # После переподключения — та же сессия
+
+    # Профилирование одного перезапуска: ?profile=1 в адресе страницы
+    profile_path = None
+    if st.query_params.get("profile"):
+        del st.query_params["profile"]  # Следующие перезапуски не профилируем
+        profile_path = f"profile_{datetime.now():%Y%m%d_%H%M%S}.prof"
 
     # Отображаем страницу пользователя
-    display_page(df_logs_5, df_video, user_id)
+    with profile(profile_path) if profile_path else contextlib.nullcontext():
+        display_page(snapshot, title_index, coview_index, user_id)
+    if profile_path:
+        st.sidebar.info(f"Профиль перезапуска сохранён в {profile_path}")
+
+    # Выгрузка метрик этапов конвейера
+    with st.sidebar.expander("Метрики конвейера", expanded=False):
+        st.download_button("Prometheus", REGISTRY.to_prometheus(), "metrics.prom")
+        st.download_button("JSON Lines", REGISTRY.to_json_lines(), "metrics.jsonl")
 
 
 if __name__ == "__main__":
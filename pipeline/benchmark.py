@@ -0,0 +1,287 @@
+"""
+Бенчмарк этапов конвейера на синтетических данных разного масштаба.
+
+Для каждого масштаба логов генерирует данные (synthetic_data.py), замеряет
+время и пиковую память этапов load_file, get_initial_info,
+recommend_categories, выбора подборки show_ten_videos и
+log_user_interaction и пишет результаты в JSON Lines. Агрегации по логам
+(частичные суммы watchtime и куб популярности по часам) замеряются на
+каждом движке из --backends, а их результаты сверяются с первым движком.
+С флагом --baseline сравнивает результаты с прошлым прогоном и сообщает
+о регрессиях.
+
+Каждый этап выполняется в отдельном дочернем процессе (fork), поэтому
+кеши Streamlit не влияют на соседние замеры, а пиковая память этапа
+равна приросту максимального RSS дочернего процесса.
+
+Пример запуска из корня репозитория:
+    python pipeline/benchmark.py --scales 1e4 1e5 1e6 --output bench.jsonl
+    python pipeline/benchmark.py --scales 1e6 --baseline bench.jsonl
+    python pipeline/benchmark.py --scales 1e6 --backends pandas duckdb polars
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from compute_backends import BACKENDS, available_backends, canonical_frame
+from data_processing import aggregate_watchtime_partials, get_initial_info
+from interaction_store import InteractionStore
+from popularity_index import SeenSet, build_category_index
+from recommendation_engine import (
+    first_recommend_categories,
+    recommend_categories,
+    recommend_categories_batch,
+)
+from replay import synthetic_interactions
+from slate_sampler import SlateSampler
+from synthetic_data import generate_dataset
+from time_popularity import build_time_popularity_cube
+from utils import LOG_COLUMNS, VIDEO_COLUMNS, load_file
+from videos_interactions import select_slate
+
+
+def _max_rss_mb():
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux ru_maxrss в килобайтах, в macOS — в байтах
+    return max_rss / 2**20 if sys.platform == "darwin" else max_rss / 2**10
+
+
+def _run_stage(stage, connection):
+    start_rss = _max_rss_mb()
+    start = time.perf_counter()
+    rows = stage()
+    elapsed = time.perf_counter() - start
+    connection.send((elapsed, _max_rss_mb() - start_rss, rows))
+    connection.close()
+
+
+def measure(stage):
+    """
+    Выполняет этап в дочернем процессе и замеряет время и пиковую память.
+
+    Args:
+        stage (Callable[[], int]): Этап, возвращает число обработанных строк.
+
+    Returns:
+        dict: Время в секундах, прирост пикового RSS в МБ и число строк.
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_stage, args=(stage, sender))
+    process.start()
+    sender.close()  # Если этап упадёт, recv завершится EOFError
+    elapsed, peak_mb, rows = receiver.recv()
+    process.join()
+
+    return {"seconds": round(elapsed, 4), "peak_mb": round(peak_mb, 1), "rows": rows}
+
+
+def compare_backends(logs_path, df_video, backends):
+    """
+    Проверяет, что движки агрегаций дают одинаковые результаты.
+
+    Args:
+        logs_path (str): Путь к Parquet-файлу логов.
+        df_video (pd.DataFrame): DataFrame с данными о видео.
+        backends (list[str]): Движки; результаты сверяются с первым.
+
+    Raises:
+        RuntimeError: Результаты движка отличаются от первого.
+    """
+    reference = None
+    for backend in backends:
+        partials = aggregate_watchtime_partials([logs_path], df_video, backend=backend)
+        cube = build_time_popularity_cube([logs_path], df_video, backend=backend)
+        result = (
+            canonical_frame(partials, ["region", "category_id"]),
+            canonical_frame(cube.to_frame(), ["region", "hour", "category_id"]),
+        )
+        if reference is None:
+            reference = result
+        elif not all(a.equals(b) for a, b in zip(reference, result)):
+            raise RuntimeError(
+                f"Результаты движка {backend} отличаются от {backends[0]}"
+            )
+
+
+def benchmark_scale(log_rows, data_dir, seed=0, backends=("pandas",)):
+    """
+    Замеряет все этапы конвейера на логах заданного размера.
+
+    Args:
+        log_rows (int): Количество строк логов.
+        data_dir (str): Папка для синтетических данных.
+        seed (int): Зерно генератора случайных чисел.
+        backends (Sequence[str]): Движки агрегаций для сравнения.
+
+    Returns:
+        list[dict]: Результаты по этапам.
+    """
+    logs_path, videos_path = generate_dataset(data_dir, log_rows, seed=seed)
+
+    def load_cold():
+        for path in (logs_path, videos_path):
+            if os.path.exists(f"{path}.arrow"):
+                os.remove(f"{path}.arrow")  # Сбрасываем Arrow-копию
+        return len(load_file(logs_path, columns=LOG_COLUMNS)) + len(
+            load_file(videos_path, columns=VIDEO_COLUMNS)
+        )
+
+    def load_warm():
+        return len(load_file(logs_path, columns=LOG_COLUMNS)) + len(
+            load_file(videos_path, columns=VIDEO_COLUMNS)
+        )
+
+    results = {
+        "load_file_cold": measure(load_cold),
+        "load_file_warm": measure(load_warm),
+    }
+
+    # Данные для остальных этапов загружаются до fork и общие для них
+    df_logs = load_file(logs_path, columns=LOG_COLUMNS)
+    df_video = load_file(videos_path, columns=VIDEO_COLUMNS)
+    _, df_ranks_grouped = get_initial_info(df_logs, df_video)
+    prior = first_recommend_categories(df_ranks_grouped)
+    category_index = build_category_index(df_video)
+    n_users = max(min(log_rows // 100, 100_000), 10)
+    interactions = synthetic_interactions(df_video, n_users, 10, seed)
+    one_user = interactions[interactions["user_id"] == interactions["user_id"][0]]
+
+    def initial_info():
+        get_initial_info.clear()
+        get_initial_info(df_logs, df_video)
+        return len(df_logs)
+
+    def recommend_one():
+        recommend_categories.clear()
+        return len(recommend_categories(prior, one_user))
+
+    def recommend_batch():
+        return len(recommend_categories_batch(prior, interactions))
+
+    def slates():
+        sampler = SlateSampler(category_index, seed=seed)
+        for _ in range(100):
+            seen = SeenSet()
+            for _ in range(10):
+                select_slate(prior, sampler, seen)
+        return 1000
+
+    def log_interactions():
+        with tempfile.TemporaryDirectory() as tmp:
+            store = InteractionStore(os.path.join(tmp, "interactions.db"))
+            records = interactions.head(2000).to_dict("records")
+            for i in range(0, len(records), 2):
+                store.append(records[i : i + 2])  # Как одна отправка формы
+                if i % 20 == 0:
+                    store.user_history(records[i]["user_id"])
+            store.close()
+        return len(records)
+
+    results.update(
+        {
+            "get_initial_info": measure(initial_info),
+            "recommend_categories": measure(recommend_one),
+            "recommend_categories_batch": measure(recommend_batch),
+            "select_slate": measure(slates),
+            "log_user_interaction": measure(log_interactions),
+        }
+    )
+
+    # Агрегации по Parquet-файлу логов на каждом движке
+    for backend in backends:
+
+        def partials(backend=backend):
+            aggregate_watchtime_partials([logs_path], df_video, backend=backend)
+            return len(df_logs)
+
+        def time_cube(backend=backend):
+            build_time_popularity_cube([logs_path], df_video, backend=backend)
+            return len(df_logs)
+
+        results[f"watchtime_partials_{backend}"] = measure(partials)
+        results[f"time_cube_{backend}"] = measure(time_cube)
+
+    def backends_identical():
+        compare_backends(logs_path, df_video, list(backends))
+        return len(df_logs) * len(backends)
+
+    # Сверка тоже в дочернем процессе: пулы потоков DuckDB и Polars,
+    # созданные в родителе, не переживают следующий fork
+    results["compare_backends"] = measure(backends_identical)
+
+    return [
+        {"scale": log_rows, "stage": stage, **result}
+        for stage, result in results.items()
+    ]
+
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Находит этапы, ставшие медленнее или тяжелее прошлого прогона.
+
+    Args:
+        results (pd.DataFrame): Текущие результаты.
+        baseline (pd.DataFrame): Результаты прошлого прогона.
+        tolerance (float): Допустимое отношение к прошлому значению.
+
+    Returns:
+        pd.DataFrame: Этапы с регрессиями.
+    """
+    merged = results.merge(baseline, on=["scale", "stage"], suffixes=("", "_baseline"))
+    merged["time_ratio"] = merged["seconds"] / merged["seconds_baseline"]
+    merged["memory_ratio"] = (merged["peak_mb"] + 1) / (
+        merged["peak_mb_baseline"] + 1
+    )  # +1 МБ сглаживает шум на маленьких значениях
+
+    return merged[
+        (merged["time_ratio"] > tolerance) | (merged["memory_ratio"] > tolerance)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=float, nargs="+", default=[1e4, 1e5, 1e6])
+    parser.add_argument("--data-dir", default="data/synthetic")
+    parser.add_argument("--output", default=None, help="Файл JSON Lines")
+    parser.add_argument("--baseline", default=None, help="Прошлый JSON Lines")
+    parser.add_argument("--tolerance", type=float, default=1.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--backends", nargs="+", choices=BACKENDS, default=available_backends()
+    )
+    args = parser.parse_args()
+
+    rows = []
+    for scale in args.scales:
+        scale_rows = benchmark_scale(
+            int(scale), args.data_dir, args.seed, args.backends
+        )
+        for row in scale_rows:
+            print(json.dumps(row, ensure_ascii=False), flush=True)
+        rows.extend(scale_rows)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+    if args.baseline:
+        regressions = find_regressions(
+            pd.DataFrame(rows), pd.read_json(args.baseline, lines=True), args.tolerance
+        )
+        if not regressions.empty:
+            print("Регрессии относительно", args.baseline)
+            print(regressions[["scale", "stage", "time_ratio", "memory_ratio"]])
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
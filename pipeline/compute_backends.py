@@ -0,0 +1,213 @@
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import duckdb
+except ImportError:  # DuckDB — необязательная зависимость
+    duckdb = None
+
+try:
+    import polars as pl
+except ImportError:  # Polars — необязательная зависимость
+    pl = None
+
+# Движки агрегаций; pandas — эталонная реализация
+BACKENDS = ("pandas", "duckdb", "polars")
+
+
+def available_backends():
+    """
+    Возвращает движки агрегаций, доступные в текущем окружении.
+
+    Returns:
+        list[str]: Названия движков из BACKENDS.
+    """
+    installed = {"pandas": True, "duckdb": duckdb is not None, "polars": pl is not None}
+    return [backend for backend in BACKENDS if installed[backend]]
+
+
+def check_backend(backend):
+    """
+    Проверяет, что движок агрегаций известен и установлен.
+
+    Args:
+        backend (str): Название движка.
+
+    Raises:
+        ValueError: Движок неизвестен.
+        ImportError: Пакет движка не установлен.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный движок агрегаций: {backend}")
+    if backend not in available_backends():
+        raise ImportError(
+            f"Для движка {backend} установите пакет: pip install {backend}"
+        )
+
+
+def watchtime_partials(log_paths, df_video, backend):
+    """
+    Считает суммы watchtime по региону и категории запросом к Parquet-файлам.
+
+    Логи читаются движком напрямую из файлов в несколько потоков и
+    соединяются с каталогом по video_id (inner join), как в
+    aggregate_watchtime_partials.
+
+    Args:
+        log_paths (list[str]): Пути к Parquet-файлам логов.
+        df_video (pd.DataFrame): DataFrame с данными о видео.
+        backend (str): "duckdb" или "polars".
+
+    Returns:
+        pd.DataFrame: Частичные суммы с колонками 'region', 'category_id',
+            'watchtime_sum', 'watchtime_count'.
+    """
+    check_backend(backend)
+    if backend == "duckdb":
+        return (
+            _duckdb_connection(df_video)
+            .execute(
+                """
+                SELECT l.region, c.category_id,
+                       COALESCE(SUM(l.watchtime), 0) AS watchtime_sum,
+                       COUNT(l.watchtime) AS watchtime_count
+                FROM read_parquet(?) AS l JOIN catalog AS c USING (video_id)
+                WHERE l.region IS NOT NULL AND c.category_id IS NOT NULL
+                GROUP BY l.region, c.category_id
+                """,
+                [list(log_paths)],
+            )
+            .df()
+        )
+    if backend == "polars":
+        return (
+            pl.scan_parquet(list(log_paths))
+            .select(*_polars_keys("video_id", "region"), "watchtime")
+            .join(_polars_catalog(df_video), on="video_id", how="inner")
+            .filter(
+                pl.col("region").is_not_null() & pl.col("category_id").is_not_null()
+            )
+            .group_by("region", "category_id")
+            .agg(
+                watchtime_sum=pl.col("watchtime").sum(),
+                watchtime_count=pl.col("watchtime").count(),
+            )
+            .collect()
+            .to_pandas()
+        )
+    raise ValueError(f"Движок {backend} не выполняет запросы к файлам")
+
+
+def hourly_category_views(log_paths, df_video, backend, timezone):
+    """
+    Считает просмотры по региону, часу суток и категории запросом к Parquet-файлам.
+
+    Час округляется до ближайшего по времени логов, как в rounded_hours.
+
+    Args:
+        log_paths (list[str]): Пути к Parquet-файлам логов.
+        df_video (pd.DataFrame): DataFrame с данными о видео.
+        backend (str): "duckdb" или "polars".
+        timezone (str): Часовой пояс логов для событий с часовым поясом.
+
+    Returns:
+        pd.DataFrame: DataFrame с колонками 'region', 'hour', 'category_id', 'views'.
+    """
+    check_backend(backend)
+    if backend == "duckdb":
+        return (
+            _duckdb_connection(df_video, timezone)
+            .execute(
+                """
+                SELECT l.region,
+                       (hour(l.event_timestamp)
+                        + CAST(minute(l.event_timestamp) >= 30 AS INTEGER)) % 24
+                           AS hour,
+                       c.category_id,
+                       COUNT(*) AS views
+                FROM read_parquet(?) AS l JOIN catalog AS c USING (video_id)
+                WHERE l.region IS NOT NULL AND c.category_id IS NOT NULL
+                GROUP BY ALL
+                """,
+                [list(log_paths)],
+            )
+            .df()
+        )
+    if backend == "polars":
+        logs = pl.scan_parquet(list(log_paths))
+        timestamp = pl.col("event_timestamp")
+        if logs.collect_schema()["event_timestamp"].time_zone is not None:
+            timestamp = timestamp.dt.convert_time_zone(timezone)
+        hour = (
+            timestamp.dt.hour().cast(pl.Int64)
+            + (timestamp.dt.minute() >= 30).cast(pl.Int64)
+        ) % 24
+        return (
+            logs.select(*_polars_keys("video_id", "region"), hour.alias("hour"))
+            .join(_polars_catalog(df_video), on="video_id", how="inner")
+            .filter(
+                pl.col("region").is_not_null() & pl.col("category_id").is_not_null()
+            )
+            .group_by("region", "hour", "category_id")
+            .agg(views=pl.len())
+            .collect()
+            .to_pandas()
+        )
+    raise ValueError(f"Движок {backend} не выполняет запросы к файлам")
+
+
+def canonical_frame(df, keys):
+    """
+    Приводит результат агрегации к виду для сравнения между движками.
+
+    Ключи переводятся в строки или int64, значения — в float64,
+    строки сортируются по ключам.
+
+    Args:
+        df (pd.DataFrame): Результат агрегации.
+        keys (list[str]): Колонки-ключи группировки.
+
+    Returns:
+        pd.DataFrame: Отсортированный DataFrame с единообразными типами.
+    """
+    df = df.copy()
+    for column in df.columns:
+        if column not in keys:
+            df[column] = df[column].astype("float64")
+        elif pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = df[column].astype("int64")
+        else:
+            df[column] = df[column].astype(str).astype(object)
+    return df.sort_values(keys).reset_index(drop=True)[list(df.columns)]
+
+
+def _catalog_table(df_video):
+    """
+    Возвращает video_id и category_id каталога Arrow-таблицей со строками.
+    """
+    return pa.table(
+        {
+            column: pa.array(
+                df_video[column].astype(object), pa.string(), from_pandas=True
+            )
+            for column in ["video_id", "category_id"]
+        }
+    )
+
+
+def _duckdb_connection(df_video, timezone="UTC"):
+    connection = duckdb.connect()
+    # Час событий с часовым поясом считается по времени логов
+    connection.execute(f"SET TimeZone = '{timezone}'")
+    connection.register("catalog", _catalog_table(df_video))
+    return connection
+
+
+def _polars_catalog(df_video):
+    return pl.from_arrow(_catalog_table(df_video)).lazy()
+
+
+def _polars_keys(*columns):
+    # Колонки со словарём в Parquet читаются как Categorical, а соединение —
+    # по строкам
+    return [pl.col(column).cast(pl.String) for column in columns]
@@ -0,0 +1,341 @@
+"""
+Рекомендации «зрители этого видео смотрели также» по совместным просмотрам.
+
+Логи читаются пакетами, просмотры каждого зрителя упорядочиваются по
+времени, и пары видео, просмотренных одним зрителем в пределах окна из
+нескольких соседних просмотров, суммируются в разреженную матрицу
+видео × видео (SciPy CSR) по частям. В каждой строке остаются top-k
+соседей по числу совместных просмотров; результат хранится массивами
+CSR, отображаемыми в память.
+
+Пример запуска из корня репозитория:
+    python pipeline/coviews.py --logs data/sample.parquet --videos data/video_stat.parquet
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+from scipy import sparse
+
+from id_interning import code_positions, interner_path, load_interner, lookup_positions
+from utils import VIDEO_COLUMNS, dataset_fingerprint, load_dataset
+
+
+class CoViewIndex:
+    """
+    Соседи видео по совместным просмотрам в формате CSR.
+
+    Соседи видео на позиции p лежат в indices[indptr[p]:indptr[p + 1]]
+    по убыванию числа совместных просмотров counts, поэтому поиск — это
+    срез массивов без вычислений.
+    """
+
+    def __init__(self, indptr, indices, counts, ids=None, video_codes=None):
+        self.indptr = indptr  # Границы строк, int64 (видео + 1)
+        self.indices = indices  # Позиции соседей в каталоге, int32
+        self.counts = counts  # Число совместных просмотров, float32
+        self.ids = ids  # Словарь ID, которым закодирован каталог
+        self.video_codes = video_codes  # Позиция в каталоге → код видео
+        # Код видео → позиция в каталоге
+        self.positions_by_code = (
+            None if video_codes is None else code_positions(video_codes)
+        )
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def position(self, video_id):
+        """
+        Возвращает позицию видео в каталоге.
+
+        Args:
+            video_id (str): ID видео.
+
+        Returns:
+            int: Позиция видео или -1, если его нет в каталоге.
+        """
+        code = self.ids.encode("video_id", [video_id], add=False)
+        return int(lookup_positions(self.positions_by_code, code)[0])
+
+    def neighbours(self, position, k=10, seen=None):
+        """
+        Возвращает позиции видео, которые чаще всего смотрели вместе с данным.
+
+        Args:
+            position (int): Позиция видео в каталоге.
+            k (int): Количество видео.
+            seen (SeenSet, optional): Позиции видео, которые нужно пропустить.
+
+        Returns:
+            np.ndarray: Позиции соседей по убыванию числа совместных просмотров.
+        """
+        if not 0 <= position < len(self) or k < 1:
+            return np.empty(0, dtype=np.int32)
+        candidates = self.indices[self.indptr[position] : self.indptr[position + 1]]
+        if seen:
+            candidates = candidates[~seen.contains(candidates)]
+        return np.asarray(candidates[:k])
+
+    def save(self, path):
+        """
+        Сохраняет массивы CSR в папку.
+
+        Args:
+            path (str): Папка индекса.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ("indptr", "indices", "counts"):
+            tmp_path = os.path.join(path, f"{name}.{os.getpid()}.tmp.npy")
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, os.path.join(path, f"{name}.npy"))
+
+    @classmethod
+    def load(cls, path, ids=None, video_codes=None):
+        """
+        Загружает индекс из папки, отображая массивы в память.
+
+        Args:
+            path (str): Папка индекса.
+            ids (IdInterner, optional): Словарь ID каталога.
+            video_codes (np.ndarray, optional): Коды видео каталога по позициям.
+
+        Returns:
+            CoViewIndex: Загруженный индекс.
+        """
+        return cls(
+            *(
+                np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in ("indptr", "indices", "counts")
+            ),
+            ids=ids,
+            video_codes=video_codes,
+        )
+
+
+def build_coview_index(
+    log_paths,
+    df_video,
+    ids,
+    window=5,
+    top_k=50,
+    batch_size=1_000_000,
+    chunk_rows=1_000_000,
+):
+    """
+    Строит индекс совместных просмотров по логам.
+
+    Пара видео учитывается, если один зритель посмотрел их с разницей
+    не больше window просмотров; матрица симметрична, повторные
+    просмотры одного видео подряд не учитываются.
+
+    Args:
+        log_paths (list[str]): Пути к Parquet-файлам логов.
+        df_video (pd.DataFrame): DataFrame с данными о видео и колонкой video_code.
+        ids (IdInterner): Словарь ID, которым закодирован каталог
+            (только для поиска видео, не пополняется).
+        window (int): Окно соседних просмотров зрителя.
+        top_k (int): Количество соседей, сохраняемых для каждого видео.
+        batch_size (int): Количество строк в одном пакете чтения.
+        chunk_rows (int): Количество просмотров в одной части матрицы.
+
+    Returns:
+        CoViewIndex: Индекс совместных просмотров.
+    """
+    n_videos = len(df_video)
+    # Код видео → позиция в каталоге по тому же словарю, что и у каталога
+    positions_by_code = code_positions(df_video["video_code"])
+
+    # Компактные столбцы просмотров: номер зрителя, позиция видео, время.
+    # Номер зрителя — код в словаре его пакета со сдвигом на размер
+    # словарей предыдущих пакетов; общий словарь ID зрителей не пополняется
+    users, positions, timestamps = [], [], []
+    user_categories, n_user_categories = [], 0
+    for path in log_paths:
+        parquet_file = pq.ParquetFile(path, read_dictionary=["user_id", "video_id"])
+        for batch in parquet_file.iter_batches(
+            batch_size=batch_size, columns=["user_id", "video_id", "event_timestamp"]
+        ):
+            df_batch = batch.to_pandas()
+            # Коды видео ищутся в словаре только для значений словаря
+            # пакета; код -1 (пропуск) попадает на последний элемент -1
+            video_ids = df_batch["video_id"].astype("category")
+            batch_positions = np.append(
+                lookup_positions(
+                    positions_by_code,
+                    ids.encode("video_id", video_ids.cat.categories, add=False),
+                ),
+                -1,
+            )[video_ids.cat.codes.to_numpy()]
+            user_ids = df_batch["user_id"].astype("category")
+            batch_users = user_ids.cat.codes.to_numpy().astype(np.int64)
+            found = (batch_positions >= 0) & (batch_users >= 0)
+            users.append(batch_users[found] + n_user_categories)
+            user_categories.append(user_ids.cat.categories.to_numpy())
+            n_user_categories += len(user_ids.cat.categories)
+            positions.append(batch_positions[found].astype(np.int32))
+            timestamps.append(
+                df_batch["event_timestamp"].to_numpy(dtype="datetime64[ns]")[found]
+            )
+    # Один зритель в разных пакетах получает один номер
+    user_keys = pd.factorize(
+        np.concatenate(user_categories) if user_categories else np.empty(0, object)
+    )[0].astype(np.int32)
+    users = user_keys[np.concatenate(users)] if users else np.empty(0, np.int32)
+    positions = np.concatenate(positions) if positions else np.empty(0, np.int32)
+    timestamps = np.concatenate(timestamps) if timestamps else np.empty(0, "M8[ns]")
+
+    # Просмотры каждого зрителя подряд и по времени
+    order = np.lexsort((timestamps, users))
+    users, positions = users[order], positions[order]
+    del timestamps, order
+
+    matrix = sparse.csr_array((n_videos, n_videos), dtype=np.float32)
+    for start in range(0, len(users), chunk_rows):
+        stop = min(start + chunk_rows, len(users))
+        # Пары, начинающиеся в части, могут заканчиваться в следующих window строках
+        chunk_users = users[start : stop + window]
+        chunk_positions = positions[start : stop + window]
+        rows, cols = [], []
+        for offset in range(1, window + 1):
+            left = np.arange(min(stop - start, len(chunk_users) - offset))
+            pair = (chunk_users[left] == chunk_users[left + offset]) & (
+                chunk_positions[left] != chunk_positions[left + offset]
+            )
+            a = chunk_positions[left[pair]]
+            b = chunk_positions[left[pair] + offset]
+            rows += [a, b]  # Матрица симметрична
+            cols += [b, a]
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        matrix = matrix + sparse.csr_array(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(n_videos, n_videos),
+        )
+
+    return _prune_top_k(matrix, top_k)
+
+
+def _prune_top_k(matrix, top_k):
+    """
+    Оставляет в каждой строке CSR-матрицы top_k элементов по убыванию.
+    """
+    matrix.sum_duplicates()
+    indptr, indices, counts = matrix.indptr, matrix.indices, matrix.data
+    row_lengths = np.diff(indptr)
+    rows = np.repeat(np.arange(len(row_lengths)), row_lengths)
+
+    # Внутри строки: по убыванию числа просмотров, при равенстве — по позиции
+    # (индексы строки уже упорядочены, а сортировка по одному целому ключу
+    # устойчива)
+    matrix.sort_indices()
+    top = int(counts.max(initial=0))
+    key = rows.astype(np.int64) * (top + 1) + (top - counts.astype(np.int64))
+    order = np.argsort(key, kind="stable")
+    rank = np.arange(len(order)) - indptr[rows]
+    keep = order[rank < top_k]
+
+    return CoViewIndex(
+        np.concatenate([[0], np.cumsum(np.minimum(row_lengths, top_k))]).astype(
+            np.int64
+        ),
+        indices[keep].astype(np.int32),
+        counts[keep].astype(np.float32),
+    )
+
+
+@st.cache_resource
+def load_coview_index(_df_video, logs_path, videos_path, snapshot_path):
+    """
+    Возвращает общий для всех сессий индекс совместных просмотров.
+
+    Индекс хранится в папке рядом с логами и перестраивается, если
+    изменился файл логов или каталога: позиции соседей — позиции строк
+    каталога, по которому индекс построен. Кеш привязан к снимку, поэтому
+    новый снимок с другим каталогом получает и новый индекс.
+
+    Args:
+        _df_video (pd.DataFrame): DataFrame с данными о видео (не хешируется).
+        logs_path (str): Путь к Parquet-файлу логов.
+        videos_path (str): Путь к Parquet-файлу каталога.
+        snapshot_path (str): Папка снимка, по которому загружен каталог,
+            ключ кеша.
+
+    Returns:
+        CoViewIndex: Индекс совместных просмотров.
+    """
+    # Позиции видео ищутся по словарю, которым закодирован каталог
+    ids = load_interner(interner_path(videos_path))
+    path = f"{logs_path}.coviews"
+    meta_file = os.path.join(path, "meta.json")
+    if os.path.exists(meta_file):
+        with open(meta_file) as file:
+            meta = json.load(file)
+        if meta.get("fingerprints") == _fingerprints(logs_path, videos_path) and (
+            meta["n_videos"] == len(_df_video)
+        ):
+            return CoViewIndex.load(path, ids, _df_video["video_code"].to_numpy())
+    return _build_and_save(logs_path, videos_path, _df_video, path)
+
+
+def _fingerprints(logs_path, videos_path):
+    return {
+        "logs": dataset_fingerprint(logs_path),
+        "videos": dataset_fingerprint(videos_path),
+    }
+
+
+def _build_and_save(logs_path, videos_path, df_video, path, window=5, top_k=50):
+    ids = load_interner(interner_path(videos_path))
+    index = build_coview_index([logs_path], df_video, ids, window, top_k)
+    index.save(path)
+    # Метаданные пишутся последними: по ним проверяется актуальность индекса
+    meta = {
+        "fingerprints": _fingerprints(logs_path, videos_path),
+        "n_videos": len(df_video),
+        "window": window,
+        "top_k": top_k,
+    }
+    tmp_file = os.path.join(path, f"meta.{os.getpid()}.tmp.json")
+    with open(tmp_file, "w") as file:
+        json.dump(meta, file)
+    os.replace(tmp_file, os.path.join(path, "meta.json"))
+    return CoViewIndex(
+        index.indptr,
+        index.indices,
+        index.counts,
+        ids,
+        df_video["video_code"].to_numpy(),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logs", default="data/sample.parquet")
+    parser.add_argument("--videos", default="data/video_stat.parquet")
+    parser.add_argument("--window", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=50)
+    args = parser.parse_args()
+
+    df_video = load_dataset(args.videos, columns=VIDEO_COLUMNS).df
+    start = time.perf_counter()
+    index = _build_and_save(
+        args.logs,
+        args.videos,
+        df_video,
+        f"{args.logs}.coviews",
+        args.window,
+        args.top_k,
+    )
+    print(
+        f"Индекс совместных просмотров: {len(index.indices)} пар "
+        f"за {time.perf_counter() - start:.1f} с"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,148 @@
+import hashlib
+import json
+import os
+
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import streamlit as st
+import pyarrow as pa
+import pyarrow.parquet as pq
+from compute_backends import check_backend, watchtime_partials
+from metrics import cached
+from utils import DATASET_HASH_FUNCS, DatasetHandle, as_frame, dataset_fingerprint
 
 
-@st.cache_data
-def get_initial_info(df_logs_5, df_video):
+@cached(
+    "get_initial_info",
+    rows=lambda df_logs_5, df_video, backend="pandas": len(df_logs_5),
+    hash_funcs=DATASET_HASH_FUNCS,
+    max_entries=16,
+)
+def get_initial_info(df_logs_5, df_video, backend="pandas"):
     """
     Получает начальную информацию, объединяя логи и данные о видео.
 
     Args:
-        df_logs_5 (pd.DataFrame): DataFrame с логами просмотров видео.
-        df_video (pd.DataFrame): DataFrame с данными о видео.
+        df_logs_5 (DatasetHandle | pd.DataFrame): Логи просмотров видео.
+        df_video (DatasetHandle | pd.DataFrame): Данные о видео.
+        backend (str): Движок агрегаций из BACKENDS. Движки, кроме pandas,
+            читают логи из Parquet-файла, поэтому логи передаются DatasetHandle.
 
     Returns:
         tuple: DataFrame с рангами категорий и агрегированными рангами.
     """
-    # Объединение данных по video_id
-    df_merged = pd.merge(
-        df_logs_5[["video_id", "region", "watchtime"]],
-        df_video[["video_id", "category_id"]],
-        on="video_id",
-        how="inner",
-    )
+    if backend != "pandas":
+        if not isinstance(df_logs_5, DatasetHandle):
+            raise ValueError(f"Движку {backend} нужны логи из load_dataset")
+        return ranks_from_partials(
+            aggregate_watchtime_partials(
+                [df_logs_5.path], as_frame(df_video), backend=backend
+            )
+        )
+
+    df_logs_5, df_video = as_frame(df_logs_5), as_frame(df_video)
+    video_codes, log_video_codes = _video_join_codes(df_logs_5, df_video)
+
+    # Категория видео по коду video_id: позиционный поиск вместо merge
+    category_codes, categories = _factorize_sorted(df_video["category_id"])
+    category_by_video = np.full(
+        max(video_codes.max(initial=-1), log_video_codes.max(initial=-1)) + 2,
+        -1,
+        dtype=np.int64,
+    )  # Последний элемент соответствует коду -1 (видео нет в каталоге)
+    category_by_video[video_codes] = category_codes
+    log_categories = category_by_video[log_video_codes]
+    region_codes, regions = _factorize_sorted(df_logs_5["region"])
 
-    # Вычисление среднего watchtime для каждой категории по каждому региону
-    df_avg_watchtime = df_merged.groupby(["region", "category_id"], as_index=False).agg(
-        avg_watchtime=("watchtime", "mean")
+    # Аналог inner join и группировки по (регион, категория) на кодах
+    found = (log_categories >= 0) & (region_codes >= 0)
+    keys = region_codes[found] * len(categories) + log_categories[found]
+    watchtime = df_logs_5["watchtime"].to_numpy(dtype="float64")[found]
+    valid = ~np.isnan(watchtime)
+    size = len(regions) * len(categories)
+    rows = np.bincount(keys, minlength=size)
+    counts = np.bincount(keys[valid], minlength=size)
+    sums = np.bincount(keys[valid], weights=watchtime[valid], minlength=size)
+
+    # Вычисление среднего watchtime для каждой категории по каждому региону;
+    # порядок ключей совпадает с groupby: регион, затем категория
+    present = np.flatnonzero(rows)
+    with np.errstate(invalid="ignore"):
+        avg_watchtime = sums[present] / counts[present]
+    df_avg_watchtime = pd.DataFrame(
+        {
+            "region": regions[present // len(categories)],
+            "category_id": categories[present % len(categories)],
+            "avg_watchtime": avg_watchtime,
+        }
     )
 
+    return _rank_categories(df_avg_watchtime)
+
+
+def _factorize_sorted(values):
+    """
+    Кодирует значения с кодами в лексикографическом порядке значений.
+
+    Порядок не зависит от порядка словаря категориальной колонки, поэтому
+    группы упорядочены так же, как при группировке строк.
+
+    Args:
+        values (pd.Series): Значения.
+
+    Returns:
+        tuple: Коды (-1 для пропусков) и уникальные значения (np.ndarray).
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.cat.reorder_categories(values.cat.categories.sort_values())
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def _video_join_codes(df_logs, df_video):
+    """
+    Возвращает целочисленные ключи соединения логов с каталогом по video_id.
+
+    Если оба набора загружены через load_dataset, используются коды
+    video_code из словаря ID. Иначе ключом служит позиция видео в каталоге,
+    а каждое уникальное video_id логов ищется в каталоге один раз.
+
+    Args:
+        df_logs (pd.DataFrame): Логи просмотров видео.
+        df_video (pd.DataFrame): Данные о видео.
+
+    Returns:
+        tuple: Коды видео каталога и коды видео логов (-1 — нет в каталоге).
+    """
+    if "video_code" in df_logs.columns and "video_code" in df_video.columns:
+        return df_video["video_code"].to_numpy(), df_logs["video_code"].to_numpy()
+
+    video_ids = df_logs["video_id"].astype("category")
+    positions = pd.Index(df_video["video_id"]).get_indexer(video_ids.cat.categories)
+    codes = video_ids.cat.codes.to_numpy()
+    return np.arange(len(df_video)), np.where(codes >= 0, positions[codes], -1)
+
+
+def _rank_categories(df_avg_watchtime):
+    """
+    Ранжирует категории по среднему watchtime внутри каждого региона.
+
+    Args:
+        df_avg_watchtime (pd.DataFrame): DataFrame с колонками 'region',
+            'category_id' и 'avg_watchtime'.
+
+    Returns:
+        tuple: DataFrame с рангами категорий и агрегированными рангами.
+    """
     # Определение топ-10 категорий по каждому региону
-    df_avg_watchtime["rank"] = df_avg_watchtime.groupby("region")["avg_watchtime"].rank(
-        method="first", ascending=False
-    )
+    df_avg_watchtime["rank"] = df_avg_watchtime.groupby("region", observed=True)[
+        "avg_watchtime"
+    ].rank(method="first", ascending=False)
 
     # Найдём средний ранг для каждой категории
     df_ranks_grouped = (
-        df_avg_watchtime.groupby("category_id")
+        df_avg_watchtime.groupby("category_id", observed=True)
         .agg(avg_rank=("rank", "mean"))
         .reset_index()
     )
@@ -55,7 +161,218 @@ def get_initial_info(df_logs_5, df_video):
     )  # Возвращаем DataFrame с рангами категорий и агрегированными рангами
 
 
-@st.cache_data
+def aggregate_watchtime_partials(
+    log_paths, df_video, partials=None, batch_size=1_000_000, backend="pandas"
+):
+    """
+    Потоково считает частичные суммы watchtime по региону и категории.
+
+    Parquet-файлы логов читаются пакетами строк и только нужными колонками,
+    поэтому в памяти одновременно находится один пакет и частичные суммы.
+    Движки duckdb и polars выполняют ту же агрегацию многопоточным запросом
+    к файлам; pandas остаётся эталонной реализацией.
+
+    Args:
+        log_paths (list[str]): Пути к Parquet-файлам логов.
+        df_video (pd.DataFrame): DataFrame с данными о видео.
+        partials (pd.DataFrame, optional): Уже накопленные частичные суммы.
+        batch_size (int): Количество строк в одном пакете.
+        backend (str): Движок агрегаций из BACKENDS.
+
+    Returns:
+        pd.DataFrame: Частичные суммы с колонками 'region', 'category_id',
+            'watchtime_sum', 'watchtime_count'.
+    """
+    check_backend(backend)
+    if backend != "pandas":
+        chunks = [] if partials is None else [partials]
+        if log_paths:
+            chunks.append(watchtime_partials(log_paths, df_video, backend))
+        return _combine_partials(chunks)
+
+    # Соответствие video_id → код категории вместо merge с каталогом
+    video_index = pd.Index(df_video["video_id"])
+    category_codes, categories = pd.factorize(df_video["category_id"])
+
+    chunks = [] if partials is None else [partials]
+    for path in log_paths:
+        parquet_file = pq.ParquetFile(path, read_dictionary=["video_id", "region"])
+        for batch in parquet_file.iter_batches(
+            batch_size=batch_size, columns=["video_id", "region", "watchtime"]
+        ):
+            df_batch = batch.to_pandas()
+            video_ids = df_batch["video_id"].astype("category")
+            # Ищем каждое уникальное video_id пакета в каталоге один раз
+            positions = video_index.get_indexer(video_ids.cat.categories)[
+                video_ids.cat.codes.to_numpy()
+            ]
+            found = positions >= 0  # Аналог inner join
+            found[found] = category_codes[positions[found]] >= 0  # Без категории
+
+            chunk = (
+                pd.DataFrame(
+                    {
+                        "region": df_batch["region"][found].to_numpy(),
+                        "category_id": categories[category_codes[positions[found]]],
+                        "watchtime": df_batch["watchtime"][found].to_numpy(),
+                    }
+                )
+                .groupby(["region", "category_id"], as_index=False, observed=True)
+                .agg(
+                    watchtime_sum=("watchtime", "sum"),
+                    watchtime_count=("watchtime", "count"),
+                )
+            )
+            chunks.append(chunk)
+            # Сворачиваем накопленное, чтобы память не росла с числом пакетов
+            chunks = [_combine_partials(chunks)]
+
+    return _combine_partials(chunks)
+
+
+def _combine_partials(chunks):
+    """
+    Складывает несколько наборов частичных сумм в один.
+    """
+    if not chunks:
+        return pd.DataFrame(
+            columns=["region", "category_id", "watchtime_sum", "watchtime_count"]
+        )
+    return (
+        pd.concat(chunks, ignore_index=True)
+        .groupby(["region", "category_id"], as_index=False, observed=True)
+        .agg(
+            watchtime_sum=("watchtime_sum", "sum"),
+            watchtime_count=("watchtime_count", "sum"),
+        )
+    )
+
+
+def update_watchtime_partials(log_paths, df_video, partials_path, backend="pandas"):
+    """
+    Обновляет сохранённые частичные суммы только новыми файлами логов.
+
+    Отпечатки уже учтённых файлов и отпечаток каталога хранятся в
+    метаданных Parquet-файла с частичными суммами, поэтому добавление
+    нового дня не требует пересчёта предыдущих. Если учтённый файл
+    изменился или исчез из списка либо изменились категории видео,
+    суммы пересчитываются заново. Файл пишется под временным именем
+    и атомарно подменяет прежний.
+
+    Args:
+        log_paths (list[str]): Пути ко всем Parquet-файлам логов.
+        df_video (pd.DataFrame): DataFrame с данными о видео.
+        partials_path (str): Путь к Parquet-файлу с частичными суммами.
+        backend (str): Движок агрегаций из BACKENDS.
+
+    Returns:
+        pd.DataFrame: Актуальные частичные суммы.
+    """
+    sources = {path: dataset_fingerprint(path) for path in log_paths}
+    catalog = _catalog_fingerprint(df_video)
+
+    partials, processed = None, {}
+    if os.path.exists(partials_path):
+        table = pq.read_table(partials_path)
+        metadata = table.schema.metadata or {}
+        stored = json.loads(metadata.get(b"sources", b"[]"))
+        # Учтённые файлы не изменились и каталог тот же — дополняем суммы
+        if (
+            isinstance(stored, dict)
+            and metadata.get(b"catalog", b"").decode() == catalog
+            and all(sources.get(path) == stored[path] for path in stored)
+        ):
+            partials, processed = table.to_pandas(), stored
+
+    new_paths = [path for path in log_paths if path not in processed]
+    if not new_paths and partials is not None:
+        return partials  # Новых файлов нет
+
+    partials = aggregate_watchtime_partials(
+        new_paths, df_video, partials, backend=backend
+    )
+    table = pa.Table.from_pandas(partials, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            b"sources": json.dumps({path: sources[path] for path in log_paths}),
+            b"catalog": catalog,
+        }
+    )
+    tmp_path = f"{partials_path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, partials_path)  # Атомарно
+
+    return partials
+
+
+def _catalog_fingerprint(df_video):
+    """
+    Считает отпечаток соответствия видео и категорий каталога.
+    """
+    hashes = pd.util.hash_pandas_object(
+        df_video[["video_id", "category_id"]], index=False
+    )
+    return hashlib.sha1(hashes.to_numpy().tobytes()).hexdigest()
+
+
+def ranks_from_partials(partials):
+    """
+    Вычисляет ранги категорий по частичным суммам watchtime.
+
+    Args:
+        partials (pd.DataFrame): Частичные суммы по региону и категории.
+
+    Returns:
+        tuple: DataFrame с рангами категорий и агрегированными рангами.
+    """
+    # Ключи как строки: порядок не зависит от словаря категориальных колонок
+    df_avg_watchtime = (
+        partials.astype({"region": str, "category_id": str})
+        .sort_values(["region", "category_id"])
+        .reset_index(drop=True)
+    )
+    df_avg_watchtime = df_avg_watchtime.assign(
+        avg_watchtime=df_avg_watchtime["watchtime_sum"]
+        / df_avg_watchtime["watchtime_count"]
+    )[["region", "category_id", "avg_watchtime"]]
+
+    return _rank_categories(df_avg_watchtime)
+
+
+@cached("get_initial_info_streaming", hash_funcs=DATASET_HASH_FUNCS, max_entries=16)
+def get_initial_info_streaming(
+    log_paths, df_video, partials_path=None, backend="pandas"
+):
+    """
+    Получает начальную информацию потоковой агрегацией логов за несколько дней.
+
+    Args:
+        log_paths (list[str]): Пути к Parquet-файлам логов.
+        df_video (DatasetHandle | pd.DataFrame): Данные о видео.
+        partials_path (str, optional): Путь для сохранения частичных сумм.
+            Если задан, пересчитываются только новые файлы логов.
+        backend (str): Движок агрегаций из BACKENDS.
+
+    Returns:
+        tuple: DataFrame с рангами категорий и агрегированными рангами.
+    """
+    df_video = as_frame(df_video)
+    if partials_path is None:
+        partials = aggregate_watchtime_partials(log_paths, df_video, backend=backend)
+    else:
+        partials = update_watchtime_partials(
+            log_paths, df_video, partials_path, backend
+        )
+
+    return ranks_from_partials(partials)
+
+
+@cached(
+    "create_plot",
+    rows=lambda df_ranks, df_ranks_grouped: len(df_ranks),
+    max_entries=16,
+)
 def create_plot(df_ranks, df_ranks_grouped):
     """
     Создает график распределения рангов категорий.
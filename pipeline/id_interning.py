@@ -0,0 +1,231 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Колонки-идентификаторы и колонки с их целочисленными кодами
+INTERNED_COLUMNS = {
+    "video_id": "video_code",
+    "user_id": "user_code",
+    "category_id": "category_code",
+}
+
+
+class IdInterner:
+    """
+    Сохраняемый словарь строковых ID в плотные коды int32.
+
+    Для каждой колонки из INTERNED_COLUMNS в SQLite хранится таблица
+    (код, значение); коды выдаются подряд с нуля и никогда не меняются,
+    поэтому однажды закодированные данные остаются валидными. Новые
+    значения добавляются одной транзакцией под блокировкой записи SQLite,
+    так что несколько процессов получают одинаковые коды. В памяти
+    держится копия словаря: хеш-индекс pd.Index по основной части и
+    небольшой dict для недавно добавленных значений, который сливается
+    с индексом при росте, поэтому поштучное добавление не перестраивает
+    индекс каждый раз.
+    """
+
+    def __init__(self, path):
+        self.path = path  # Путь к файлу словаря
+        self._lock = threading.Lock()
+        self._values = {column: [] for column in INTERNED_COLUMNS}  # Код → ID
+        self._index = {
+            column: pd.Index([], dtype=object) for column in INTERNED_COLUMNS
+        }
+        self._recent = {column: {} for column in INTERNED_COLUMNS}  # Не в индексе
+        self._arrays = {}  # Колонка → массив значений для decode
+
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        for column in INTERNED_COLUMNS:
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS ids_{column} "
+                "(code INTEGER PRIMARY KEY, value TEXT NOT NULL UNIQUE)"
+            )
+
+    def encode(self, column, ids, add=True):
+        """
+        Кодирует значения колонки.
+
+        Args:
+            column (str): Колонка из INTERNED_COLUMNS.
+            ids (Sequence | pd.Series): Значения ID.
+            add (bool): Добавлять ли неизвестные значения в словарь.
+
+        Returns:
+            np.ndarray: Коды int32, -1 для пропусков и неизвестных значений.
+        """
+        if not isinstance(ids, pd.Series):
+            ids = pd.Series(ids, dtype=object)
+        # Каждое уникальное значение ищем в словаре один раз
+        positions, uniques = pd.factorize(ids, sort=False)
+        uniques = pd.Index(uniques, dtype=object).astype(str)
+        with self._lock:
+            unique_codes = self._lookup(column, uniques)
+            if (unique_codes < 0).any():
+                # Значения могли добавить другие процессы
+                self._refresh(column)
+                unique_codes = self._lookup(column, uniques)
+            if add and (unique_codes < 0).any():
+                self._add(column, uniques[unique_codes < 0])
+                unique_codes = self._lookup(column, uniques)
+
+        codes = np.append(unique_codes, np.int32(-1))[positions]  # -1 → пропуск
+        return codes.astype(np.int32, copy=False)
+
+    def decode(self, column, codes):
+        """
+        Возвращает значения ID по кодам.
+
+        Args:
+            column (str): Колонка из INTERNED_COLUMNS.
+            codes (np.ndarray): Коды, -1 — пропуск.
+
+        Returns:
+            np.ndarray: Значения ID (None для пропусков).
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        with self._lock:
+            if len(codes) and codes.max() >= len(self._values[column]):
+                self._refresh(column)
+            values = self._arrays.get(column)
+            if values is None or len(values) != len(self._values[column]) + 1:
+                # Последний элемент — None для кода -1
+                values = np.array(self._values[column] + [None], dtype=object)
+                self._arrays[column] = values
+        return values[codes]
+
+    def close(self):
+        """
+        Закрывает соединение со словарём.
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _lookup(self, column, uniques):
+        codes = self._index[column].get_indexer(uniques).astype(np.int32)
+        recent = self._recent[column]
+        if recent:
+            missing = np.flatnonzero(codes < 0)
+            codes[missing] = [recent.get(uniques[i], -1) for i in missing]
+        return codes
+
+    def _refresh(self, column):
+        rows = self._connection.execute(
+            f"SELECT value FROM ids_{column} WHERE code >= ? ORDER BY code",
+            (len(self._values[column]),),
+        ).fetchall()
+        self._extend(column, [value for (value,) in rows])
+
+    def _add(self, column, new_values):
+        with self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            # Под блокировкой записи дочитываем коды, выданные другими процессами
+            self._refresh(column)
+            codes = self._lookup(column, new_values)
+            new_values = list(dict.fromkeys(new_values[codes < 0]))  # Без повторов
+            self._connection.executemany(
+                f"INSERT INTO ids_{column} (code, value) VALUES (?, ?)",
+                enumerate(new_values, start=len(self._values[column])),
+            )
+        self._extend(column, new_values)
+
+    def _extend(self, column, new_values):
+        values, recent = self._values[column], self._recent[column]
+        recent.update(
+            zip(new_values, range(len(values), len(values) + len(new_values)))
+        )
+        values.extend(new_values)
+        if len(recent) > max(1024, len(self._index[column]) // 8):
+            # Сливаем недавние значения с индексом
+            self._index[column] = pd.Index(values, dtype=object)
+            recent.clear()
+
+
+def interner_path(data_path):
+    """
+    Возвращает путь к словарю ID, общему для файлов одного каталога данных.
+
+    Args:
+        data_path (str): Путь к файлу данных.
+
+    Returns:
+        str: Путь к файлу словаря.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(data_path)), "ids.db")
+
+
+@st.cache_resource
+def load_interner(path):
+    """
+    Возвращает общий для всех сессий словарь ID.
+
+    Args:
+        path (str): Путь к файлу словаря.
+
+    Returns:
+        IdInterner: Словарь ID.
+    """
+    return IdInterner(path)
+
+
+def code_positions(codes):
+    """
+    Строит обратный индекс колонки кодов: код → позиция строки.
+
+    Args:
+        codes (np.ndarray): Колонка кодов, например video_code каталога.
+
+    Returns:
+        np.ndarray: Позиция строки для каждого кода, -1 — кода нет;
+            последний элемент -1 отвечает коду -1 (пропуск).
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    positions = np.full(codes.max(initial=-1) + 2, -1, dtype=np.int64)
+    valid = codes >= 0
+    positions[codes[valid]] = np.flatnonzero(valid)
+    return positions
+
+
+def lookup_positions(positions, codes):
+    """
+    Возвращает позиции строк по кодам с помощью обратного индекса.
+
+    Args:
+        positions (np.ndarray): Результат code_positions.
+        codes (np.ndarray): Коды, -1 — пропуск.
+
+    Returns:
+        np.ndarray: Позиции строк, -1 для пропусков и неизвестных кодов.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    # Коды, выданные после построения индекса, попадают на последний элемент
+    return positions[np.where(codes < len(positions) - 1, codes, -1)]
+
+
+def intern_columns(df, interner):
+    """
+    Добавляет к DataFrame колонки кодов для колонок-идентификаторов.
+
+    Например, к 'video_id' добавляется 'video_code' (int32). Неизвестные
+    значения добавляются в словарь.
+
+    Args:
+        df (pd.DataFrame): DataFrame, изменяется на месте.
+        interner (IdInterner): Словарь ID.
+
+    Returns:
+        pd.DataFrame: Тот же DataFrame.
+    """
+    for column, code_column in INTERNED_COLUMNS.items():
+        if column in df.columns:
+            df[code_column] = interner.encode(column, df[column])
+    return df
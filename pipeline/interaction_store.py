@@ -0,0 +1,335 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from id_interning import interner_path, load_interner
+
+# Колонки журнала взаимодействий
+INTERACTION_COLUMNS = ["user_id", "video_id", "category_id", "interaction_type"]
+
+
+class InteractionStore:
+    """
+    Журнал взаимодействий пользователей только на дозапись (SQLite в режиме WAL).
+
+    Новые записи копятся в буфере и записываются одной транзакцией
+    (group commit) при заполнении буфера или по истечении интервала:
+    фоновый поток записывает буфер не позже flush_interval, даже если
+    новых записей нет, а при завершении процесса буфер сбрасывает close.
+    Чтение истории пользователя сначала сбрасывает буфер, поэтому пользователь
+    всегда видит свои последние взаимодействия. Несколько процессов могут
+    писать в один файл одновременно: WAL допускает параллельное чтение,
+    а запись сериализуется блокировкой SQLite.
+
+    ID пользователя, видео и категории хранятся целочисленными кодами
+    общего с каталогом словаря IdInterner (ids.db в папке данных), поэтому
+    записи и индекс по пользователю компактнее, а video_code записи
+    совпадает с колонкой video_code каталога и переводится в позицию
+    видео без сравнения строк. Путь к словарю записывается в журнал:
+    журнал открывается с тем же словарём, которым закодирован.
+    """
+
+    def __init__(self, path, ids=None, flush_size=64, flush_interval=1.0):
+        self.path = path  # Путь к файлу базы данных
+        self.flush_size = flush_size  # Максимальный размер буфера
+        self.flush_interval = flush_interval  # Максимальная задержка записи, сек
+        self._buffer = []  # Ещё не записанные взаимодействия
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()  # Останавливает фоновую запись
+
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS interactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_code INTEGER NOT NULL,
+                    video_code INTEGER,
+                    category_code INTEGER,
+                    interaction_type TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS interactions_user_code "
+                "ON interactions (user_code)"
+            )
+            # Последний выбранный пользователем регион
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS user_regions "
+                "(user_code INTEGER PRIMARY KEY, region TEXT NOT NULL)"
+            )
+            self.ids = self._journal_ids(ids)  # Словарь ID → коды
+        atexit.register(self.close)  # Сбрасываем буфер при завершении процесса
+        threading.Thread(
+            target=self._flush_periodically, name="interaction-flush", daemon=True
+        ).start()
+
+    def _journal_ids(self, ids):
+        """
+        Возвращает словарь ID журнала и записывает путь к нему в журнал.
+
+        По умолчанию используется словарь, которым журнал уже закодирован,
+        для нового журнала — общий словарь папки журнала.
+
+        Raises:
+            ValueError: Журнал закодирован другим словарём.
+        """
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS journal_meta "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        row = self._connection.execute(
+            "SELECT value FROM journal_meta WHERE key = 'ids_path'"
+        ).fetchone()
+        # Словарь, файл которого удалён, коды журнала уже не расшифрует
+        ids_path = row[0] if row and os.path.exists(row[0]) else None
+        if ids is None:
+            ids = load_interner(ids_path or interner_path(self.path))
+        elif ids_path is not None and os.path.abspath(ids.path) != ids_path:
+            raise ValueError(
+                f"Журнал {self.path} закодирован словарём {ids_path}, "
+                f"а не {os.path.abspath(ids.path)}"
+            )
+        self._connection.execute(
+            "INSERT OR REPLACE INTO journal_meta (key, value) VALUES ('ids_path', ?)",
+            (os.path.abspath(ids.path),),
+        )
+        return ids
+
+    def append(self, interactions):
+        """
+        Добавляет взаимодействия в журнал.
+
+        Args:
+            interactions (list[dict]): Взаимодействия с ключами из INTERACTION_COLUMNS.
+        """
+        now = time.time()
+        with self._lock:
+            self._buffer.extend(
+                tuple(row[column] for column in INTERACTION_COLUMNS) + (now,)
+                for row in interactions
+            )
+            if (
+                len(self._buffer) >= self.flush_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self._flush()
+
+    def flush(self):
+        """
+        Записывает буфер в журнал одной транзакцией.
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            with self._lock:
+                if self._connection is None:
+                    return
+                try:
+                    self._flush()
+                except sqlite3.Error:
+                    pass  # Буфер не очищен, запись повторится на следующем шаге
+
+    def _flush(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        rows = self._encode(
+            pd.DataFrame(self._buffer, columns=INTERACTION_COLUMNS + ["created_at"])
+        )
+        with self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.executemany(
+                "INSERT INTO interactions "
+                "(user_code, video_code, category_code, interaction_type, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        self._buffer = []
+
+    def _encode(self, df):
+        """
+        Заменяет ID взаимодействий кодами словаря (None для пропусков).
+        """
+        codes = [
+            [
+                None if code < 0 else code
+                for code in self.ids.encode(column, df[column]).tolist()
+            ]
+            for column in ["user_id", "video_id", "category_id"]
+        ]
+        return list(
+            zip(*codes, df["interaction_type"].tolist(), df["created_at"].tolist())
+        )
+
+    def _decode(self, rows):
+        """
+        Возвращает взаимодействия со строковыми ID по строкам с кодами.
+        """
+        df = pd.DataFrame(
+            rows,
+            columns=["user_code", "video_code", "category_code", "interaction_type"],
+        )
+        video_codes = df["video_code"].fillna(-1).to_numpy(dtype=np.int64)
+        return pd.DataFrame(
+            {
+                column: self.ids.decode(
+                    column, df[code_column].fillna(-1).to_numpy(dtype=np.int64)
+                )
+                for column, code_column in [
+                    ("user_id", "user_code"),
+                    ("video_id", "video_code"),
+                    ("category_id", "category_code"),
+                ]
+            }
+        ).assign(
+            interaction_type=df["interaction_type"].to_numpy(),
+            video_code=video_codes.astype(np.int32),
+        )
+
+    def user_history(self, user_id):
+        """
+        Возвращает все взаимодействия пользователя в порядке записи.
+
+        Args:
+            user_id (str): ID пользователя.
+
+        Returns:
+            pd.DataFrame: DataFrame с колонками INTERACTION_COLUMNS и
+                video_code (код видео общего словаря, -1 — пропуск).
+        """
+        with self._lock:
+            self._flush()
+            (user_code,) = self.ids.encode("user_id", [user_id], add=False)
+            rows = self._connection.execute(
+                "SELECT user_code, video_code, category_code, interaction_type "
+                "FROM interactions WHERE user_code = ? ORDER BY id",
+                (int(user_code),),
+            ).fetchall()
+        return self._decode(rows)
+
+    def set_user_region(self, user_id, region):
+        """
+        Запоминает регион пользователя.
+
+        Args:
+            user_id (str): ID пользователя.
+            region (str): Регион пользователя.
+        """
+        (user_code,) = self.ids.encode("user_id", [user_id])
+        with self._lock, self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.execute(
+                "INSERT OR REPLACE INTO user_regions (user_code, region) VALUES (?, ?)",
+                (int(user_code), region),
+            )
+
+    def user_region(self, user_id):
+        """
+        Возвращает сохранённый регион пользователя.
+
+        Args:
+            user_id (str): ID пользователя.
+
+        Returns:
+            str | None: Регион или None, если он не выбирался.
+        """
+        (user_code,) = self.ids.encode("user_id", [user_id], add=False)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT region FROM user_regions WHERE user_code = ?",
+                (int(user_code),),
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def read_all(self):
+        """
+        Возвращает весь журнал взаимодействий.
+
+        Returns:
+            pd.DataFrame: DataFrame с колонками INTERACTION_COLUMNS.
+        """
+        with self._lock:
+            self._flush()
+            rows = self._connection.execute(
+                "SELECT user_code, video_code, category_code, interaction_type "
+                "FROM interactions ORDER BY id"
+            ).fetchall()
+        return self._decode(rows)
+
+    def is_empty(self):
+        """
+        Проверяет, есть ли в журнале записи.
+        """
+        with self._lock:
+            self._flush()
+            return (
+                self._connection.execute(
+                    "SELECT 1 FROM interactions LIMIT 1"
+                ).fetchone()
+                is None
+            )
+
+    def import_csv(self, path):
+        """
+        Переносит взаимодействия из CSV-файла старого формата в журнал.
+
+        Args:
+            path (str): Путь к CSV-файлу.
+        """
+        df = pd.read_csv(path, usecols=INTERACTION_COLUMNS, dtype=str)
+        self.append(df.to_dict("records"))
+        self.flush()
+
+    def close(self):
+        """
+        Сбрасывает буфер и закрывает соединение.
+        """
+        self._closed.set()
+        with self._lock:
+            if self._connection is None:
+                return
+            self._flush()
+            self._connection.close()
+            self._connection = None  # Общий словарь ID закрывает не журнал
+
+
+@st.cache_resource
+def get_interaction_store(
+    path="user_interactions.db",
+    legacy_csv="user_interactions.csv",
+    videos_path="data/video_stat.parquet",
+):
+    """
+    Возвращает общий для всех сессий журнал взаимодействий.
+
+    При первом создании журнала в него переносятся записи из CSV-файла.
+
+    Args:
+        path (str): Путь к файлу базы данных.
+        legacy_csv (str): Путь к CSV-файлу со старыми взаимодействиями.
+        videos_path (str): Путь к файлу каталога, словарь ID которого
+            используется журналом.
+
+    Returns:
+        InteractionStore: Журнал взаимодействий.
+    """
+    store = InteractionStore(path, load_interner(interner_path(videos_path)))
+    if store.is_empty() and os.path.exists(legacy_csv):
+        store.import_csv(legacy_csv)  # Однократная миграция из CSV
+    return store
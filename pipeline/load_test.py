@@ -0,0 +1,144 @@
+"""
+Нагрузочный тест сервиса рекомендаций (service.py).
+
+Запускает заданное число виртуальных пользователей, каждый из которых
+получает первую подборку, а затем повторяет цикл «взаимодействие со
+случайным видео из подборки → следующая подборка». Выводит число
+запросов в секунду и перцентили задержек по каждому обработчику.
+
+Пример запуска из корня репозитория (сервис уже запущен):
+    python pipeline/load_test.py --url http://localhost:8888 --users 200 --steps 20
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient
+
+from recommendation_engine import INTERACTION_WEIGHTS
+
+
+async def _request(client, latencies, name, url, method="GET", body=None):
+    start = time.perf_counter()
+    response = await client.fetch(
+        url,
+        method=method,
+        body=None if body is None else json.dumps(body),
+        headers={"Content-Type": "application/json"},
+    )
+    latencies[name].append(time.perf_counter() - start)
+    return json.loads(response.body)
+
+
+async def virtual_user(client, url, steps, latencies, rng):
+    """
+    Проходит сценарий одного пользователя.
+
+    Args:
+        client (AsyncHTTPClient): HTTP-клиент.
+        url (str): Адрес сервиса.
+        steps (int): Количество циклов «взаимодействие → подборка».
+        latencies (dict): Задержки по обработчикам, пополняется.
+        rng (random.Random): Генератор случайных чисел.
+    """
+    slate = await _request(client, latencies, "first", f"{url}/slate/first", "POST", {})
+    user_id = slate["user_id"]
+    for _ in range(steps):
+        if slate["videos"]:
+            await _request(
+                client,
+                latencies,
+                "interaction",
+                f"{url}/interactions",
+                "POST",
+                {
+                    "user_id": user_id,
+                    "video_id": rng.choice(slate["videos"])["video_id"],
+                    "interaction_type": rng.choice(list(INTERACTION_WEIGHTS)),
+                },
+            )
+        slate = await _request(
+            client, latencies, "next", f"{url}/slate/next?user_id={user_id}"
+        )
+
+
+async def run_load_test(url, users, steps, concurrency, seed=0):
+    """
+    Прогоняет виртуальных пользователей с ограничением одновременных запросов.
+
+    Args:
+        url (str): Адрес сервиса.
+        users (int): Количество виртуальных пользователей.
+        steps (int): Количество циклов на пользователя.
+        concurrency (int): Максимум одновременных пользователей.
+        seed (int): Зерно генератора случайных чисел.
+
+    Returns:
+        dict: Отчёт с числом запросов в секунду и перцентилями задержек.
+    """
+    client = AsyncHTTPClient(max_clients=concurrency)
+    latencies = defaultdict(list)  # Обработчик → задержки, сек
+    semaphore = asyncio.Semaphore(concurrency)
+    rng = random.Random(seed)
+
+    async def limited_user():
+        async with semaphore:
+            await virtual_user(client, url, steps, latencies, rng)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited_user() for _ in range(users)))
+    elapsed = time.perf_counter() - start
+
+    return build_report(latencies, elapsed)
+
+
+def build_report(latencies, elapsed):
+    """
+    Сводит задержки запросов в отчёт.
+
+    Args:
+        latencies (dict): Задержки по обработчикам, сек.
+        elapsed (float): Время теста, сек.
+
+    Returns:
+        dict: Отчёт с числом запросов в секунду и перцентилями задержек.
+    """
+
+    def percentiles(values):
+        values = np.asarray(values) * 1000
+        return {
+            f"p{q}": round(float(np.percentile(values, q)), 3) for q in (50, 90, 99)
+        }
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "requests": len(all_latencies),
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(len(all_latencies) / elapsed, 1),
+        "latency_ms": percentiles(all_latencies),
+        "endpoints": {name: percentiles(values) for name, values in latencies.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8888")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run_load_test(args.url, args.users, args.steps, args.concurrency, args.seed)
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import contextlib
+import cProfile
+import functools
+import json
+import threading
+import time
+
+import numpy as np
+import streamlit as st
+
+# Верхние границы корзин гистограммы задержек, сек
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, np.inf)
+
+
+class StageRecord:
+    """
+    Объём работы одного выполнения этапа, заполняется внутри track.
+    """
+
+    def __init__(self):
+        self.rows = 0  # Обработано строк
+        self.bytes_read = 0  # Прочитано байт
+
+
+class MetricsRegistry:
+    """
+    Метрики конвейера, общие для всех сессий процесса.
+
+    Для каждого этапа хранит гистограмму задержек, число обработанных
+    строк и прочитанных байт, для каждой кешируемой функции — число
+    обращений к кешу и промахов. Обновление защищено блокировкой, так как
+    сессии Streamlit выполняются в разных потоках.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Обнуляет все метрики.
+        """
+        with self._lock:
+            self.buckets = {}  # Этап → число выполнений по корзинам
+            self.seconds = {}  # Этап → суммарное время, сек
+            self.rows = {}  # Этап → обработано строк
+            self.bytes_read = {}  # Этап → прочитано байт
+            self.cache_calls = {}  # Функция → обращений к кешу
+            self.cache_misses = {}  # Функция → промахов кеша
+
+    def observe(self, stage, seconds, rows=0, bytes_read=0):
+        """
+        Учитывает одно выполнение этапа.
+
+        Args:
+            stage (str): Название этапа.
+            seconds (float): Время выполнения, сек.
+            rows (int): Обработано строк.
+            bytes_read (int): Прочитано байт.
+        """
+        bucket = int(np.searchsorted(LATENCY_BUCKETS, seconds))
+        with self._lock:
+            counts = self.buckets.setdefault(stage, [0] * len(LATENCY_BUCKETS))
+            counts[bucket] += 1
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.rows[stage] = self.rows.get(stage, 0) + rows
+            self.bytes_read[stage] = self.bytes_read.get(stage, 0) + bytes_read
+
+    def count_cache_call(self, function):
+        """
+        Учитывает обращение к кешу функции.
+
+        Args:
+            function (str): Название функции.
+        """
+        with self._lock:
+            self.cache_calls[function] = self.cache_calls.get(function, 0) + 1
+
+    def count_cache_miss(self, function):
+        """
+        Учитывает промах кеша функции (значение вычислялось заново).
+
+        Args:
+            function (str): Название функции.
+        """
+        with self._lock:
+            self.cache_misses[function] = self.cache_misses.get(function, 0) + 1
+
+    def snapshot(self):
+        """
+        Возвращает текущие значения метрик.
+
+        Returns:
+            list[dict]: По одной записи на этап и на кешируемую функцию.
+        """
+        with self._lock:
+            stages = [
+                {
+                    "type": "stage",
+                    "stage": stage,
+                    "count": sum(counts),
+                    "seconds": round(self.seconds[stage], 6),
+                    "rows": self.rows[stage],
+                    "bytes_read": self.bytes_read[stage],
+                    "buckets": dict(zip(map(_bucket_label, LATENCY_BUCKETS), counts)),
+                }
+                for stage, counts in self.buckets.items()
+            ]
+            caches = [
+                {
+                    "type": "cache",
+                    "function": function,
+                    "hits": calls - self.cache_misses.get(function, 0),
+                    "misses": self.cache_misses.get(function, 0),
+                }
+                for function, calls in self.cache_calls.items()
+            ]
+        return stages + caches
+
+    def to_json_lines(self):
+        """
+        Экспортирует метрики в формате JSON Lines.
+
+        Returns:
+            str: По одной JSON-записи на строку.
+        """
+        now = time.time()
+        return "".join(
+            json.dumps({"timestamp": now, **row}, ensure_ascii=False) + "\n"
+            for row in self.snapshot()
+        )
+
+    def to_prometheus(self):
+        """
+        Экспортирует метрики в текстовом формате Prometheus.
+
+        Returns:
+            str: Метрики в формате exposition text.
+        """
+        lines = [
+            "# TYPE pipeline_stage_seconds histogram",
+            "# TYPE pipeline_stage_rows_total counter",
+            "# TYPE pipeline_stage_bytes_read_total counter",
+            "# TYPE pipeline_cache_hits_total counter",
+            "# TYPE pipeline_cache_misses_total counter",
+        ]
+        for row in self.snapshot():
+            if row["type"] == "stage":
+                label = f'stage="{row["stage"]}"'
+                cumulative = np.cumsum(list(row["buckets"].values()))
+                lines += [
+                    f'pipeline_stage_seconds_bucket{{{label},le="{le}"}} {count}'
+                    for le, count in zip(row["buckets"], cumulative)
+                ]
+                lines += [
+                    f"pipeline_stage_seconds_sum{{{label}}} {row['seconds']}",
+                    f"pipeline_stage_seconds_count{{{label}}} {row['count']}",
+                    f"pipeline_stage_rows_total{{{label}}} {row['rows']}",
+                    f"pipeline_stage_bytes_read_total{{{label}}} {row['bytes_read']}",
+                ]
+            else:
+                label = f'function="{row["function"]}"'
+                lines += [
+                    f"pipeline_cache_hits_total{{{label}}} {row['hits']}",
+                    f"pipeline_cache_misses_total{{{label}}} {row['misses']}",
+                ]
+        return "\n".join(lines) + "\n"
+
+
+def _bucket_label(bound):
+    return "+Inf" if np.isinf(bound) else str(bound)
+
+
+# Метрики процесса
+REGISTRY = MetricsRegistry()
+
+# Стек выполняемых этапов текущего потока
+_active = threading.local()
+
+
+@contextlib.contextmanager
+def track(stage):
+    """
+    Замеряет время этапа; объём работы задаётся через возвращаемую запись.
+
+    Пример:
+        with track("select_slate") as record:
+            positions = select_slate(...)
+            record.rows = len(positions)
+
+    Args:
+        stage (str): Название этапа.
+
+    Yields:
+        StageRecord: Запись для числа строк и прочитанных байт.
+    """
+    record = StageRecord()
+    stack = _active.__dict__.setdefault("stack", [])
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        stack.pop()
+        REGISTRY.observe(
+            stage, time.perf_counter() - start, record.rows, record.bytes_read
+        )
+
+
+def record_work(rows=0, bytes_read=0):
+    """
+    Добавляет объём работы к самому вложенному выполняемому этапу потока.
+
+    Args:
+        rows (int): Обработано строк.
+        bytes_read (int): Прочитано байт.
+    """
+    stack = getattr(_active, "stack", None)
+    if stack:
+        stack[-1].rows += rows
+        stack[-1].bytes_read += bytes_read
+
+
+def cached(stage, cache=st.cache_data, rows=None, **cache_kwargs):
+    """
+    Кеширует функцию декоратором Streamlit и считает попадания в кеш.
+
+    Промах определяется по выполнению тела функции, поэтому число
+    попаданий равно числу вызовов без промаха. Время каждого вызова,
+    включая хеширование аргументов кешем, попадает в гистограмму этапа.
+
+    Args:
+        stage (str): Название этапа и функции в метриках.
+        cache (Callable): st.cache_data или st.cache_resource.
+        rows (Callable, optional): Число обработанных строк по аргументам
+            функции, учитывается при промахе.
+        **cache_kwargs: Параметры декоратора кеша.
+
+    Returns:
+        Callable: Декоратор.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            REGISTRY.count_cache_miss(stage)
+            if rows is not None:
+                record_work(rows=rows(*args, **kwargs))
+            return func(*args, **kwargs)
+
+        cached_func = cache(**cache_kwargs)(compute)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            REGISTRY.count_cache_call(stage)
+            with track(stage):
+                return cached_func(*args, **kwargs)
+
+        wrapper.clear = cached_func.clear
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def profile(path):
+    """
+    Профилирует блок кода cProfile и сохраняет статистику в файл.
+
+    Файл открывается snakeviz или python -m pstats.
+
+    Args:
+        path (str): Путь к файлу .prof.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
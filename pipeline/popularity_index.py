@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Колонки, по которым определяется популярность видео внутри категории
+POPULARITY_COLUMNS = ["cmments_per_day", "v_long_views_7_days"]
+
+# Если изменилась популярность большей доли каталога, индекс сортируется
+# заново: вставка по одному видео выигрывает только у небольших изменений
+REBUILD_FRACTION = 0.1
+
+
+class CategoryIndex:
+    """
+    Индекс категория → позиции видео в каталоге, отсортированные по популярности.
+
+    Позиции всех видео хранятся в одном массиве `order`, сгруппированном по
+    категориям (аналог CSR): видео категории лежат в `order[start:end]`
+    по убыванию `cmments_per_day`, затем `v_long_views_7_days`.
+    """
+
+    def __init__(self, categories, order, offsets):
+        self.categories = categories  # Список категорий, присутствующих в каталоге
+        self.order = order  # Позиции видео, сгруппированные по категориям
+        self.offsets = offsets  # Словарь категория → (начало, конец) в order
+        self._codes = None  # Номер блока категории по позиции видео
+
+    def top_videos(self, category, n, seen=None):
+        """
+        Возвращает позиции N самых популярных ещё не показанных видео категории.
+
+        Args:
+            category (str): Категория видео.
+            n (int): Количество видео.
+            seen (SeenSet, optional): Позиции уже показанных видео.
+
+        Returns:
+            np.ndarray: Позиции выбранных видео в каталоге.
+        """
+        if category not in self.offsets or n <= 0:
+            return np.empty(0, dtype=self.order.dtype)
+        start, end = self.offsets[category]
+        if not seen:
+            return self.order[start : min(start + n, end)]
+
+        # Среди первых n + len(seen) кандидатов точно найдутся n непоказанных
+        candidates = self.order[start : min(start + n + len(seen), end)]
+        return candidates[~seen.contains(candidates)][:n]
+
+    def update(self, df_video, positions):
+        """
+        Переставляет видео, популярность которых изменилась, без полной сортировки.
+
+        Изменившиеся видео убираются из order и вставляются на свои места
+        бинарным поиском по новым значениям POPULARITY_COLUMNS; порядок
+        остальных видео не меняется. Новый массив подменяет прежний одним
+        присваиванием, поэтому параллельные вызовы top_videos видят либо
+        прежний, либо новый порядок. Категории видео должны остаться прежними.
+
+        Args:
+            df_video (pd.DataFrame): DataFrame с обновлёнными данными о видео.
+            positions (np.ndarray): Позиции видео с изменившейся популярностью.
+        """
+        codes = self._position_codes(len(df_video))
+        positions = np.unique(np.asarray(positions, dtype=np.int64))
+        positions = positions[codes[positions] >= 0]  # Видео без категории нет в order
+        if len(positions) == 0:
+            return
+        if len(positions) > REBUILD_FRACTION * len(self.order):
+            self.order = build_category_index(df_video).order
+            return
+
+        moved = np.zeros(len(codes), dtype=bool)
+        moved[positions] = True
+        kept = self.order[~moved[self.order]]
+        # Ключи упорядочены так же, как в build_category_index: категория,
+        # убывание популярности, позиция (устойчивость сортировки)
+        moved_keys = np.sort(_popularity_keys(df_video, positions, codes))
+        insert_at = np.searchsorted(_popularity_keys(df_video, kept, codes), moved_keys)
+        self.order = np.insert(kept, insert_at, moved_keys["position"]).astype(
+            self.order.dtype
+        )
+
+    def _position_codes(self, n_videos):
+        # Номер блока категории для каждой позиции каталога, -1 — нет в индексе
+        if self._codes is None or len(self._codes) != n_videos:
+            codes = np.full(n_videos, -1, dtype=np.int64)
+            blocks = sorted(self.offsets.values())
+            for code, (start, end) in enumerate(blocks):
+                codes[self.order[start:end]] = code
+            self._codes = codes
+        return self._codes
+
+
+class SeenSet:
+    """
+    Множество позиций показанных пользователю видео.
+
+    Хранится как отсортированный массив int32, поэтому память пропорциональна
+    числу показанных видео, а не размеру каталога. С пределом limit
+    множество помнит ещё и порядок показа и хранит не больше limit позиций:
+    давно показанные видео вытесняются и могут быть показаны снова.
+    """
+
+    def __init__(self, positions=(), limit=None):
+        self.limit = limit  # Предел числа позиций, None — без предела
+        # Позиции в порядке первого показа, ведётся только с пределом
+        self.order = np.empty(0, dtype=np.int32)
+        self.positions = np.empty(0, dtype=np.int32)
+        self.add(positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, positions):
+        """
+        Добавляет позиции видео в множество.
+
+        Args:
+            positions (np.ndarray): Позиции видео в каталоге.
+        """
+        positions = np.asarray(positions, dtype=np.int32)
+        if self.limit is None:
+            self.positions = np.union1d(self.positions, positions).astype(np.int32)
+            return
+        new = pd.unique(positions[~self.contains(positions)])  # Порядок сохраняется
+        self.order = np.concatenate([self.order, new])[-self.limit :]
+        self.positions = np.sort(self.order)
+
+    def contains(self, positions):
+        """
+        Проверяет принадлежность позиций множеству бинарным поиском.
+
+        Args:
+            positions (np.ndarray): Позиции видео в каталоге.
+
+        Returns:
+            np.ndarray: Булева маска той же длины, что и positions.
+        """
+        positions = np.asarray(positions)
+        if len(self.positions) == 0:
+            return np.zeros(len(positions), dtype=bool)
+        found = np.searchsorted(self.positions, positions)
+        found[found == len(self.positions)] = 0
+        return self.positions[found] == positions
+
+
+def build_category_index(df_video):
+    """
+    Строит индекс популярности видео по категориям за один проход сортировки.
+
+    Args:
+        df_video (pd.DataFrame): DataFrame с данными о видео.
+
+    Returns:
+        CategoryIndex: Индекс категория → отсортированные позиции видео.
+    """
+    codes, categories = pd.factorize(df_video["category_id"], sort=True)
+
+    # Одна устойчивая сортировка: по категории, затем по убыванию популярности
+    keys = [
+        -df_video[column].to_numpy(dtype="float64") for column in POPULARITY_COLUMNS
+    ]
+    order = np.lexsort(keys[::-1] + [codes]).astype(np.int64)
+    order = order[codes[order] >= 0]  # Отбрасываем видео без категории
+
+    # Границы блоков каждой категории в отсортированном массиве
+    bounds = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+    offsets = {
+        category: (int(bounds[code]), int(bounds[code + 1]))
+        for code, category in enumerate(categories)
+        if bounds[code + 1] > bounds[code]
+    }
+
+    return CategoryIndex(list(offsets), order, offsets)
+
+
+def _popularity_keys(df_video, positions, codes):
+    """
+    Возвращает ключи сортировки индекса популярности для позиций видео.
+    """
+    keys = np.empty(
+        len(positions),
+        dtype=[("code", np.int64)]
+        + [(column, np.float64) for column in POPULARITY_COLUMNS]
+        + [("position", np.int64)],
+    )
+    keys["code"] = codes[positions]
+    for column in POPULARITY_COLUMNS:
+        keys[column] = -df_video[column].to_numpy(dtype="float64")[positions]
+    keys["position"] = positions
+    return keys
+
+
+@st.cache_resource
+def load_category_index(_df_video, source):
+    """
+    Возвращает общий для всех сессий индекс популярности каталога.
+
+    Args:
+        _df_video (pd.DataFrame): DataFrame с данными о видео (не хешируется).
+        source (str): Путь к файлу каталога или его отпечаток, ключ кеша.
+
+    Returns:
+        CategoryIndex: Индекс категория → отсортированные позиции видео.
+    """
+    return build_category_index(_df_video)
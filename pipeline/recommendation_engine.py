@@ -1,79 +1,380 @@
-@st.cache_data
-def recommend_categories(df_ranks_grouped, interactions_data, total_representatives=10):
+import numpy as np
+import pandas as pd
+from metrics import cached
+
+# Изменение веса категории для каждого типа взаимодействия
+INTERACTION_WEIGHTS = {
+    "like": 1,  # Увеличиваем вес при лайке
+    "dislike": -1,  # Уменьшаем вес при дизлайке
+    "comment": 2,  # Увеличиваем вес при комментарии
+    "no_like_either_dislike": -0.5,  # Немного уменьшаем вес без оценки
+}
+
+
+def apportion(weights, total_representatives):
     """
-    Рекомендует категории на основе взаимодействий пользователя.
+    Распределяет total_representatives видео пропорционально весам
+    методом наибольших остатков.
+
+    Отрицательные веса считаются нулевыми. Работает построчно для матрицы
+    весов (пользователи × категории) за один векторный проход.
+
+    Args:
+        weights (np.ndarray): Веса категорий, одномерный или двумерный массив.
+        total_representatives (int): Общее количество видео в подборке.
+
+    Returns:
+        np.ndarray: Целые количества видео той же формы, сумма по строке равна
+            total_representatives.
+    """
+    shape = np.shape(weights)
+    weights = np.clip(np.atleast_2d(np.asarray(weights, dtype="float64")), 0, None)
+    totals = weights.sum(axis=1, keepdims=True)
+
+    # Точные доли и их целые части
+    quotas = np.divide(
+        weights * total_representatives,
+        totals,
+        out=np.zeros_like(weights),
+        where=totals > 0,
+    )
+    counts = np.floor(quotas).astype(np.int64)
+
+    # Недостающие видео получают категории с наибольшими дробными остатками
+    deficit = total_representatives - counts.sum(axis=1, keepdims=True)
+    remainder_order = np.argsort(-(quotas - counts), axis=1, kind="stable")
+    remainder_rank = np.empty_like(remainder_order)
+    np.put_along_axis(
+        remainder_rank,
+        remainder_order,
+        np.broadcast_to(np.arange(weights.shape[1]), weights.shape),
+        axis=1,
+    )
+    counts += (remainder_rank < deficit) & (totals > 0)
+
+    return counts.reshape(shape)
+
+
+def _category_weights(df_ranks_grouped):
+    """
+    Возвращает исходные веса категорий (колонка 'N' или нули).
+    """
+    if "N" in df_ranks_grouped.columns:
+        return df_ranks_grouped["N"].to_numpy(dtype="float64")
+    return np.zeros(len(df_ranks_grouped))  # Инициализация, если не существует
+
+
+def first_recommend_categories(
+    df_ranks_grouped,
+    total_representatives=10,
+    current_popularity=None,
+    time_weight=0.5,
+    region=None,
+    region_priors=None,
+):
+    """
+    Рекомендует категории при первом запуске, когда взаимодействий ещё нет.
+
+    Вес категории обратно пропорционален её среднему рангу среди регионов.
+    Если передана популярность категорий в текущее время суток, веса
+    смешиваются с долями просмотров категорий в этот час. Если переданы
+    ранги по регионам, используются ранги региона пользователя.
 
     Args:
         df_ranks_grouped (pd.DataFrame): DataFrame с агрегированными рангами категорий.
-        interactions_data (pd.DataFrame): DataFrame с данными взаимодействий пользователя.
         total_representatives (int): Общее количество рекомендованных видео.
+        current_popularity (pd.DataFrame, optional): Результат
+            get_current_time_specific_info с колонками 'category_id' и 'share'.
+        time_weight (float): Доля популярности текущего часа в итоговом весе.
+        region (str, optional): Регион пользователя.
+        region_priors (RegionPriors, optional): Ранги категорий по регионам.
 
     Returns:
         pd.DataFrame: DataFrame с категориями, количеством видео и процентами.
     """
-    df = df_ranks_grouped.copy()  # Создаем копию DataFrame для обработки
+    if region_priors is not None:
+        # Ранги региона (или общие для неизвестного региона) за O(1)
+        df_ranks_grouped = region_priors.ranks_for(region)
+    df = df_ranks_grouped[["category_id"]].copy()
+    weights = 1 / df_ranks_grouped["avg_rank"].to_numpy()
+    weights = weights / weights.sum()
+
+    if current_popularity is not None:
+        shares = (
+            df["category_id"]
+            .map(current_popularity.set_index("category_id")["share"])
+            .fillna(0)
+            .to_numpy(dtype="float64")
+        )
+        if shares.sum() > 0:
+            weights = (1 - time_weight) * weights + time_weight * shares / shares.sum()
+
+    df["N"] = apportion(weights, total_representatives)
+    df["Percentage"] = (df["N"] / total_representatives * 100).round(2)
+
+    return df.sort_values(by="N", ascending=False, kind="stable").reset_index(drop=True)
 
-    # Проверка наличия колонки 'N' в df, если её нет, инициализируем её
-    if "N" not in df.columns:
-        df["N"] = 0  # Инициализация, если не существует
 
-    # Создаем словарь весов категорий на основе текущего количества видео
-    category_weights = {row["category_id"]: row["N"] for _, row in df.iterrows()}
+@cached(
+    "recommend_categories",
+    rows=lambda df_ranks_grouped, interactions_data, *args: len(interactions_data),
+    max_entries=1024,
+)
+def recommend_categories(df_ranks_grouped, interactions_data, total_representatives=10):
+    """
+    Рекомендует категории на основе взаимодействий пользователя.
 
-    # Обрабатываем каждое взаимодействие пользователя
-    for _, interaction in interactions_data.iterrows():
-        category_id = interaction["category_id"]  # ID категории
-        interaction_type = interaction["interaction_type"]  # Тип взаимодействия
+    Args:
+        df_ranks_grouped (pd.DataFrame): DataFrame с агрегированными рангами категорий.
+        interactions_data (pd.DataFrame): DataFrame с данными взаимодействий пользователя.
+        total_representatives (int): Общее количество рекомендованных видео.
 
-        if category_id in category_weights:
-            if interaction_type == "like":
-                category_weights[category_id] += 1  # Увеличиваем вес при лайке
-            elif interaction_type == "dislike":
-                category_weights[category_id] -= 1  # Уменьшаем вес при дизлайке
-            elif interaction_type == "comment":
-                category_weights[category_id] += 2  # Увеличиваем вес при комментарии
-            elif interaction_type == "no_like_either_dislike":
-                category_weights[category_id] -= 0.5  # Немного уменьшаем вес без оценки
+    Returns:
+        pd.DataFrame: DataFrame с категориями, количеством видео и процентами.
+    """
+    df = df_ranks_grouped[["category_id"]].copy()  # Копия для обработки
 
-    total_weight = sum(category_weights.values())  # Общий вес всех категорий
+    # Суммарное изменение веса каждой категории по всем взаимодействиям
+    if interactions_data.empty:
+        deltas = pd.Series(dtype="float64")
+    else:
+        deltas = (
+            interactions_data["interaction_type"]
+            .map(INTERACTION_WEIGHTS)
+            .fillna(0)
+            .groupby(interactions_data["category_id"], observed=True)
+            .sum()
+        )
+    category_weights = (
+        _category_weights(df_ranks_grouped)
+        + df["category_id"].map(deltas).fillna(0).to_numpy()
+    )
 
-    if total_weight <= 0:
+    if category_weights.sum() <= 0:
         raise ValueError(
             "Все веса категорий стали отрицательными или равны нулю."
         )  # Проверка на валидность весов
 
-    # Обновляем количество видео 'N' на основе новых весов
-    df["N"] = df["category_id"].map(category_weights).fillna(0)  # Заполняем NaN нулями
-    df["N"] = (df["N"] / total_weight * total_representatives).round().astype(int)
-
-    # Балансировка общего количества видео до total_representatives
-    while df["N"].sum() != total_representatives:
-        diff = (
-            total_representatives - df["N"].sum()
-        )  # Разница между желаемым и текущим количеством видео
-        if diff > 0:
-            idx = df[
-                "N"
-            ].idxmax()  # Находим индекс категории с наибольшим количеством видео
-            df.at[idx, "N"] += 1  # Увеличиваем количество видео в этой категории
-        else:
-            idx = df[
-                "N"
-            ].idxmin()  # Находим индекс категории с наименьшим количеством видео
-            if df.at[idx, "N"] > 0:
-                df.at[
-                    idx, "N"
-                ] -= 1  # Уменьшаем количество видео в этой категории, если возможно
+    # Распределяем видео по категориям пропорционально весам
+    df["N"] = apportion(category_weights, total_representatives)
 
     # Рассчитываем проценты для каждой категории
     df["Percentage"] = (df["N"] / total_representatives * 100).round(2)
 
-    # Формируем итоговый DataFrame с необходимыми колонками
-    df_ranks_grouped_N = (
-        df[["category_id", "N", "Percentage"]]
-        .sort_values(by="N", ascending=False)
-        .reset_index(drop=True)
-        .copy()
+    return df.sort_values(by="N", ascending=False, kind="stable").reset_index(
+        drop=True
+    )  # Возвращаем итоговый DataFrame
+
+
+def recommend_categories_batch(
+    df_ranks_grouped, interactions_data, total_representatives=10
+):
+    """
+    Рекомендует категории сразу для многих пользователей за один вызов.
+
+    Пользователи, у которых суммарный вес категорий не положителен,
+    в результат не попадают.
+
+    Args:
+        df_ranks_grouped (pd.DataFrame): DataFrame с агрегированными рангами категорий.
+        interactions_data (pd.DataFrame): Взаимодействия пользователей с колонкой 'user_id'.
+        total_representatives (int): Общее количество рекомендованных видео.
+
+    Returns:
+        pd.DataFrame: DataFrame с колонками 'user_id', 'category_id', 'N', 'Percentage'.
+    """
+    categories = df_ranks_grouped["category_id"]
+
+    # Матрица изменений весов пользователи × категории
+    deltas = (
+        interactions_data.assign(
+            weight=interactions_data["interaction_type"]
+            .map(INTERACTION_WEIGHTS)
+            .fillna(0)
+        )
+        .pivot_table(
+            index="user_id",
+            columns="category_id",
+            values="weight",
+            aggfunc="sum",
+            fill_value=0,
+            observed=True,
+        )
+        .reindex(columns=categories, fill_value=0)
+    )
+    weights = deltas.to_numpy(dtype="float64") + _category_weights(df_ranks_grouped)
+
+    # Отбрасываем пользователей с невалидными весами
+    valid = weights.sum(axis=1) > 0
+    counts = apportion(weights[valid], total_representatives)
+
+    df = pd.DataFrame(
+        {
+            "user_id": np.repeat(deltas.index[valid], len(categories)),
+            "category_id": np.tile(categories.to_numpy(), int(valid.sum())),
+            "N": counts.ravel(),
+        }
     )
+    df["Percentage"] = (df["N"] / total_representatives * 100).round(2)
+
+    return df
+
+
+class CategoryWeights:
+    """
+    Вектор весов категорий одного пользователя, обновляемый инкрементально.
+
+    Каждое взаимодействие меняет вес одной категории за O(1), поэтому
+    время рекомендации не зависит от размера журнала взаимодействий.
+    """
+
+    def __init__(self, df_ranks_grouped):
+        self.categories = df_ranks_grouped["category_id"].to_numpy()  # Категории
+        self._positions = {
+            category: position for position, category in enumerate(self.categories)
+        }  # Категория → позиция в векторе весов
+        self.weights = _category_weights(df_ranks_grouped).copy()  # Веса категорий
+        self.likes = np.zeros(len(self.categories))  # Лайки по категориям
+        self.dislikes = np.zeros(len(self.categories))  # Дизлайки по категориям
+
+    @classmethod
+    def from_arrays(cls, categories, weights, likes, dislikes):
+        """
+        Восстанавливает веса из сохранённых массивов.
+
+        Args:
+            categories (Sequence[str]): Категории.
+            weights (np.ndarray): Веса категорий.
+            likes (np.ndarray): Лайки по категориям.
+            dislikes (np.ndarray): Дизлайки по категориям.
+
+        Returns:
+            CategoryWeights: Веса категорий пользователя.
+        """
+        self = cls.__new__(cls)
+        self.categories = np.asarray(categories, dtype=object)
+        self._positions = {
+            category: position for position, category in enumerate(self.categories)
+        }
+        self.weights, self.likes, self.dislikes = weights, likes, dislikes
+        return self
+
+    def update(self, category_id, interaction_type):
+        """
+        Учитывает одно взаимодействие пользователя.
+
+        Args:
+            category_id (str): Категория видео.
+            interaction_type (str): Тип взаимодействия.
+        """
+        position = self._positions.get(category_id)
+        if position is not None:
+            self.weights[position] += INTERACTION_WEIGHTS.get(interaction_type, 0)
+            self.likes[position] += interaction_type == "like"
+            self.dislikes[position] += interaction_type == "dislike"
+
+    def update_many(self, interactions_data):
+        """
+        Учитывает взаимодействия из DataFrame в порядке их следования.
+
+        Args:
+            interactions_data (pd.DataFrame): DataFrame с данными взаимодействий.
+        """
+        if interactions_data.empty:
+            return
+        for category_id, interaction_type in zip(
+            interactions_data["category_id"], interactions_data["interaction_type"]
+        ):
+            self.update(category_id, interaction_type)
+
+    def feedback_counts(self, categories):
+        """
+        Возвращает лайки и дизлайки пользователя в порядке заданных категорий.
+
+        Args:
+            categories (Sequence[str]): Категории.
 
-    return df_ranks_grouped_N  # Возвращаем итоговый DataFrame
+        Returns:
+            tuple: Массивы лайков и дизлайков.
+        """
+        positions = np.array([self._positions.get(c, -1) for c in categories])
+        known = positions >= 0
+        likes, dislikes = np.zeros(len(positions)), np.zeros(len(positions))
+        likes[known] = self.likes[positions[known]]
+        dislikes[known] = self.dislikes[positions[known]]
+        return likes, dislikes
+
+    def recommend(self, total_representatives=10):
+        """
+        Рекомендует категории по текущим весам пользователя.
+
+        Args:
+            total_representatives (int): Общее количество рекомендованных видео.
+
+        Returns:
+            pd.DataFrame: DataFrame с категориями, количеством видео и процентами.
+        """
+        if self.weights.sum() <= 0:
+            raise ValueError(
+                "Все веса категорий стали отрицательными или равны нулю."
+            )  # Проверка на валидность весов
+
+        df = pd.DataFrame(
+            {
+                "category_id": self.categories,
+                "N": apportion(self.weights, total_representatives),
+            }
+        )
+        df["Percentage"] = (df["N"] / total_representatives * 100).round(2)
+
+        return df.sort_values(by="N", ascending=False, kind="stable").reset_index(
+            drop=True
+        )
+
+
+def recommend_subcategories(title_index, liked_positions, top_k=5):
+    """
+    Рекомендует подкатегории, близкие к понравившимся пользователю видео.
+
+    Args:
+        title_index (TitleIndex): Индекс названий видео.
+        liked_positions (list[int]): Позиции понравившихся видео в каталоге.
+        top_k (int): Количество подкатегорий.
+
+    Returns:
+        pd.DataFrame: DataFrame с колонками 'category_id', 'subcategory',
+            'name', 'score'.
+    """
+    if len(liked_positions) == 0:
+        return pd.DataFrame(columns=["category_id", "subcategory", "name", "score"])
+
+    # Профиль пользователя — нормированное среднее векторов понравившихся видео
+    profile = np.asarray(
+        title_index.vectors[np.sort(liked_positions)], dtype=np.float32
+    ).mean(axis=0)
+    profile /= max(np.linalg.norm(profile), 1e-12)
+    return title_index.top_subcategories(profile, top_k)
+
+
+def recommend_next_videos(video_id, coview_index, k=10, seen=None):
+    """
+    Рекомендует видео, которые зрители данного видео смотрели также.
+
+    Поиск — обращение к словарю ID и срез массивов CSR индекса совместных
+    просмотров, без вычислений по логам.
+
+    Args:
+        video_id (str): ID видео.
+        coview_index (CoViewIndex): Индекс совместных просмотров.
+        k (int): Количество видео.
+        seen (SeenSet, optional): Позиции видео, которые нужно пропустить.
+
+    Returns:
+        np.ndarray: ID видео по убыванию числа совместных просмотров
+            (пустой массив для неизвестного видео).
+    """
+    position = coview_index.position(video_id)
+    if position < 0:
+        return np.empty(0, dtype=object)
+    neighbours = coview_index.neighbours(position, k, seen)
+    return coview_index.ids.decode("video_id", coview_index.video_codes[neighbours])
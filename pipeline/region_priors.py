@@ -0,0 +1,171 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from data_processing import aggregate_watchtime_partials, ranks_from_partials
+
+
+class RegionPriors:
+    """
+    Ранги категорий по каждому региону с общим рангом для остальных.
+
+    Для каждого региона хранится ранг категорий по среднему watchtime
+    (0 — категория не вошла в топ региона), поэтому первая рекомендация
+    для региона пользователя — это обращение по словарю без пересчёта
+    объединений и рангов. Для неизвестных регионов и регионов с малым числом
+    просмотров используется средний ранг по всем регионам, как в
+    get_initial_info.
+    """
+
+    def __init__(self, ranks, global_ranks, regions, categories, fingerprint=""):
+        self.ranks = ranks  # Ранги категорий, массив (регионы, категории)
+        self.global_ranks = global_ranks  # Средний ранг по всем регионам
+        self.regions = np.asarray(regions, dtype=object)  # Регионы
+        self.categories = np.asarray(categories, dtype=object)  # Категории
+        self.fingerprint = fingerprint  # Отпечаток логов и каталога рангов
+        self._region_positions = {
+            region: position for position, region in enumerate(self.regions)
+        }
+
+    def __contains__(self, region):
+        return region in self._region_positions
+
+    def ranks_for(self, region=None):
+        """
+        Возвращает ранги категорий для региона.
+
+        Args:
+            region (str, optional): Регион пользователя.
+
+        Returns:
+            pd.DataFrame: DataFrame с колонками 'category_id' и 'avg_rank',
+                как df_ranks_grouped из get_initial_info.
+        """
+        position = self._region_positions.get(region)
+        ranks = self.global_ranks if position is None else self.ranks[position]
+        present = ranks > 0
+        return pd.DataFrame(
+            {"category_id": self.categories[present], "avg_rank": ranks[present]}
+        )
+
+    def save(self, path):
+        """
+        Сохраняет ранги в сжатый файл .npz.
+
+        Args:
+            path (str): Путь к файлу.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            ranks=self.ranks,
+            global_ranks=self.global_ranks,
+            regions=self.regions.astype(str),
+            categories=self.categories.astype(str),
+            fingerprint=self.fingerprint,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Загружает ранги из файла .npz.
+
+        Args:
+            path (str): Путь к файлу.
+
+        Returns:
+            RegionPriors: Загруженные ранги.
+        """
+        with np.load(path) as data:
+            return cls(
+                data["ranks"],
+                data["global_ranks"],
+                data["regions"],
+                data["categories"],
+                # Файлы без отпечатка не совпадают ни с какими исходными данными
+                str(data["fingerprint"]) if "fingerprint" in data else "",
+            )
+
+
+def build_region_priors(partials, min_views=1000, top_k=10):
+    """
+    Строит ранги категорий по регионам из частичных сумм watchtime.
+
+    Args:
+        partials (pd.DataFrame): Частичные суммы по региону и категории
+            (результат aggregate_watchtime_partials).
+        min_views (int): Минимум просмотров в регионе, иначе для него
+            используется общий ранг.
+        top_k (int): Количество категорий в топе региона.
+
+    Returns:
+        RegionPriors: Ранги категорий по регионам.
+    """
+    df = (
+        partials.astype({"region": str, "category_id": str})
+        .sort_values(["region", "category_id"])
+        .reset_index(drop=True)
+    )
+    df["avg_watchtime"] = df["watchtime_sum"] / df["watchtime_count"]
+    # Ранг категории внутри региона, как в _rank_categories
+    df["rank"] = df.groupby("region", observed=True)["avg_watchtime"].rank(
+        method="first", ascending=False
+    )
+
+    region_codes, regions = pd.factorize(df["region"], sort=True)
+    category_codes, categories = pd.factorize(df["category_id"], sort=True)
+    regions = np.asarray(regions, dtype=object)
+    categories = np.asarray(categories, dtype=object)
+    ranks = np.zeros((len(regions), len(categories)), dtype=np.float32)
+    top = df["rank"].to_numpy() <= top_k
+    ranks[region_codes[top], category_codes[top]] = df["rank"].to_numpy()[top]
+
+    # Регионы с малым числом просмотров не храним — для них общий ранг
+    views = np.bincount(
+        region_codes, weights=df["watchtime_count"], minlength=len(regions)
+    )
+    dense = views >= min_views
+
+    _, df_ranks_grouped = ranks_from_partials(partials)
+    global_ranks = (
+        pd.Series(categories)
+        .map(df_ranks_grouped.set_index("category_id")["avg_rank"])
+        .fillna(0)
+        .to_numpy(dtype=np.float32)
+    )
+
+    return RegionPriors(ranks[dense], global_ranks, regions[dense], categories)
+
+
+@st.cache_resource
+def load_region_priors(_df_video, logs_path, fingerprint, backend="pandas"):
+    """
+    Возвращает общие для всех сессий ранги категорий по регионам.
+
+    Ранги сохраняются рядом с файлом логов вместе с отпечатком исходных
+    данных и пересчитываются, если изменились логи или каталог.
+
+    Args:
+        _df_video (pd.DataFrame): DataFrame с данными о видео (не хешируется).
+        logs_path (str): Путь к Parquet-файлу логов.
+        fingerprint (str): Отпечаток файлов логов и каталога.
+        backend (str): Движок агрегаций из BACKENDS для частичных сумм.
+
+    Returns:
+        RegionPriors: Ранги категорий по регионам.
+    """
+    priors_path = f"{logs_path}.region_priors.npz"
+    if os.path.exists(priors_path):
+        priors = RegionPriors.load(priors_path)
+        if priors.fingerprint == fingerprint:
+            return priors
+
+    priors = build_region_priors(
+        aggregate_watchtime_partials([logs_path], _df_video, backend=backend)
+    )
+    priors.fingerprint = fingerprint
+    priors.save(priors_path)
+    return priors
@@ -0,0 +1,324 @@
+"""
+Безголовый прогон алгоритма холодного старта без интерфейса Streamlit.
+
+Воспроизводит взаимодействия пользователей из CSV-файла или синтетического
+потока через рекомендации категорий и выбор подборки видео, распределяя
+пользователей по пулу процессов, и выводит пропускную способность,
+перцентили задержек и метрики качества. Ранги категорий и индекс
+популярности считаются один раз в снимок состояния, который каждый
+процесс отображает в память.
+
+Пример запуска из корня репозитория:
+    python pipeline/replay.py --interactions user_interactions.csv --workers 4
+    python pipeline/replay.py --synthetic-users 10000 --events-per-user 20
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from compute_backends import BACKENDS
+from popularity_index import SeenSet
+from recommendation_engine import (
+    INTERACTION_WEIGHTS,
+    CategoryWeights,
+    first_recommend_categories,
+)
+from slate_sampler import SAMPLING_MODES, SlateSampler
+from snapshot import build_snapshot, read_snapshot, snapshot_path
+from utils import VIDEO_COLUMNS, load_file
+from videos_interactions import select_slate
+
+# Состояние процесса-обработчика, загружается один раз при его запуске
+_worker_state = {}
+
+
+def prepare_snapshot(logs_path, videos_path, backend="pandas"):
+    """
+    Возвращает папку снимка для текущих файлов, при необходимости строит его.
+
+    Args:
+        logs_path (str): Путь к Parquet-файлу логов.
+        videos_path (str): Путь к Parquet-файлу каталога видео.
+        backend (str): Движок агрегаций из BACKENDS для построения снимка.
+
+    Returns:
+        str: Папка снимка.
+    """
+    path = snapshot_path(logs_path, videos_path)
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        path = build_snapshot(logs_path, videos_path, os.path.dirname(path), backend)
+    return path
+
+
+def load_engine_state(path, videos_path):
+    """
+    Отображает снимок в память и готовит всё, что нужно для рекомендаций.
+
+    Args:
+        path (str): Папка снимка (prepare_snapshot).
+        videos_path (str): Путь к Parquet-файлу каталога видео.
+
+    Returns:
+        dict: Каталог, ранги категорий, первая рекомендация и индекс популярности.
+    """
+    snapshot = read_snapshot(path, videos_path)
+    return {
+        "df_video": snapshot.videos.df,
+        "df_ranks_grouped": snapshot.df_ranks_grouped,
+        "prior": first_recommend_categories(snapshot.df_ranks_grouped),
+        "category_index": snapshot.category_index,
+    }
+
+
+def synthetic_interactions(df_video, n_users, events_per_user, seed=0):
+    """
+    Генерирует синтетический поток взаимодействий пользователей.
+
+    Args:
+        df_video (pd.DataFrame): DataFrame с данными о видео.
+        n_users (int): Количество пользователей.
+        events_per_user (int): Количество взаимодействий на пользователя.
+        seed (int): Зерно генератора случайных чисел.
+
+    Returns:
+        pd.DataFrame: DataFrame с колонками 'user_id', 'video_id',
+            'category_id', 'interaction_type'.
+    """
+    rng = np.random.default_rng(seed)
+    n_events = n_users * events_per_user
+    positions = rng.integers(0, len(df_video), n_events)
+
+    return pd.DataFrame(
+        {
+            "user_id": np.repeat(
+                [f"synthetic-{user}" for user in range(n_users)], events_per_user
+            ),
+            "video_id": df_video["video_id"].to_numpy()[positions],
+            "category_id": df_video["category_id"].to_numpy()[positions],
+            "interaction_type": rng.choice(list(INTERACTION_WEIGHTS), n_events),
+        }
+    )
+
+
+def replay_user(state, interactions, sampler):
+    """
+    Воспроизводит взаимодействия одного пользователя.
+
+    Перед каждым взаимодействием строится подборка, как при отрисовке
+    страницы, после чего взаимодействие учитывается в весах категорий.
+
+    Args:
+        state (dict): Результат load_engine_state.
+        interactions (pd.DataFrame): Взаимодействия пользователя по порядку.
+        sampler (SlateSampler): Выбор категорий и видео подборки.
+
+    Returns:
+        dict: Задержки подборок, показанные позиции и попадания в категории.
+    """
+    weights = CategoryWeights(state["prior"])
+    seen = SeenSet()
+    latencies, hits, positive_events = [], 0, 0
+    video_categories = state["df_video"]["category_id"].to_numpy()
+
+    for category_id, interaction_type in zip(
+        list(interactions["category_id"]) + [None],
+        list(interactions["interaction_type"]) + [None],
+    ):
+        start = time.perf_counter()
+        try:
+            number_videos_from_cat = weights.recommend()
+        except ValueError:
+            number_videos_from_cat = state["prior"]
+        select_slate(number_videos_from_cat, sampler, seen, category_weights=weights)
+        latencies.append(time.perf_counter() - start)
+
+        if category_id is None:
+            break  # Последняя подборка после всех взаимодействий
+        # Попала ли категория положительного взаимодействия в рекомендацию
+        if INTERACTION_WEIGHTS.get(interaction_type, 0) > 0:
+            positive_events += 1
+            recommended = number_videos_from_cat.loc[
+                number_videos_from_cat["N"] > 0, "category_id"
+            ]
+            hits += int((recommended == category_id).any())
+        weights.update(category_id, interaction_type)
+
+    return {
+        "latencies": latencies,
+        "positions": seen.positions,
+        "categories": np.unique(video_categories[seen.positions]).tolist(),
+        "hits": hits,
+        "positive_events": positive_events,
+    }
+
+
+def _init_worker(path, videos_path):
+    _worker_state.update(load_engine_state(path, videos_path))
+
+
+def _replay_chunk(chunk, seed, mode):
+    """
+    Воспроизводит группу пользователей в процессе-обработчике.
+    """
+    sampler = SlateSampler(_worker_state["category_index"], mode, seed=seed)
+    return [
+        replay_user(_worker_state, interactions, sampler)
+        for _, interactions in chunk.groupby("user_id", sort=False)
+    ]
+
+
+def run_replay(
+    interactions,
+    logs_path,
+    videos_path,
+    workers=os.cpu_count(),
+    chunk_users=256,
+    seed=0,
+    mode="proportional",
+    backend="pandas",
+):
+    """
+    Воспроизводит взаимодействия всех пользователей в пуле процессов.
+
+    Args:
+        interactions (pd.DataFrame): Взаимодействия с колонкой 'user_id'.
+        logs_path (str): Путь к Parquet-файлу логов.
+        videos_path (str): Путь к Parquet-файлу каталога видео.
+        workers (int): Количество процессов.
+        chunk_users (int): Количество пользователей в одной задаче.
+        seed (int): Зерно генератора случайных чисел.
+        mode (str): Режим выбора категорий подборки (SAMPLING_MODES).
+        backend (str): Движок агрегаций из BACKENDS.
+
+    Returns:
+        dict: Отчёт с пропускной способностью, задержками и метриками качества.
+    """
+    # Состояние считается один раз, процессы только отображают снимок
+    path = prepare_snapshot(logs_path, videos_path, backend)
+    state = load_engine_state(path, videos_path)
+    user_codes, _ = pd.factorize(interactions["user_id"])
+    chunks = [
+        chunk for _, chunk in interactions.groupby(user_codes // chunk_users)
+    ]  # Группы по chunk_users пользователей
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(path, videos_path),
+    ) as executor:
+        results = [
+            result
+            for chunk_results in executor.map(
+                _replay_chunk,
+                chunks,
+                range(seed, seed + len(chunks)),
+                [mode] * len(chunks),
+            )
+            for result in chunk_results
+        ]
+    elapsed = time.perf_counter() - start
+
+    return build_report(
+        results,
+        len(state["category_index"].categories),
+        len(state["df_video"]),
+        elapsed,
+    )
+
+
+def build_report(results, n_categories, n_videos, elapsed):
+    """
+    Сводит результаты пользователей в отчёт.
+
+    Args:
+        results (list[dict]): Результаты replay_user.
+        n_categories (int): Количество категорий в индексе популярности.
+        n_videos (int): Количество видео в каталоге.
+        elapsed (float): Время прогона, сек.
+
+    Returns:
+        dict: Отчёт с пропускной способностью, задержками и метриками качества.
+    """
+    latencies = np.concatenate([result["latencies"] for result in results]) * 1000
+    shown_videos = np.unique(
+        np.concatenate([result["positions"] for result in results])
+    )
+    positive_events = sum(result["positive_events"] for result in results)
+
+    return {
+        "users": len(results),
+        "slates": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "users_per_s": round(len(results) / elapsed, 1),
+        "slates_per_s": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            f"p{q}": round(float(np.percentile(latencies, q)), 3) for q in (50, 90, 99)
+        },
+        # Средняя доля категорий каталога, показанных одному пользователю
+        "category_coverage": round(
+            float(np.mean([len(result["categories"]) for result in results]))
+            / n_categories,
+            4,
+        ),
+        # Доля каталога, показанная хотя бы одному пользователю
+        "catalog_coverage": round(len(shown_videos) / n_videos, 6),
+        # Доля лайков и комментариев в категориях, которые были рекомендованы
+        "category_hit_rate": round(
+            sum(result["hits"] for result in results) / max(positive_events, 1), 4
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logs", default="data/sample.parquet")
+    parser.add_argument("--videos", default="data/video_stat.parquet")
+    parser.add_argument(
+        "--interactions",
+        default="user_interactions.csv",
+        help="CSV-файл взаимодействий для воспроизведения",
+    )
+    parser.add_argument(
+        "--synthetic-users",
+        type=int,
+        default=0,
+        help="Вместо CSV сгенерировать поток для указанного числа пользователей",
+    )
+    parser.add_argument("--events-per-user", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--sampling-mode", choices=SAMPLING_MODES, default="proportional"
+    )
+    parser.add_argument("--backend", choices=BACKENDS, default="pandas")
+    args = parser.parse_args()
+
+    if args.synthetic_users:
+        df_video = load_file(args.videos, file_type="parquet", columns=VIDEO_COLUMNS)
+        interactions = synthetic_interactions(
+            df_video, args.synthetic_users, args.events_per_user, args.seed
+        )
+    else:
+        interactions = pd.read_csv(args.interactions)
+
+    report = run_replay(
+        interactions,
+        args.logs,
+        args.videos,
+        workers=args.workers,
+        seed=args.seed,
+        mode=args.sampling_mode,
+        backend=args.backend,
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
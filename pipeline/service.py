@@ -0,0 +1,464 @@
+"""
+HTTP/JSON-сервис рекомендаций на asyncio (tornado) без интерфейса Streamlit.
+
+Отображает снимок каталога, рангов категорий и индексов при запуске и
+отдаёт подборки видео по HTTP:
+    POST /slate/first   {"user_id", "region"} — первая подборка (поля необязательны)
+    POST /interactions  {"user_id", "video_id", "interaction_type"}
+    GET  /slate/next?user_id=... — следующая подборка с учётом взаимодействий
+    GET  /videos/next?video_id=...&k=10 — видео, которые смотрели зрители этого видео
+    GET  /metrics[?format=json] — метрики этапов (Prometheus или JSON Lines)
+
+Состояние пользователя (веса категорий, показанные видео, последняя
+подборка) хранится в UserStateStore с ограничением памяти и вытеснением
+в файл; взаимодействия пишутся в общий журнал InteractionStore.
+Статистика видео обновляется на месте из файлов изменений (StatsUpdater).
+
+Пример запуска из корня репозитория:
+    python pipeline/service.py --port 8888
+"""
+
+import argparse
+import json
+import signal
+import uuid
+
+import numpy as np
+import pandas as pd
+import tornado.ioloop
+import tornado.web
+
+from compute_backends import BACKENDS
+from coviews import load_coview_index
+from id_interning import code_positions, interner_path, load_interner
+from interaction_store import InteractionStore
+from metrics import REGISTRY, track
+from recommendation_engine import (
+    INTERACTION_WEIGHTS,
+    CategoryWeights,
+    first_recommend_categories,
+    recommend_next_videos,
+)
+from slate_sampler import SAMPLING_MODES, SlateSampler
+from snapshot import load_snapshot
+from stats_updates import STATS_COLUMNS, StatsUpdater, deltas_path, stats_state_path
+from title_embeddings import load_title_index
+from user_state import UserState, UserStateStore
+from utils import get_current_time_specific_info
+from videos_interactions import liked_video_candidates, select_slate
+
+# Поля видео, которые возвращаются в подборке
+SLATE_FIELDS = ["video_id", "title", "category_id", "v_year_views", "v_pub_datetime"]
+
+
+class RecommendationService:
+    """
+    Движок рекомендаций, общий для всех запросов процесса.
+
+    Всё, что не зависит от пользователя, считается при создании: позиции
+    видео по video_id, колонки каталога для ответа и первая рекомендация
+    для каждого часа суток. Запрос только читает эти структуры и меняет
+    состояние своего пользователя, поэтому каталог не копируется.
+    """
+
+    def __init__(
+        self,
+        logs_path,
+        videos_path,
+        store_path,
+        seed=0,
+        mode="proportional",
+        backend="pandas",
+        state_spill_path=None,
+        state_max_bytes=256 * 2**20,
+        state_ttl=24 * 3600,
+        stats_deltas_path=None,
+    ):
+        # Каталог, ранги и индексы отображаются из снимка состояния
+        snapshot = load_snapshot(logs_path, videos_path, backend)
+        df_video = snapshot.videos.df
+        self.df_ranks_grouped = snapshot.df_ranks_grouped
+        self.category_index = snapshot.category_index
+        self.time_cube = snapshot.time_cube
+        self.region_priors = snapshot.region_priors
+        self.title_index = load_title_index(
+            df_video, videos_path, snapshot.videos.fingerprint
+        )
+        self.coview_index = load_coview_index(
+            df_video, logs_path, videos_path, snapshot.path
+        )
+        # Журнал кодирует ID общим с каталогом словарём
+        self.store = InteractionStore(
+            store_path, load_interner(interner_path(videos_path))
+        )
+        self.sampler = SlateSampler(self.category_index, mode, seed=seed)
+        # Изменения статистики применяются к каталогу и индексу на месте
+        self.stats = StatsUpdater(
+            df_video,
+            self.category_index,
+            stats_deltas_path or deltas_path(videos_path),
+            stats_state_path(snapshot.path),
+        )
+        self.df_video = df_video  # Общий каталог, колонки статистики обновляются
+
+        # video_id → позиция; индекс строк Python: поиск в Arrow-индексе
+        # переводит весь каталог в объекты при каждом вызове
+        self.video_positions = pd.Index(df_video["video_id"].to_numpy(dtype=object))
+        self.video_categories = df_video["category_id"].to_numpy()
+        # video_code → позиция для видео из журнала
+        self.positions_by_code = code_positions(df_video["video_code"])
+        self.slate_columns = {
+            field: df_video[field].to_numpy() for field in SLATE_FIELDS
+        }  # Колонки каталога без копирования строк
+        self._slate_columns_version = self.stats.version
+        self._hourly_priors = {}  # (регион, топ категорий часа) → рекомендация
+        # user_id → UserState с вытеснением давних записей
+        # Позиции видео записей сохраняются кодами каталога и переживают
+        # его изменение между перезапусками
+        self.sessions = UserStateStore(
+            state_max_bytes,
+            state_ttl,
+            state_spill_path,
+            df_video["video_code"].to_numpy(),
+        )
+
+    def first_slate(self, user_id=None, region=None):
+        """
+        Начинает сессию пользователя и возвращает первую подборку.
+
+        Состояние известного пользователя сохраняется: показанные видео
+        не повторяются, а веса пересчитываются, только если изменился регион.
+
+        Args:
+            user_id (str, optional): ID пользователя, по умолчанию новый.
+            region (str, optional): Регион пользователя, по умолчанию прежний.
+
+        Returns:
+            dict: ID пользователя и подборка видео.
+        """
+        new_user = not user_id
+        user_id = user_id or str(uuid.uuid4())
+        if region is not None:
+            # Регион нужен, чтобы восстановить веса пользователя по журналу
+            self.store.set_user_region(user_id, region)
+        if new_user:
+            prior = self._current_prior(region)
+            session = UserState(user_id, CategoryWeights(prior), region)
+            return {"user_id": user_id, "videos": self._slate(prior, session)}
+
+        session = self._session(user_id)
+        if region is not None and region != session.region:
+            # Веса от ранга нового региона и сохранённых взаимодействий
+            session.weights = CategoryWeights(self._current_prior(region))
+            session.weights.update_many(self.store.user_history(user_id))
+            session.region = region
+        return {
+            "user_id": user_id,
+            "videos": self._slate(self._recommend(session), session),
+        }
+
+    def submit_interaction(self, user_id, video_id, interaction_type):
+        """
+        Записывает взаимодействие и обновляет веса категорий пользователя.
+
+        Args:
+            user_id (str): ID пользователя.
+            video_id (str): ID видео.
+            interaction_type (str): Тип взаимодействия.
+
+        Returns:
+            dict: Категория видео.
+        """
+        if interaction_type not in INTERACTION_WEIGHTS:
+            raise ValueError(f"Неизвестный тип взаимодействия: {interaction_type}")
+        position = self.video_positions.get_indexer([video_id])[0]
+        if position < 0:
+            raise KeyError(video_id)
+
+        category_id = self.video_categories[position]
+        session = self._session(user_id)
+        session.weights.update(category_id, interaction_type)
+        if interaction_type == "like":
+            session.like(position)
+        self.sessions.put(session)
+        with track("log_user_interaction") as record:
+            self.store.append(
+                [
+                    {
+                        "user_id": user_id,
+                        "video_id": video_id,
+                        "category_id": category_id,
+                        "interaction_type": interaction_type,
+                    }
+                ]
+            )
+            record.rows = 1
+        return {"category_id": category_id}
+
+    def next_slate(self, user_id):
+        """
+        Возвращает следующую подборку с учётом взаимодействий пользователя.
+
+        Args:
+            user_id (str): ID пользователя.
+
+        Returns:
+            dict: ID пользователя и подборка видео.
+        """
+        session = self._session(user_id)
+        return {
+            "user_id": user_id,
+            "videos": self._slate(self._recommend(session), session),
+        }
+
+    def next_videos(self, video_id, k=10):
+        """
+        Возвращает видео, которые зрители данного видео смотрели также.
+
+        Args:
+            video_id (str): ID видео.
+            k (int): Количество видео.
+
+        Returns:
+            dict: ID видео и список видео.
+        """
+        with track("next_videos") as record:
+            video_ids = recommend_next_videos(video_id, self.coview_index, k)
+            record.rows = len(video_ids)
+        positions = self.video_positions.get_indexer(video_ids)
+        return {"video_id": video_id, "videos": self._rows(positions)}
+
+    def _session(self, user_id):
+        session = self.sessions.get(user_id)
+        if session is None:
+            # Пользователь без сохранённого состояния: регион, веса,
+            # показанные и понравившиеся видео по журналу
+            region = self.store.user_region(user_id)
+            session = UserState(
+                user_id, CategoryWeights(self._current_prior(region)), region
+            )
+            history = self.store.user_history(user_id)
+            session.weights.update_many(history)
+            session.restore(history, self.positions_by_code)
+            self.sessions.put(session)
+        return session
+
+    def _recommend(self, session):
+        try:
+            with track("recommend_categories"):
+                return session.weights.recommend()
+        except ValueError:
+            # Все веса обнулились
+            return self._current_prior(session.region)
+
+    def _current_prior(self, region=None):
+        top = get_current_time_specific_info(self.time_cube, region)
+        # Топ категорий меняется раз в час; неизвестные регионы делят общий ключ
+        if region not in self.region_priors:
+            region = None
+        key = (region, tuple(top["category_id"]))
+        if key not in self._hourly_priors:
+            self._hourly_priors[key] = first_recommend_categories(
+                self.df_ranks_grouped,
+                current_popularity=top,
+                region=region,
+                region_priors=self.region_priors,
+            )
+        return self._hourly_priors[key]
+
+    def _slate(self, number_videos_from_cat, session):
+        similar_positions = []
+        if session.last_liked_position is not None:
+            # После лайка половину подборки занимают видео, которые смотрели
+            # зрители понравившегося видео, и видео с похожими названиями
+            with track("similar_videos") as record:
+                similar_positions = liked_video_candidates(
+                    session.last_liked_position,
+                    int(number_videos_from_cat["N"].sum()) // 2,
+                    session.seen,
+                    self.coview_index,
+                    self.title_index,
+                )
+                record.rows = len(similar_positions)
+            session.last_liked_position = None
+        with track("select_slate") as record:
+            positions = select_slate(
+                number_videos_from_cat,
+                self.sampler,
+                session.seen,
+                similar_positions,
+                session.weights,
+            )
+            record.rows = len(positions)
+        session.last_slate = np.asarray(positions, dtype=np.int32)
+        self.sessions.put(session)
+        return self._rows(positions)
+
+    def _rows(self, positions):
+        if self._slate_columns_version != self.stats.version:
+            # Колонка статистики расширена новым типом: берём новый массив
+            for field in SLATE_FIELDS:
+                if field in STATS_COLUMNS:
+                    self.slate_columns[field] = self.df_video[field].to_numpy()
+            self._slate_columns_version = self.stats.version
+        return [
+            {
+                field: _to_json(values[position])
+                for field, values in self.slate_columns.items()
+            }
+            for position in positions
+        ]
+
+
+def _to_json(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, service):
+        self.service = service
+
+    def write_json(self, data, status=200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(data, ensure_ascii=False))
+
+    def body_json(self):
+        try:
+            return json.loads(self.request.body or b"{}")
+        except json.JSONDecodeError:
+            raise tornado.web.HTTPError(400, reason="Некорректный JSON")
+
+
+class FirstSlateHandler(BaseHandler):
+    def post(self):
+        body = self.body_json()
+        self.write_json(
+            self.service.first_slate(body.get("user_id"), body.get("region"))
+        )
+
+
+class InteractionHandler(BaseHandler):
+    def post(self):
+        body = self.body_json()
+        try:
+            result = self.service.submit_interaction(
+                body["user_id"], body["video_id"], body["interaction_type"]
+            )
+        except KeyError as e:
+            self.write_json({"error": f"Не найдено: {e}"}, status=404)
+        except ValueError as e:
+            self.write_json({"error": str(e)}, status=400)
+        else:
+            self.write_json(result)
+
+
+class NextSlateHandler(BaseHandler):
+    def get(self):
+        self.write_json(self.service.next_slate(self.get_argument("user_id")))
+
+
+class NextVideosHandler(BaseHandler):
+    def get(self):
+        try:
+            k = int(self.get_argument("k", "10"))
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason="Некорректный k")
+        if k < 1:
+            raise tornado.web.HTTPError(400, reason="Некорректный k")
+        self.write_json(self.service.next_videos(self.get_argument("video_id"), k))
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        if self.get_argument("format", "prometheus") == "json":
+            self.set_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.finish(REGISTRY.to_json_lines())
+        else:
+            self.set_header("Content-Type", "text/plain; version=0.0.4")
+            self.finish(REGISTRY.to_prometheus())
+
+
+def make_app(service):
+    """
+    Создаёт приложение tornado с обработчиками сервиса.
+
+    Args:
+        service (RecommendationService): Движок рекомендаций.
+
+    Returns:
+        tornado.web.Application: Приложение.
+    """
+    handlers = [
+        (r"/slate/first", FirstSlateHandler),
+        (r"/interactions", InteractionHandler),
+        (r"/slate/next", NextSlateHandler),
+        (r"/videos/next", NextVideosHandler),
+    ]
+    return tornado.web.Application(
+        [(pattern, handler, {"service": service}) for pattern, handler in handlers]
+        + [(r"/metrics", MetricsHandler)]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logs", default="data/sample.parquet")
+    parser.add_argument("--videos", default="data/video_stat.parquet")
+    parser.add_argument("--store", default="user_interactions.db")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--sampling-mode", choices=SAMPLING_MODES, default="proportional"
+    )
+    parser.add_argument("--backend", choices=BACKENDS, default="pandas")
+    parser.add_argument(
+        "--state-spill",
+        default="user_states.db",
+        help="Файл для вытесненных состояний пользователей, пустая строка — без файла",
+    )
+    parser.add_argument("--state-memory-mb", type=float, default=256)
+    parser.add_argument("--state-ttl", type=float, default=24 * 3600)
+    parser.add_argument(
+        "--stats-deltas",
+        help="Папка файлов изменений статистики, по умолчанию рядом с каталогом",
+    )
+    parser.add_argument(
+        "--stats-interval",
+        type=float,
+        default=60,
+        help="Интервал проверки файлов изменений, сек; 0 — не проверять",
+    )
+    args = parser.parse_args()
+
+    service = RecommendationService(
+        args.logs,
+        args.videos,
+        args.store,
+        args.seed,
+        args.sampling_mode,
+        args.backend,
+        args.state_spill or None,
+        int(args.state_memory_mb * 2**20),
+        args.state_ttl,
+        args.stats_deltas,
+    )
+    if args.stats_interval > 0:
+        service.stats.start(args.stats_interval)
+    make_app(service).listen(args.port)
+    print(f"Сервис рекомендаций слушает порт {args.port}", flush=True)
+
+    io_loop = tornado.ioloop.IOLoop.current()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        # Останавливаем цикл из обработчика сигнала, чтобы дописать буфер журнала
+        signal.signal(
+            signal_number, lambda *_: io_loop.add_callback_from_signal(io_loop.stop)
+        )
+    io_loop.start()
+    service.stats.stop()
+    service.store.close()
+    service.sessions.close()  # Состояния пользователей — в файл для продолжения
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import numpy as np
+
+# Режимы выбора категорий для подборки
+SAMPLING_MODES = ("proportional", "epsilon_greedy", "thompson")
+
+
+class SlateSampler:
+    """
+    Выбор категорий и видео подборки пропорционально весам движка.
+
+    Категории слотов подборки выбираются без возвращения методом
+    Efraimidis–Spirakis (Gumbel-top-k): у каждой категории slate_size
+    слотов, ключ слота — log(вес) плюс шум Гумбеля, в подборку попадают
+    слоты с наибольшими ключами. Внутри категории берутся самые популярные
+    ещё не показанные видео. Веса можно смешать с равномерным распределением
+    (epsilon-greedy) или умножить на выборку из Beta(1 + лайки,
+    1 + дизлайки) по категории (Thompson sampling). Все операции над
+    весами векторные по матрице пользователи × категории.
+    """
+
+    def __init__(self, category_index, mode="proportional", epsilon=0.1, seed=None):
+        if mode not in SAMPLING_MODES:
+            raise ValueError(f"Неизвестный режим выбора категорий: {mode}")
+        self.category_index = category_index  # Индекс популярности видео
+        self.mode = mode  # Режим выбора категорий
+        self.epsilon = epsilon  # Доля равномерного исследования категорий
+        self.rng = np.random.default_rng(seed)  # Генератор случайных чисел
+
+    def category_counts(self, weights, slate_size, likes=None, dislikes=None):
+        """
+        Распределяет слоты подборки по категориям для каждого пользователя.
+
+        Args:
+            weights (np.ndarray): Веса категорий (пользователи × категории)
+                или одномерный массив для одного пользователя.
+            slate_size (int): Количество видео в подборке.
+            likes (np.ndarray, optional): Лайки по категориям той же формы.
+            dislikes (np.ndarray, optional): Дизлайки по категориям той же формы.
+
+        Returns:
+            np.ndarray: Количество видео каждой категории (пользователи × категории).
+        """
+        weights = np.clip(np.atleast_2d(np.asarray(weights, dtype="float64")), 0, None)
+        n_users, n_categories = weights.shape
+        totals = weights.sum(axis=1, keepdims=True)
+        # Пользователи с нулевыми весами получают равномерное распределение
+        probs = np.divide(
+            weights,
+            totals,
+            out=np.full_like(weights, 1 / n_categories),
+            where=totals > 0,
+        )
+
+        if self.mode == "epsilon_greedy":
+            probs = (1 - self.epsilon) * probs + self.epsilon / n_categories
+        elif self.mode == "thompson":
+            likes = np.zeros_like(probs) if likes is None else np.atleast_2d(likes)
+            dislikes = (
+                np.zeros_like(probs) if dislikes is None else np.atleast_2d(dislikes)
+            )
+            # Сглаживание даёт шанс категориям с нулевым весом движка
+            theta = self.rng.beta(1 + likes, 1 + dislikes)
+            probs = (probs + self.epsilon / n_categories) * theta
+
+        # Gumbel-top-k по слотам: slate_size слотов на каждую категорию
+        with np.errstate(divide="ignore"):
+            keys = np.log(probs)[:, :, None] + self.rng.gumbel(
+                size=(n_users, n_categories, slate_size)
+            )
+        top = np.argpartition(-keys.reshape(n_users, -1), slate_size - 1, axis=1)[
+            :, :slate_size
+        ]
+
+        counts = np.zeros((n_users, n_categories), dtype=np.int64)
+        np.add.at(counts, (np.arange(n_users)[:, None], top // slate_size), 1)
+        return counts
+
+    def sample(
+        self, categories, weights, seen_sets, slate_size, likes=None, dislikes=None
+    ):
+        """
+        Собирает подборки видео для нескольких пользователей.
+
+        Args:
+            categories (Sequence[str]): Категории, соответствующие столбцам весов.
+            weights (np.ndarray): Веса категорий (пользователи × категории).
+            seen_sets (list[SeenSet]): Показанные видео каждого пользователя,
+                пополняются выбранными.
+            slate_size (int): Количество видео в подборке.
+            likes (np.ndarray, optional): Лайки по категориям.
+            dislikes (np.ndarray, optional): Дизлайки по категориям.
+
+        Returns:
+            list[np.ndarray]: Позиции видео в каталоге для каждого пользователя.
+        """
+        counts = self.category_counts(weights, slate_size, likes, dislikes)
+        slates = []
+        for user_counts, seen in zip(counts, seen_sets):
+            parts = [
+                self.category_index.top_videos(categories[code], int(n), seen=seen)
+                for code, n in zip(
+                    np.flatnonzero(user_counts), user_counts[user_counts > 0]
+                )
+            ]
+            positions = np.concatenate(parts) if parts else np.empty(0, np.int64)
+            positions = self.rng.permutation(positions)  # Перемешиваем категории
+            seen.add(positions)
+            slates.append(positions)
+        return slates
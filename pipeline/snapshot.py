@@ -0,0 +1,333 @@
+"""
+Снимок предрассчитанного состояния приложения для быстрого холодного старта.
+
+Снимок — папка с файлами, которые отображаются в память без разбора:
+каталог видео с колонками кодов ID (Arrow IPC), ранги категорий
+(Arrow IPC), индекс популярности, куб популярности по часам и ранги
+по регионам (.npy). Имя папки содержит версию формата и отпечатки файлов
+логов и каталога, поэтому при изменении исходных файлов снимок
+перестраивается, а приложение при запуске только отображает файлы
+и не читает логи.
+
+Пример запуска из корня репозитория:
+    python pipeline/snapshot.py --logs data/sample.parquet --videos data/video_stat.parquet
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+import pyarrow as pa
+import streamlit as st
+
+from compute_backends import BACKENDS
+from data_processing import get_initial_info
+from metrics import cached, record_work
+from popularity_index import CategoryIndex, build_category_index
+from region_priors import RegionPriors, load_region_priors
+from time_popularity import TimePopularityCube, load_time_popularity_cube
+from utils import (
+    LOG_COLUMNS,
+    VIDEO_COLUMNS,
+    DatasetHandle,
+    arrow_to_frame,
+    dataset_fingerprint,
+    load_dataset,
+    read_arrow_file,
+    write_arrow_file,
+)
+
+# Версия формата снимка; при её изменении старые снимки не читаются
+SNAPSHOT_VERSION = 1
+
+# Имя папки снимка: версия формата и начало ключа отпечатков
+SNAPSHOT_NAME = re.compile(rf"v{SNAPSHOT_VERSION}-[0-9a-f]{{16}}")
+
+# Таблицы снимка в формате Arrow IPC
+SNAPSHOT_TABLES = ["catalog", "ranks", "ranks_grouped"]
+
+# Массивы снимка в формате .npy
+SNAPSHOT_ARRAYS = [
+    "category_index.categories",
+    "category_index.bounds",
+    "category_index.order",
+    "time_cube.counts",
+    "time_cube.regions",
+    "time_cube.categories",
+    "region_priors.ranks",
+    "region_priors.global_ranks",
+    "region_priors.regions",
+    "region_priors.categories",
+]
+
+
+class Snapshot:
+    """
+    Предрассчитанное состояние приложения, общее для всех сессий.
+
+    Все таблицы и массивы ссылаются на отображённые в память файлы снимка,
+    поэтому изменять их нельзя; колонки статистики каталога и порядок
+    индекса популярности обновляет на месте только StatsUpdater.
+    """
+
+    def __init__(
+        self,
+        path,
+        videos,
+        df_ranks,
+        df_ranks_grouped,
+        category_index,
+        time_cube,
+        region_priors,
+    ):
+        self.path = path  # Папка снимка
+        self.videos = videos  # Каталог видео с колонками кодов ID
+        self.df_ranks = df_ranks  # Ранги категорий по регионам
+        self.df_ranks_grouped = df_ranks_grouped  # Средние ранги категорий
+        self.category_index = category_index  # Индекс популярности видео
+        self.time_cube = time_cube  # Популярность категорий по часам
+        self.region_priors = region_priors  # Ранги категорий по регионам
+
+
+def snapshot_root(videos_path):
+    """
+    Возвращает папку снимков рядом с файлом каталога.
+
+    Args:
+        videos_path (str): Путь к Parquet-файлу каталога.
+
+    Returns:
+        str: Путь к папке снимков.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(videos_path)), "snapshot")
+
+
+def snapshot_path(logs_path, videos_path, root=None):
+    """
+    Возвращает папку снимка для текущих версий файлов логов и каталога.
+
+    Args:
+        logs_path (str): Путь к Parquet-файлу логов.
+        videos_path (str): Путь к Parquet-файлу каталога.
+        root (str, optional): Папка снимков, по умолчанию рядом с каталогом.
+
+    Returns:
+        str: Путь к папке снимка.
+    """
+    key = hashlib.sha1(
+        repr(
+            [
+                SNAPSHOT_VERSION,
+                dataset_fingerprint(logs_path, columns=LOG_COLUMNS),
+                dataset_fingerprint(videos_path, columns=VIDEO_COLUMNS),
+            ]
+        ).encode()
+    ).hexdigest()
+    return os.path.join(
+        root or snapshot_root(videos_path), f"v{SNAPSHOT_VERSION}-{key[:16]}"
+    )
+
+
+def build_snapshot(logs_path, videos_path, root=None, backend="pandas"):
+    """
+    Считает состояние приложения по логам и каталогу и сохраняет снимок.
+
+    Снимок собирается во временной папке и атомарно переименовывается,
+    после чего снимки прежних версий файлов удаляются. Если другой процесс
+    уже сохранил тот же снимок, используется его папка.
+
+    Args:
+        logs_path (str): Путь к Parquet-файлу логов.
+        videos_path (str): Путь к Parquet-файлу каталога.
+        root (str, optional): Папка снимков, по умолчанию рядом с каталогом.
+        backend (str): Движок агрегаций из BACKENDS.
+
+    Returns:
+        str: Путь к папке снимка.
+    """
+    path = snapshot_path(logs_path, videos_path, root)
+    logs = load_dataset(logs_path, file_type="parquet", columns=LOG_COLUMNS)
+    videos = load_dataset(videos_path, file_type="parquet", columns=VIDEO_COLUMNS)
+    df_video = videos.df
+    df_ranks, df_ranks_grouped = get_initial_info(logs, videos, backend)
+    category_index = build_category_index(df_video)
+    # Производные логов пересчитываются при изменении логов или каталога
+    sources = f"{logs.fingerprint}:{videos.fingerprint}"
+    time_cube = load_time_popularity_cube(df_video, logs_path, sources, backend)
+    region_priors = load_region_priors(df_video, logs_path, sources, backend)
+
+    tables = {
+        "catalog": df_video,
+        "ranks": df_ranks,
+        "ranks_grouped": df_ranks_grouped,
+    }
+    categories = list(category_index.categories)
+    arrays = {
+        "category_index.categories": np.asarray(categories, dtype=str),
+        "category_index.bounds": np.array(
+            [category_index.offsets[category] for category in categories],
+            dtype=np.int64,
+        ).reshape(-1, 2),
+        "category_index.order": category_index.order,
+        "time_cube.counts": time_cube.counts,
+        "time_cube.regions": time_cube.regions.astype(str),
+        "time_cube.categories": time_cube.categories.astype(str),
+        "region_priors.ranks": region_priors.ranks,
+        "region_priors.global_ranks": region_priors.global_ranks,
+        "region_priors.regions": region_priors.regions.astype(str),
+        "region_priors.categories": region_priors.categories.astype(str),
+    }
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    for name, df in tables.items():
+        write_arrow_file(
+            pa.Table.from_pandas(df, preserve_index=False),
+            os.path.join(tmp_path, f"{name}.arrow"),
+        )
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), array)
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "logs": {"path": logs_path, "fingerprint": logs.fingerprint},
+        "videos": {"path": videos_path, "fingerprint": videos.fingerprint},
+        "created_at": time.time(),
+    }
+    # Манифест пишется последним: папка без него не считается снимком
+    with open(os.path.join(tmp_path, "manifest.json"), "w") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # Тот же снимок уже сохранил другой процесс
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.exists(os.path.join(path, "manifest.json")):
+            raise
+
+    # Снимки прежних версий файлов больше не нужны; уже отображённые
+    # другими процессами файлы остаются доступны им до закрытия. Папку
+    # снимков задаёт пользователь (--output), поэтому удаляются только
+    # папки с именем и манифестом снимка
+    root = os.path.dirname(path)
+    for name in os.listdir(root):
+        stale = os.path.join(root, name)
+        if (
+            stale != path
+            and SNAPSHOT_NAME.fullmatch(name)
+            and os.path.isfile(os.path.join(stale, "manifest.json"))
+        ):
+            shutil.rmtree(stale, ignore_errors=True)
+    return path
+
+
+def read_snapshot(path, videos_path):
+    """
+    Отображает сохранённый снимок в память.
+
+    Args:
+        path (str): Путь к папке снимка.
+        videos_path (str): Путь к Parquet-файлу каталога.
+
+    Returns:
+        Snapshot: Состояние приложения.
+
+    Raises:
+        ValueError: Снимок сохранён в другой версии формата.
+    """
+    with open(os.path.join(path, "manifest.json")) as file:
+        manifest = json.load(file)
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия снимка: {manifest['version']}")
+
+    tables = {}
+    for name in SNAPSHOT_TABLES:
+        # Отображение в память не читает данные: bytes_read не учитывается
+        table = read_arrow_file(os.path.join(path, f"{name}.arrow"))
+        # Строки каталога остаются в отображённом файле; небольшие таблицы
+        # рангов восстанавливаются с исходными типами колонок
+        tables[name] = arrow_to_frame(table) if name == "catalog" else table.to_pandas()
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        for name in SNAPSHOT_ARRAYS
+    }
+    record_work(rows=len(tables["catalog"]))
+
+    categories = arrays["category_index.categories"].tolist()
+    bounds = arrays["category_index.bounds"].tolist()
+    offsets = {
+        category: (start, end) for category, (start, end) in zip(categories, bounds)
+    }
+    return Snapshot(
+        path,
+        DatasetHandle(
+            videos_path,
+            VIDEO_COLUMNS,
+            manifest["videos"]["fingerprint"],
+            tables["catalog"],
+        ),
+        tables["ranks"],
+        tables["ranks_grouped"],
+        CategoryIndex(categories, arrays["category_index.order"], offsets),
+        TimePopularityCube(
+            arrays["time_cube.counts"],
+            arrays["time_cube.regions"],
+            arrays["time_cube.categories"],
+        ),
+        RegionPriors(
+            arrays["region_priors.ranks"],
+            arrays["region_priors.global_ranks"],
+            arrays["region_priors.regions"],
+            arrays["region_priors.categories"],
+        ),
+    )
+
+
+def load_snapshot(logs_path, videos_path, backend="pandas"):
+    """
+    Возвращает снимок для текущих версий файлов, при необходимости строит его.
+
+    Проверка актуальности читает только метаданные файлов, поэтому при
+    готовом снимке запуск сводится к отображению его файлов в память.
+
+    Args:
+        logs_path (str): Путь к Parquet-файлу логов.
+        videos_path (str): Путь к Parquet-файлу каталога.
+        backend (str): Движок агрегаций из BACKENDS для построения снимка.
+
+    Returns:
+        Snapshot: Состояние приложения.
+    """
+    path = snapshot_path(logs_path, videos_path)
+    return _load_snapshot(path, logs_path, videos_path, backend)
+
+
+@cached("load_snapshot", cache=st.cache_resource, max_entries=2)
+def _load_snapshot(path, logs_path, videos_path, _backend):
+    if not os.path.exists(os.path.join(path, "manifest.json")):
+        path = build_snapshot(logs_path, videos_path, os.path.dirname(path), _backend)
+    return read_snapshot(path, videos_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logs", default="data/sample.parquet")
+    parser.add_argument("--videos", default="data/video_stat.parquet")
+    parser.add_argument(
+        "--output", help="Папка снимков, по умолчанию рядом с каталогом"
+    )
+    parser.add_argument("--backend", choices=BACKENDS, default="pandas")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = build_snapshot(args.logs, args.videos, args.output, args.backend)
+    print(f"Снимок сохранён в {path} за {time.perf_counter() - start:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Обновление статистики видео в общем каталоге без перезагрузки каталога.
+
+Файлы изменений (Parquet или CSV) лежат в папке рядом с каталогом
+(`<каталог>.deltas/`): колонка video_id и любые колонки из STATS_COLUMNS —
+частичные обновления статистики или новые партиции каталога. Новые и
+изменившиеся файлы применяются по порядку имён: значения записываются на
+месте в колонки общего для всех сессий каталога, а индекс популярности
+переставляет только видео, популярность которых изменилась. Папку
+проверяет фоновый поток, поэтому сессии не ждут применения изменений,
+а свежесть статистики не зависит от перезапуска приложения.
+
+Применённые файлы и обновлённые колонки сохраняются в папке состояния
+(`<снимок>/stats/`), поэтому после перезапуска статистика восстанавливается
+без повторного применения файлов, а применяются только новые.
+
+Остальные колонки файла (название, категория) не применяются, видео,
+которых нет в каталоге, пропускаются: позиции каталога — ключи всех
+индексов, поэтому новые видео добавляются пересборкой снимка.
+
+Пример запуска из корня репозитория (файл копируется в папку изменений):
+    python pipeline/stats_updates.py --videos data/video_stat.parquet --delta stats.parquet
+"""
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+
+from metrics import track
+from popularity_index import POPULARITY_COLUMNS
+
+# Колонки статистики каталога, которые обновляются файлами изменений
+STATS_COLUMNS = [
+    "v_total_comments",
+    "v_year_views",
+    "v_likes",
+    "v_dislikes",
+    "cmments_per_day",
+    "v_long_views_7_days",
+]
+
+# Расширения файлов изменений
+DELTA_FORMATS = {".parquet": "parquet", ".csv": "csv"}
+
+# Папка изменений → обработчик последнего загруженного снимка
+_RUNNING = {}
+_RUNNING_LOCK = threading.Lock()
+
+
+class StatsUpdater:
+    """
+    Применяет файлы изменений статистики к общему каталогу и индексу популярности.
+
+    Колонки статистики при создании копируются из отображённого в память
+    снимка в изменяемые массивы, после чего обновляются на месте; колонка
+    заменяется целиком, только если новые значения не помещаются в её тип.
+    Применение изменений сериализуется блокировкой, чтения сессий не
+    блокируются: отдельное значение читается либо прежним, либо новым.
+    С папкой состояния state_path применённые файлы и изменённые колонки
+    сохраняются после каждой проверки и загружаются при создании.
+    """
+
+    def __init__(self, df_video, category_index, deltas_path, state_path=None):
+        self.df_video = df_video  # Общий каталог видео
+        self.category_index = category_index  # Индекс популярности каталога
+        self.deltas_path = deltas_path  # Папка файлов изменений
+        self.state_path = state_path  # Папка применённых изменений
+        self.applied = {}  # Имя файла → (время изменения, размер) применённой версии
+        self.errors = {}  # Имя файла → ошибка чтения или применения
+        self.version = 0  # Увеличивается при замене колонки каталога
+        self._video_positions = None  # video_id → позиция, строится при применении
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._changed_columns = set()  # Колонки, изменённые файлами изменений
+
+        for column in STATS_COLUMNS:
+            if column in df_video:
+                # Колонки снимка только для чтения; копия меньше каталога в разы
+                df_video[column] = df_video[column].to_numpy().copy()
+        if state_path is not None:
+            self._load_state()
+
+    def pending(self):
+        """
+        Возвращает файлы изменений, которые ещё не применены.
+
+        Returns:
+            list[str]: Имена новых и изменившихся файлов по порядку.
+        """
+        if not os.path.isdir(self.deltas_path):
+            return []
+        names = []
+        for entry in os.scandir(self.deltas_path):
+            # Файлы, которые ещё записываются, называются .tmp или .*
+            extension = os.path.splitext(entry.name)[1]
+            if entry.name.startswith(".") or extension not in DELTA_FORMATS:
+                continue
+            stat = entry.stat()
+            if self.applied.get(entry.name) != (stat.st_mtime_ns, stat.st_size):
+                names.append(entry.name)
+        return sorted(names)
+
+    def poll(self):
+        """
+        Применяет новые и изменившиеся файлы изменений.
+
+        Ошибка в одном файле не останавливает остальные: она сохраняется
+        в errors, и файл применяется снова, когда изменится.
+
+        Returns:
+            int: Количество обновлённых видео.
+        """
+        updated = 0
+        names = self.pending()
+        for name in names:
+            path = os.path.join(self.deltas_path, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue  # Файл удалили после проверки папки
+            try:
+                updated += self.apply(read_delta(path))
+                self.errors.pop(name, None)
+            except Exception as e:
+                # Файлы пишут внешние процессы: ошибка не должна останавливать поток
+                self.errors[name] = f"{type(e).__name__}: {e}"
+            self.applied[name] = (stat.st_mtime_ns, stat.st_size)
+        if names and self.state_path is not None:
+            self._save_state()
+        return updated
+
+    def apply(self, delta):
+        """
+        Применяет изменения статистики к каталогу и индексу популярности.
+
+        Пропуски в колонке означают, что значение не меняется; при
+        повторах video_id действует последняя строка.
+
+        Args:
+            delta (pd.DataFrame): Колонка video_id и колонки из STATS_COLUMNS.
+
+        Returns:
+            int: Количество обновлённых видео из каталога.
+        """
+        with self._lock, track("stats_delta") as record:
+            delta = delta.drop_duplicates("video_id", keep="last")
+            if self._video_positions is None:
+                self._video_positions = pd.Index(
+                    self.df_video["video_id"].to_numpy(dtype=object)
+                )
+            positions = self._video_positions.get_indexer(
+                delta["video_id"].to_numpy(dtype=object)
+            )
+            found = positions >= 0
+
+            moved = []  # Позиции видео, популярность которых изменилась
+            for column in STATS_COLUMNS:
+                if column not in delta or column not in self.df_video:
+                    continue
+                values = delta[column].to_numpy()
+                mask = found & pd.notna(values)
+                changed = self._write_column(
+                    column, positions[mask], values[mask].astype(np.float64)
+                )
+                if len(changed):
+                    self._changed_columns.add(column)
+                if column in POPULARITY_COLUMNS:
+                    moved.append(changed)
+            if moved:
+                self.category_index.update(self.df_video, np.concatenate(moved))
+            record.rows = int(found.sum())
+        return int(found.sum())
+
+    def start(self, interval=60):
+        """
+        Запускает фоновую проверку папки изменений.
+
+        Args:
+            interval (float): Интервал проверки, сек.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, args=(interval,), name="stats-updater", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Останавливает фоновую проверку папки изменений.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _save_state(self):
+        """
+        Сохраняет изменённые колонки и список применённых файлов.
+
+        Колонки пишутся первыми, applied.json — последним и атомарно:
+        по нему загружаются колонки, поэтому прерванная запись не видна.
+        """
+        os.makedirs(self.state_path, exist_ok=True)
+        with self._lock:
+            columns = sorted(self._changed_columns)
+            for column in columns:
+                tmp_path = os.path.join(
+                    self.state_path, f"{column}.{os.getpid()}.tmp.npy"
+                )
+                np.save(tmp_path, self.df_video[column].to_numpy())
+                os.replace(tmp_path, os.path.join(self.state_path, f"{column}.npy"))
+            state = {
+                "n_videos": len(self.df_video),
+                "columns": columns,
+                "applied": {name: list(key) for name, key in self.applied.items()},
+            }
+        tmp_file = os.path.join(self.state_path, f"applied.{os.getpid()}.tmp.json")
+        with open(tmp_file, "w") as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(tmp_file, os.path.join(self.state_path, "applied.json"))
+
+    def _load_state(self):
+        """
+        Восстанавливает колонки и список применённых файлов из папки состояния.
+        """
+        state_file = os.path.join(self.state_path, "applied.json")
+        if not os.path.exists(state_file):
+            return
+        with open(state_file) as file:
+            state = json.load(file)
+        if state["n_videos"] != len(self.df_video):
+            return  # Состояние другого каталога
+        moved = []  # Позиции видео, популярность которых отличается от снимка
+        for column in state["columns"]:
+            values = np.load(os.path.join(self.state_path, f"{column}.npy"))
+            if column in POPULARITY_COLUMNS:
+                old = self.df_video[column].to_numpy()
+                moved.append(
+                    np.flatnonzero((old != values) & ~(pd.isna(old) & pd.isna(values)))
+                )
+            self.df_video[column] = values
+            self._changed_columns.add(column)
+        if moved:
+            self.category_index.update(self.df_video, np.concatenate(moved))
+        self.applied = {name: tuple(key) for name, key in state["applied"].items()}
+
+    def _run(self, interval):
+        while True:
+            self.poll()
+            if self._stop.wait(interval):
+                return
+
+    def _write_column(self, column, positions, values):
+        # Возвращает позиции, значение которых действительно изменилось
+        target = self.df_video[column].to_numpy()
+        if not _fits(values, target.dtype):
+            # Значения не помещаются в компактный тип: колонка расширяется
+            dtype = np.result_type(
+                target.dtype, np.int64 if _is_integral(values) else np.float64
+            )
+            self.df_video[column] = target.astype(dtype)
+            target = self.df_video[column].to_numpy()
+            self.version += 1
+        old = target[positions].astype(np.float64)
+        changed = (old != values) & ~(np.isnan(old) & np.isnan(values))
+        target[positions[changed]] = values[changed]
+        return positions[changed]
+
+
+def _is_integral(values):
+    return bool(np.all(np.isfinite(values) & (np.mod(values, 1) == 0)))
+
+
+def _fits(values, dtype):
+    """
+    Проверяет, что значения записываются в колонку типа dtype без потерь.
+    """
+    if len(values) == 0:
+        return True
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return (
+            _is_integral(values)
+            and info.min <= values.min()
+            and values.max() <= info.max
+        )
+    # float32 хранит не все значения float64
+    return bool(np.all(values.astype(dtype) == values))
+
+
+def read_delta(path):
+    """
+    Читает файл изменений статистики.
+
+    Args:
+        path (str): Путь к Parquet- или CSV-файлу.
+
+    Returns:
+        pd.DataFrame: Колонка video_id и колонки из STATS_COLUMNS, которые есть в файле.
+
+    Raises:
+        ValueError: В файле нет колонки video_id.
+    """
+    file_type = DELTA_FORMATS[os.path.splitext(path)[1]]
+    if file_type == "parquet":
+        names = pq.read_schema(path).names
+    else:
+        names = pd.read_csv(path, nrows=0).columns.tolist()
+    if "video_id" not in names:
+        raise ValueError(f"В файле изменений {path} нет колонки video_id")
+    columns = ["video_id"] + [column for column in STATS_COLUMNS if column in names]
+
+    if file_type == "parquet":
+        return pq.read_table(path, columns=columns).to_pandas()
+    return pd.read_csv(path, usecols=columns, dtype={"video_id": str})
+
+
+def deltas_path(videos_path):
+    """
+    Возвращает папку файлов изменений рядом с файлом каталога.
+
+    Args:
+        videos_path (str): Путь к Parquet-файлу каталога.
+
+    Returns:
+        str: Путь к папке файлов изменений.
+    """
+    return f"{videos_path}.deltas"
+
+
+def stats_state_path(snapshot_path):
+    """
+    Возвращает папку применённых изменений статистики в папке снимка.
+
+    Args:
+        snapshot_path (str): Папка снимка.
+
+    Returns:
+        str: Путь к папке состояния.
+    """
+    return os.path.join(snapshot_path, "stats")
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)  # Изменения применяются в фоне
+def get_stats_updater(_snapshot, snapshot_path, interval=60):
+    """
+    Возвращает общий для всех сессий обработчик изменений статистики снимка.
+
+    Обработчик прежнего снимка той же папки изменений останавливается:
+    изменения применяются только к последнему загруженному снимку.
+
+    Args:
+        _snapshot (Snapshot): Снимок состояния (не хешируется).
+        snapshot_path (str): Папка снимка, ключ кеша.
+        interval (float): Интервал проверки папки изменений, сек.
+
+    Returns:
+        StatsUpdater: Запущенный обработчик изменений.
+    """
+    path = deltas_path(_snapshot.videos.path)
+    with _RUNNING_LOCK:
+        previous = _RUNNING.pop(path, None)
+        if previous is not None:
+            previous.stop()
+        updater = StatsUpdater(
+            _snapshot.videos.df,
+            _snapshot.category_index,
+            path,
+            stats_state_path(snapshot_path),
+        )
+        updater.start(interval)
+        _RUNNING[path] = updater
+    return updater
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--videos", default="data/video_stat.parquet")
+    parser.add_argument("--delta", required=True, help="Parquet- или CSV-файл")
+    args = parser.parse_args()
+
+    read_delta(args.delta)  # Проверяем файл до публикации
+    path = deltas_path(args.videos)
+    os.makedirs(path, exist_ok=True)
+    # Имя с временем сохраняет порядок применения; файл появляется в папке
+    # атомарно и не читается недописанным
+    name = f"{time.strftime('%Y%m%d_%H%M%S')}_{os.path.basename(args.delta)}"
+    tmp_path = os.path.join(path, f".{name}.tmp")
+    shutil.copyfile(args.delta, tmp_path)
+    os.replace(tmp_path, os.path.join(path, name))
+    print(f"Файл изменений опубликован: {os.path.join(path, name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Детерминированный генератор синтетических данных со схемами реальных таблиц.
+
+Создаёт логи просмотров (как logs_df_*.parquet) и каталог видео
+(как video_stat.parquet) произвольного размера. Одинаковые параметры
+и зерно всегда дают одинаковые файлы.
+
+Пример запуска из корня репозитория:
+    python pipeline/synthetic_data.py --out data/synthetic --log-rows 10000000
+"""
+
+import argparse
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Категории видео, как в реальном каталоге
+CATEGORIES = [
+    "Авто-мото",
+    "Аудио",
+    "Видеоигры",
+    "Детям",
+    "Интервью",
+    "Красота",
+    "Лайфстайл",
+    "Музыка",
+    "Мультфильмы",
+    "Обучение",
+    "Развлечения",
+    "Разное",
+    "Сериалы",
+    "Спорт",
+    "Телепередачи",
+    "Техника и оборудование",
+    "Фильмы",
+    "Юмор",
+]
+
+# Слова для генерации названий видео
+TITLE_WORDS = [
+    "обзор",
+    "новости",
+    "рецепт",
+    "урок",
+    "игра",
+    "матч",
+    "песня",
+    "клип",
+    "серия",
+    "выпуск",
+    "машина",
+    "ремонт",
+    "макияж",
+    "путешествие",
+    "смешное",
+    "интервью",
+    "мультфильм",
+    "тренировка",
+    "история",
+    "лайфхак",
+]
+
+# Начало суток логов, как в logs_df_2024-08-05.parquet
+LOGS_DAY = pd.Timestamp("2024-08-05", tz="Europe/Moscow")
+
+
+def make_ids(n, rng):
+    """
+    Генерирует n детерминированных UUID-строк.
+
+    Args:
+        n (int): Количество идентификаторов.
+        rng (np.random.Generator): Генератор случайных чисел.
+
+    Returns:
+        pa.Array: Строковый массив идентификаторов.
+    """
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    return pa.array(str(uuid.UUID(bytes=row.tobytes())) for row in raw)
+
+
+def skewed_positions(n, size, rng, power=3.0):
+    """
+    Возвращает позиции от 0 до n с убывающей частотой (популярные — первые).
+    """
+    return np.minimum((n * rng.random(size) ** power).astype(np.int64), n - 1)
+
+
+def generate_catalog(n_videos, seed=0):
+    """
+    Генерирует каталог видео со схемой video_stat.parquet.
+
+    Args:
+        n_videos (int): Количество видео.
+        seed (int): Зерно генератора случайных чисел.
+
+    Returns:
+        pa.Table: Таблица с колонками каталога.
+    """
+    rng = np.random.default_rng(seed)
+    words = rng.integers(0, len(TITLE_WORDS), size=(n_videos, 3))
+    views = (rng.pareto(1.2, n_videos) * 100).astype(np.int64)
+
+    return pa.table(
+        {
+            "video_id": make_ids(n_videos, rng),
+            "title": pa.array(
+                " ".join(TITLE_WORDS[word] for word in row) for row in words
+            ),
+            "v_pub_datetime": rng.integers(1_500_000_000, 1_722_800_000, n_videos),
+            "category_id": pa.DictionaryArray.from_arrays(
+                pa.array(skewed_positions(len(CATEGORIES), n_videos, rng, 1.5)),
+                pa.array(CATEGORIES),
+            ),
+            "v_total_comments": rng.poisson(views / 500),
+            "v_year_views": views,
+            "v_duration": rng.gamma(2.0, 300.0, n_videos).round(3),
+            "v_likes": rng.poisson(views / 50),
+            "v_dislikes": rng.poisson(views / 500),
+            "cmments_per_day": (rng.exponential(0.05, n_videos)).round(4),
+            "v_long_views_7_days": rng.poisson(views / 20),
+        }
+    )
+
+
+def write_logs(path, n_rows, video_ids, seed=0, batch_rows=5_000_000):
+    """
+    Пишет синтетические логи просмотров пакетами, не держа их целиком в памяти.
+
+    Args:
+        path (str): Путь к Parquet-файлу.
+        n_rows (int): Количество строк логов.
+        video_ids (pa.Array): Идентификаторы видео из каталога.
+        seed (int): Зерно генератора случайных чисел.
+        batch_rows (int): Количество строк в одном пакете.
+    """
+    rng = np.random.default_rng(seed + 1)
+    n_users = max(n_rows // 20, 1)
+    n_regions = 2000
+    user_ids = make_ids(n_users, rng)
+    region_ids = make_ids(n_regions, rng)
+    city_ids = make_ids(n_regions * 5, rng)
+
+    schema = pa.schema(
+        [
+            ("event_timestamp", pa.timestamp("s", tz="Europe/Moscow")),
+            ("user_id", pa.dictionary(pa.int32(), pa.string())),
+            ("region", pa.dictionary(pa.int32(), pa.string())),
+            ("city", pa.dictionary(pa.int32(), pa.string())),
+            ("video_id", pa.dictionary(pa.int32(), pa.string())),
+            ("watchtime", pa.int64()),
+        ]
+    )
+    with pq.ParquetWriter(path, schema) as writer:
+        for start in range(0, n_rows, batch_rows):
+            size = min(batch_rows, n_rows - start)
+            # Больше просмотров днём и вечером, меньше ночью
+            hours = rng.choice(24, size, p=_hour_weights())
+            seconds = hours * 3600 + rng.integers(0, 3600, size)
+            regions = skewed_positions(n_regions, size, rng)
+            batch = pa.table(
+                {
+                    "event_timestamp": pa.array(
+                        int(LOGS_DAY.timestamp()) + seconds,
+                        type=pa.int64(),
+                    ).cast(schema.field("event_timestamp").type),
+                    "user_id": _dictionary(rng.integers(0, n_users, size), user_ids),
+                    "region": _dictionary(regions, region_ids),
+                    "city": _dictionary(
+                        regions * 5 + rng.integers(0, 5, size), city_ids
+                    ),
+                    "video_id": _dictionary(
+                        skewed_positions(len(video_ids), size, rng), video_ids
+                    ),
+                    "watchtime": rng.geometric(1 / 600, size),
+                },
+                schema=schema,
+            )
+            writer.write_table(batch, row_group_size=1_000_000)
+
+
+def _dictionary(indices, values):
+    return pa.DictionaryArray.from_arrays(pa.array(indices, type=pa.int32()), values)
+
+
+def _hour_weights():
+    weights = 1.5 + np.sin((np.arange(24) - 9) / 24 * 2 * np.pi)
+    return weights / weights.sum()
+
+
+def generate_dataset(out_dir, log_rows, n_videos=None, seed=0):
+    """
+    Генерирует каталог и логи в указанную папку, если их там ещё нет.
+
+    Args:
+        out_dir (str): Папка для файлов.
+        log_rows (int): Количество строк логов.
+        n_videos (int, optional): Количество видео, по умолчанию log_rows / 10
+            в пределах от 1 000 до 2 000 000.
+        seed (int): Зерно генератора случайных чисел.
+
+    Returns:
+        tuple: Пути к файлам логов и каталога.
+    """
+    if n_videos is None:
+        n_videos = int(min(max(log_rows // 10, 1_000), 2_000_000))
+    os.makedirs(out_dir, exist_ok=True)
+    logs_path = os.path.join(out_dir, f"logs_{log_rows}_{seed}.parquet")
+    videos_path = os.path.join(out_dir, f"video_stat_{n_videos}_{seed}.parquet")
+
+    # Пишем во временный файл, чтобы прерванная генерация не оставила битый файл
+    if not os.path.exists(videos_path):
+        pq.write_table(generate_catalog(n_videos, seed), f"{videos_path}.tmp")
+        os.replace(f"{videos_path}.tmp", videos_path)
+    if not os.path.exists(logs_path):
+        video_ids = pq.read_table(videos_path, columns=["video_id"])["video_id"]
+        write_logs(f"{logs_path}.tmp", log_rows, video_ids.combine_chunks(), seed)
+        os.replace(f"{logs_path}.tmp", logs_path)
+
+    return logs_path, videos_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", default="data/synthetic")
+    parser.add_argument("--log-rows", type=float, default=1e6)
+    parser.add_argument("--videos", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    paths = generate_dataset(
+        args.out,
+        int(args.log_rows),
+        None if args.videos is None else int(args.videos),
+        args.seed,
+    )
+    print("\n".join(paths))
+
+
+if __name__ == "__main__":
+    main()
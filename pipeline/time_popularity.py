@@ -0,0 +1,268 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import streamlit as st
+from compute_backends import check_backend, hourly_category_views
+
+# Часовой пояс, в котором записаны логи просмотров
+LOGS_TIMEZONE = "Europe/Moscow"
+
+
+class TimePopularityCube:
+    """
+    Куб популярности категорий: час суток × регион × категория.
+
+    Хранит число просмотров и заранее отсортированный список категорий для
+    каждой пары (час, регион), поэтому «топ категорий сейчас в регионе» —
+    это обращение по индексу, не зависящее от объёма логов. Для неизвестных
+    регионов и регионов с малым числом просмотров используется общий
+    по всем регионам топ этого часа.
+    """
+
+    def __init__(self, counts, regions, categories, fingerprint=""):
+        self.counts = counts  # Просмотры, массив (24, регионы, категории)
+        self.regions = np.asarray(regions, dtype=object)  # Регионы
+        self.categories = np.asarray(categories, dtype=object)  # Категории
+        self.fingerprint = fingerprint  # Отпечаток логов и каталога куба
+        self._region_positions = {
+            region: position for position, region in enumerate(self.regions)
+        }
+        # Общие просмотры по всем регионам для каждого часа
+        self.global_counts = counts.sum(axis=1, dtype=np.uint64)
+        # Категории по убыванию просмотров для каждого часа и региона
+        self.top_order = np.argsort(-counts.astype(np.int64), axis=2, kind="stable")
+        self.global_top_order = np.argsort(
+            -self.global_counts.astype(np.int64), axis=1, kind="stable"
+        )
+
+    def top_categories(self, hour, region=None, top_k=10, min_views=100):
+        """
+        Возвращает самые популярные категории в заданный час.
+
+        Args:
+            hour (int): Час суток по времени логов.
+            region (str, optional): Регион пользователя.
+            top_k (int): Количество категорий.
+            min_views (int): Минимум просмотров в регионе за час, иначе
+                используется общий топ.
+
+        Returns:
+            pd.DataFrame: DataFrame с колонками 'category_id', 'views', 'share'.
+        """
+        position = self._region_positions.get(region)
+        if position is not None and self.counts[hour, position].sum() >= min_views:
+            order = self.top_order[hour, position, :top_k]
+            views = self.counts[hour, position]
+        else:
+            order = self.global_top_order[hour, :top_k]
+            views = self.global_counts[hour]
+
+        total = max(int(views.sum()), 1)
+        return pd.DataFrame(
+            {
+                "category_id": self.categories[order],
+                "views": views[order].astype(np.int64),
+                "share": views[order] / total,
+            }
+        )
+
+    @classmethod
+    def from_views(cls, views, categories):
+        """
+        Строит куб по просмотрам в длинном формате.
+
+        Args:
+            views (pd.DataFrame): DataFrame с колонками 'region', 'hour',
+                'category_id', 'views'.
+            categories (Sequence[str]): Все категории каталога.
+
+        Returns:
+            TimePopularityCube: Куб популярности категорий.
+        """
+        region_codes, regions = pd.factorize(views["region"], sort=True)
+        category_codes = pd.Index(categories).get_indexer(views["category_id"])
+        counts = np.zeros((24, len(regions), len(categories)), dtype=np.uint32)
+        counts[views["hour"].to_numpy(), region_codes, category_codes] = views[
+            "views"
+        ].to_numpy()
+        return cls(counts, list(regions), list(categories))
+
+    def to_frame(self):
+        """
+        Возвращает ненулевые ячейки куба в длинном формате.
+
+        Returns:
+            pd.DataFrame: DataFrame с колонками 'region', 'hour',
+                'category_id', 'views'.
+        """
+        hours, regions, categories = np.nonzero(self.counts)
+        return pd.DataFrame(
+            {
+                "region": self.regions[regions],
+                "hour": hours,
+                "category_id": self.categories[categories],
+                "views": self.counts[hours, regions, categories].astype(np.int64),
+            }
+        )
+
+    def save(self, path):
+        """
+        Сохраняет куб в сжатый файл .npz.
+
+        Args:
+            path (str): Путь к файлу.
+        """
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            counts=self.counts,
+            regions=self.regions.astype(str),
+            categories=self.categories.astype(str),
+            fingerprint=self.fingerprint,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Загружает куб из файла .npz.
+
+        Args:
+            path (str): Путь к файлу.
+
+        Returns:
+            TimePopularityCube: Загруженный куб.
+        """
+        with np.load(path) as data:
+            return cls(
+                data["counts"],
+                data["regions"],
+                data["categories"],
+                # Файлы без отпечатка не совпадают ни с какими исходными данными
+                str(data["fingerprint"]) if "fingerprint" in data else "",
+            )
+
+
+def rounded_hours(timestamps):
+    """
+    Округляет время событий до ближайшего часа и возвращает час суток.
+
+    Args:
+        timestamps (pd.Series): Время событий.
+
+    Returns:
+        np.ndarray: Час суток от 0 до 23.
+    """
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert(LOGS_TIMEZONE)
+    hours = timestamps.dt.hour.to_numpy() + (timestamps.dt.minute.to_numpy() >= 30)
+    return hours % 24
+
+
+def build_time_popularity_cube(
+    log_paths, df_video, batch_size=1_000_000, backend="pandas"
+):
+    """
+    Строит куб популярности за один потоковый проход по логам.
+
+    Движки duckdb и polars считают просмотры многопоточным запросом
+    к Parquet-файлам; pandas остаётся эталонной реализацией.
+
+    Args:
+        log_paths (list[str]): Пути к Parquet-файлам логов.
+        df_video (pd.DataFrame): DataFrame с данными о видео.
+        batch_size (int): Количество строк в одном пакете.
+        backend (str): Движок агрегаций из BACKENDS.
+
+    Returns:
+        TimePopularityCube: Куб популярности категорий.
+    """
+    category_codes, categories = pd.factorize(df_video["category_id"], sort=True)
+    n_categories = len(categories)
+
+    check_backend(backend)
+    if backend != "pandas":
+        views = hourly_category_views(log_paths, df_video, backend, LOGS_TIMEZONE)
+        return TimePopularityCube.from_views(views, list(categories))
+
+    video_index = pd.Index(df_video["video_id"])
+
+    region_positions = {}  # Регион → позиция в кубе
+    counts = np.zeros((16, 24 * n_categories), dtype=np.uint32)
+    for path in log_paths:
+        parquet_file = pq.ParquetFile(path, read_dictionary=["video_id", "region"])
+        for batch in parquet_file.iter_batches(
+            batch_size=batch_size, columns=["event_timestamp", "video_id", "region"]
+        ):
+            df_batch = batch.to_pandas()
+            video_ids = df_batch["video_id"].astype("category")
+            positions = video_index.get_indexer(video_ids.cat.categories)[
+                video_ids.cat.codes.to_numpy()
+            ]
+            regions = df_batch["region"].astype("category")
+            found = (positions >= 0) & (regions.cat.codes.to_numpy() >= 0)
+            found[found] = category_codes[positions[found]] >= 0
+
+            # Коды регионов пакета переводим в позиции куба
+            batch_regions = np.array(
+                [
+                    region_positions.setdefault(region, len(region_positions))
+                    for region in regions.cat.categories
+                ],
+                dtype=np.int64,
+            )
+            region_codes = batch_regions[regions.cat.codes.to_numpy()[found]]
+            if len(region_positions) > len(counts):
+                extra = np.zeros((len(region_positions), counts.shape[1]), np.uint32)
+                counts = np.concatenate([counts, extra])  # Место под новые регионы
+
+            # Один bincount по плоскому индексу (регион, час, категория)
+            keys = (
+                region_codes * 24 + rounded_hours(df_batch["event_timestamp"])[found]
+            ) * n_categories + category_codes[positions[found]]
+            counts += (
+                np.bincount(keys, minlength=counts.size)
+                .reshape(counts.shape)
+                .astype(np.uint32)
+            )
+
+    counts = counts[: len(region_positions)].reshape(
+        len(region_positions), 24, n_categories
+    )
+    return TimePopularityCube(
+        np.ascontiguousarray(counts.transpose(1, 0, 2)),
+        list(region_positions),
+        list(categories),
+    )
+
+
+@st.cache_resource
+def load_time_popularity_cube(_df_video, logs_path, fingerprint, backend="pandas"):
+    """
+    Возвращает общий для всех сессий куб популярности по логам.
+
+    Куб сохраняется рядом с файлом логов вместе с отпечатком исходных
+    данных и пересчитывается, если изменились логи или каталог: категории
+    просмотров берутся из каталога.
+
+    Args:
+        _df_video (pd.DataFrame): DataFrame с данными о видео (не хешируется).
+        logs_path (str): Путь к Parquet-файлу логов.
+        fingerprint (str): Отпечаток файлов логов и каталога.
+        backend (str): Движок агрегаций из BACKENDS для построения куба.
+
+    Returns:
+        TimePopularityCube: Куб популярности категорий.
+    """
+    cube_path = f"{logs_path}.time_cube.npz"
+    if os.path.exists(cube_path):
+        cube = TimePopularityCube.load(cube_path)
+        if cube.fingerprint == fingerprint:
+            return cube
+
+    cube = build_time_popularity_cube([logs_path], _df_video, backend=backend)
+    cube.fingerprint = fingerprint
+    cube.save(cube_path)
+    return cube
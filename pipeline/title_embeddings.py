@@ -0,0 +1,365 @@
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Слова названия: буквы и цифры длиной от двух символов
+TOKEN_PATTERN = re.compile(r"[^\W_]{2,}")
+
+
+class TitleIndex:
+    """
+    Эмбеддинги названий видео, подкатегории и индекс ближайших соседей.
+
+    Векторы названий (хешированный TF-IDF, нормированный по L2) лежат в
+    отображённом в память файле. Внутри каждой категории видео разбиты
+    на подкатегории сферическим k-means; эти же кластеры служат
+    инвертированными списками приближённого поиска ближайших соседей (IVF):
+    запрос сравнивается только с видео из нескольких ближайших кластеров.
+    """
+
+    def __init__(self, vectors, centroids, list_categories, list_names, order, offsets):
+        self.vectors = vectors  # Векторы названий (видео × размерность)
+        self.centroids = centroids  # Центры подкатегорий (подкатегории × размерность)
+        self.list_categories = list_categories  # Категория каждой подкатегории
+        self.list_names = list_names  # Название подкатегории по частым словам
+        self.order = order  # Позиции видео, сгруппированные по подкатегориям
+        self.offsets = offsets  # Границы подкатегорий в order
+        # Подкатегория каждого видео, -1 для видео без категории
+        self.assignments = np.full(len(vectors), -1, dtype=np.int32)
+        self.assignments[order] = np.repeat(
+            np.arange(len(centroids), dtype=np.int32), np.diff(offsets)
+        )
+
+    def similar_videos(self, position, k=10, nprobe=3, seen=None, same_category=True):
+        """
+        Возвращает позиции видео с самыми похожими названиями.
+
+        Args:
+            position (int): Позиция видео в каталоге.
+            k (int): Количество видео.
+            nprobe (int): Количество просматриваемых подкатегорий.
+            seen (SeenSet, optional): Позиции видео, которые нужно пропустить.
+            same_category (bool): Искать только в категории исходного видео.
+
+        Returns:
+            np.ndarray: Позиции похожих видео по убыванию сходства.
+        """
+        query = np.asarray(self.vectors[position], dtype=np.float32)
+        scores = self.centroids @ query
+        own_list = self.assignments[position]
+        if same_category and own_list >= 0:
+            # Ограничиваемся подкатегориями категории исходного видео
+            same = self.list_categories == self.list_categories[own_list]
+            scores = np.where(same, scores, -np.inf)
+        lists = np.argsort(-scores, kind="stable")
+        # Подкатегории других категорий не просматриваются, даже если
+        # в категории меньше nprobe подкатегорий
+        lists = lists[np.isfinite(scores[lists])][:nprobe]
+
+        # Просматриваем только видео из ближайших подкатегорий (IVF)
+        candidates = np.sort(
+            np.concatenate(
+                [self.order[self.offsets[i] : self.offsets[i + 1]] for i in lists]
+            )
+        )  # По возрастанию позиций — последовательное чтение файла векторов
+        candidates = candidates[candidates != position]
+        if seen:
+            candidates = candidates[~seen.contains(candidates)]
+        if len(candidates) == 0:
+            return candidates
+
+        similarity = np.asarray(self.vectors[candidates]) @ query
+        top = np.argpartition(-similarity, min(k, len(candidates)) - 1)[:k]
+        return candidates[top[np.argsort(-similarity[top], kind="stable")]]
+
+    def top_subcategories(self, query, top_k=5):
+        """
+        Возвращает подкатегории, ближайшие к вектору запроса.
+
+        Args:
+            query (np.ndarray): Вектор запроса.
+            top_k (int): Количество подкатегорий.
+
+        Returns:
+            pd.DataFrame: DataFrame с колонками 'category_id', 'subcategory',
+                'name', 'score'.
+        """
+        scores = self.centroids @ query
+        lists = np.argsort(-scores, kind="stable")[:top_k]
+        return pd.DataFrame(
+            {
+                "category_id": self.list_categories[lists],
+                "subcategory": lists,
+                "name": self.list_names[lists],
+                "score": scores[lists],
+            }
+        )
+
+    def save(self, path):
+        """
+        Сохраняет индекс в папку; векторы уже лежат там в vectors.npy.
+
+        Args:
+            path (str): Папка индекса.
+        """
+        tmp_path = os.path.join(path, f"index.{os.getpid()}.tmp.npz")
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            list_categories=self.list_categories.astype(str),
+            list_names=self.list_names.astype(str),
+            order=self.order,
+            offsets=self.offsets,
+        )
+        os.replace(tmp_path, os.path.join(path, "index.npz"))  # Атомарно
+
+    @classmethod
+    def load(cls, path):
+        """
+        Загружает индекс из папки, отображая векторы в память.
+
+        Args:
+            path (str): Папка индекса.
+
+        Returns:
+            TitleIndex: Загруженный индекс.
+        """
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        with np.load(os.path.join(path, "index.npz")) as data:
+            return cls(
+                vectors,
+                data["centroids"],
+                data["list_categories"].astype(object),
+                data["list_names"].astype(object),
+                data["order"],
+                data["offsets"],
+            )
+
+
+def tokenize(titles):
+    """
+    Разбивает названия на слова и кодирует их номерами словаря.
+
+    Args:
+        titles (Iterable[str]): Названия видео.
+
+    Returns:
+        tuple: Номера слов подряд, границы названий и словарь.
+    """
+    vocabulary = {}  # Слово → номер
+    tokens, offsets = [], [0]
+    for title in titles:
+        words = set(TOKEN_PATTERN.findall(str(title).lower()))
+        tokens.extend(vocabulary.setdefault(word, len(vocabulary)) for word in words)
+        offsets.append(len(tokens))
+    return (
+        np.asarray(tokens, dtype=np.int32),
+        np.asarray(offsets, dtype=np.int64),
+        list(vocabulary),
+    )
+
+
+def embed_titles(titles, path, dim=64, chunk_rows=200_000):
+    """
+    Строит векторы названий хешированным TF-IDF и пишет их в файл.
+
+    Каждое слово хешируется (crc32) в одну из dim координат со знаком,
+    вес слова — его IDF; векторы нормируются по L2. Файл пишется рядом
+    под временным именем и атомарно подменяет прежний: другие процессы,
+    отобразившие прежний файл в память, продолжают читать его.
+
+    Args:
+        titles (Iterable[str]): Названия видео.
+        path (str): Путь к файлу .npy для отображения в память.
+        dim (int): Размерность векторов.
+        chunk_rows (int): Количество названий, обрабатываемых за раз.
+
+    Returns:
+        tuple: Векторы (np.memmap), номера слов, границы названий и словарь.
+    """
+    tokens, offsets, vocabulary = tokenize(titles)
+    n_titles = len(offsets) - 1
+
+    # Хеш слова задаёт координату и знак, IDF — вес
+    hashes = np.array([zlib.crc32(word.encode()) for word in vocabulary], np.int64)
+    buckets = hashes % dim
+    signs = np.where((hashes // dim) % 2 == 0, 1.0, -1.0).astype(np.float32)
+    document_frequency = np.bincount(tokens, minlength=len(vocabulary))
+    idf = np.log((1 + n_titles) / (1 + document_frequency)).astype(np.float32) + 1
+
+    tmp_path = f"{os.path.splitext(path)[0]}.{os.getpid()}.tmp.npy"
+    vectors = np.lib.format.open_memmap(
+        tmp_path, mode="w+", dtype=np.float32, shape=(n_titles, dim)
+    )
+    for start in range(0, n_titles, chunk_rows):
+        end = min(start + chunk_rows, n_titles)
+        chunk_tokens = tokens[offsets[start] : offsets[end]]
+        rows = np.repeat(np.arange(end - start), np.diff(offsets[start : end + 1]))
+        chunk = np.zeros((end - start, dim), dtype=np.float32)
+        np.add.at(
+            chunk,
+            (rows, buckets[chunk_tokens]),
+            signs[chunk_tokens] * idf[chunk_tokens],
+        )
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        vectors[start:end] = chunk / np.maximum(norms, 1e-12)
+    vectors.flush()
+    os.replace(tmp_path, path)  # Отображение vectors остаётся действительным
+
+    return vectors, tokens, offsets, vocabulary
+
+
+def spherical_kmeans(vectors, k, iterations=10, sample_size=20_000, seed=0):
+    """
+    Кластеризует нормированные векторы по косинусному сходству.
+
+    Центры обучаются на случайной выборке, после чего к ним
+    приписываются все векторы.
+
+    Args:
+        vectors (np.ndarray): Нормированные векторы.
+        k (int): Количество кластеров.
+        iterations (int): Количество итераций.
+        sample_size (int): Размер обучающей выборки.
+        seed (int): Зерно генератора случайных чисел.
+
+    Returns:
+        tuple: Центры кластеров и номер кластера каждого вектора.
+    """
+    rng = np.random.default_rng(seed)
+    k = max(1, min(k, len(vectors)))
+    sample = vectors[
+        np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), False))
+    ]
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Пустые кластеры сохраняют прежний центр
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+    labels = np.concatenate(
+        [
+            np.argmax(vectors[i : i + 100_000] @ centroids.T, axis=1)
+            for i in range(0, len(vectors), 100_000)
+        ]
+    )
+    return centroids.astype(np.float32), labels
+
+
+def build_title_index(
+    df_video, path, dim=64, n_subcategories=20, seed=0, fingerprint=""
+):
+    """
+    Строит эмбеддинги названий, подкатегории и индекс ближайших соседей.
+
+    Векторы и индекс пишутся первыми, meta.json — последним: по нему
+    проверяется, что индекс построен полностью и по тому же каталогу.
+
+    Args:
+        df_video (pd.DataFrame): DataFrame с данными о видео.
+        path (str): Папка для файлов индекса.
+        dim (int): Размерность векторов.
+        n_subcategories (int): Максимум подкатегорий в одной категории.
+        seed (int): Зерно генератора случайных чисел.
+        fingerprint (str): Отпечаток каталога, по которому строится индекс.
+
+    Returns:
+        TitleIndex: Построенный индекс.
+    """
+    os.makedirs(path, exist_ok=True)
+    vectors, tokens, offsets, vocabulary = embed_titles(
+        df_video["title"], os.path.join(path, "vectors.npy"), dim
+    )
+    codes, categories = pd.factorize(df_video["category_id"], sort=True)
+
+    centroids, list_categories, list_names, groups = [], [], [], []
+    for code, category in enumerate(categories):
+        positions = np.flatnonzero(codes == code)
+        category_vectors = np.asarray(vectors[positions])
+        # Примерно по 50 видео на подкатегорию, но не больше n_subcategories
+        k = int(min(n_subcategories, max(1, len(positions) // 50)))
+        category_centroids, labels = spherical_kmeans(
+            category_vectors, k, seed=seed + code
+        )
+        for label in range(len(category_centroids)):
+            members = positions[labels == label]
+            if len(members) == 0:
+                continue
+            centroids.append(category_centroids[label])
+            list_categories.append(category)
+            list_names.append(_subcategory_name(members, tokens, offsets, vocabulary))
+            groups.append(members)
+
+    index = TitleIndex(
+        vectors,
+        np.asarray(centroids, dtype=np.float32),
+        np.asarray(list_categories, dtype=object),
+        np.asarray(list_names, dtype=object),
+        np.concatenate(groups).astype(np.int64),
+        np.concatenate([[0], np.cumsum([len(group) for group in groups])]),
+    )
+    index.save(path)
+    meta = {
+        "fingerprint": fingerprint,
+        "n_videos": len(df_video),
+        "dim": dim,
+        "n_subcategories": n_subcategories,
+        "seed": seed,
+    }
+    tmp_file = os.path.join(path, f"meta.{os.getpid()}.tmp.json")
+    with open(tmp_file, "w") as file:
+        json.dump(meta, file)
+    os.replace(tmp_file, os.path.join(path, "meta.json"))  # Атомарно
+    return index
+
+
+def _subcategory_name(members, tokens, offsets, vocabulary, n_words=3):
+    """
+    Называет подкатегорию самыми частыми словами её видео.
+    """
+    member_tokens = np.concatenate(
+        [tokens[offsets[i] : offsets[i + 1]] for i in members[:5000]]
+    )
+    if len(member_tokens) == 0:
+        return ""
+    counts = np.bincount(member_tokens)
+    top = np.argsort(-counts, kind="stable")[:n_words]
+    return ", ".join(vocabulary[word] for word in top if counts[word] > 0)
+
+
+@st.cache_resource
+def load_title_index(_df_video, videos_path, fingerprint):
+    """
+    Возвращает общий для всех сессий индекс названий видео.
+
+    Индекс хранится в папке рядом с каталогом и перестраивается, если
+    отпечаток каталога в meta.json не совпадает с текущим: позиции
+    индекса — позиции строк каталога, по которому он построен.
+
+    Args:
+        _df_video (pd.DataFrame): DataFrame с данными о видео (не хешируется).
+        videos_path (str): Путь к Parquet-файлу каталога.
+        fingerprint (str): Отпечаток каталога, ключ кеша.
+
+    Returns:
+        TitleIndex: Индекс названий видео.
+    """
+    path = f"{videos_path}.titles"
+    meta_file = os.path.join(path, "meta.json")
+    if os.path.exists(meta_file):
+        with open(meta_file) as file:
+            meta = json.load(file)
+        if meta.get("fingerprint") == fingerprint and (
+            meta.get("n_videos") == len(_df_video)
+        ):
+            return TitleIndex.load(path)
+    return build_title_index(_df_video, path, fingerprint=fingerprint)
@@ -0,0 +1,455 @@
+import atexit
+import json
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import streamlit as st
+from id_interning import code_positions, lookup_positions
+from metrics import REGISTRY, track
+from popularity_index import SeenSet
+from recommendation_engine import CategoryWeights
+
+# Сколько последних понравившихся видео хранится для подкатегорий
+MAX_LIKED_POSITIONS = 100
+
+# Сколько последних показанных видео помнит запись: давно показанные
+# видео могут попасть в подборку снова, а запись не растёт без предела
+MAX_SEEN_POSITIONS = 10_000
+
+# Накладные расходы на объекты Python одной записи, байт (оценка)
+STATE_OVERHEAD_BYTES = 2048
+
+# До какой доли предела памяти вытесняются записи: вытеснение пачкой
+# записывает в файл сразу много записей одной транзакцией
+EVICT_TO_FRACTION = 0.9
+
+
+class UserState:
+    """
+    Состояние одного пользователя: веса категорий, показанные видео
+    и последняя подборка.
+
+    Числовые данные хранятся массивами numpy, поэтому запись компактна
+    и сериализуется без pickle: заголовок JSON и сырые буферы массивов.
+    Позиции видео относятся к каталогу, с которым работает запись; при
+    сериализации с кодами каталога они записываются кодами video_code
+    общего словаря и переводятся в позиции другого каталога при чтении.
+    """
+
+    def __init__(self, user_id, weights, region=None):
+        self.user_id = user_id  # ID пользователя
+        self.region = region  # Регион, от ранга которого посчитаны веса
+        self.weights = weights  # Веса категорий пользователя (CategoryWeights)
+        self.seen = SeenSet(limit=MAX_SEEN_POSITIONS)  # Позиции показанных видео
+        self.last_slate = np.empty(0, dtype=np.int32)  # Позиции последней подборки
+        self.liked_positions = []  # Позиции последних понравившихся видео
+        self.last_liked_position = None  # Понравившееся видео для похожих
+
+    def like(self, position):
+        """
+        Запоминает понравившееся видео.
+
+        Args:
+            position (int): Позиция видео в каталоге.
+        """
+        self.last_liked_position = int(position)
+        self.liked_positions = (self.liked_positions + [int(position)])[
+            -MAX_LIKED_POSITIONS:
+        ]
+
+    def restore(self, history, positions_by_code):
+        """
+        Восстанавливает показанные и понравившиеся видео по журналу.
+
+        Коды видео журнала выданы общим с каталогом словарём, поэтому
+        переводятся в позиции каталога без сравнения строк.
+
+        Args:
+            history (pd.DataFrame): История пользователя из InteractionStore.
+            positions_by_code (np.ndarray): Обратный индекс video_code каталога
+                (code_positions).
+        """
+        positions = lookup_positions(positions_by_code, history["video_code"])
+        found = positions >= 0
+        self.seen.add(positions[found])
+        liked = found & (history["interaction_type"].to_numpy() == "like")
+        self.liked_positions = positions[liked][-MAX_LIKED_POSITIONS:].tolist()
+
+    def remap(self, video_codes, positions_by_code):
+        """
+        Переводит позиции видео записи в позиции другого каталога.
+
+        Видео, которых нет в новом каталоге, забываются.
+
+        Args:
+            video_codes (np.ndarray): Коды видео прежнего каталога по позициям.
+            positions_by_code (np.ndarray): Обратный индекс video_code нового
+                каталога (code_positions).
+        """
+        codes = self._position_codes(video_codes)
+        self._set_positions(codes, codes.pop("last_liked_position"), positions_by_code)
+
+    def _position_codes(self, video_codes):
+        # Коды общего словаря не зависят от порядка строк каталога
+        last = self.last_liked_position
+        return {
+            "seen": video_codes[self.seen.order],
+            "last_slate": video_codes[self.last_slate],
+            "liked_positions": video_codes[
+                np.asarray(self.liked_positions, dtype=np.int64)
+            ],
+            "last_liked_position": None if last is None else int(video_codes[last]),
+        }
+
+    def _set_positions(self, codes, last_liked_code, positions_by_code):
+        def positions(values):
+            found = lookup_positions(positions_by_code, values)
+            return found[found >= 0].astype(np.int32)
+
+        self.seen = SeenSet(positions(codes["seen"]), limit=MAX_SEEN_POSITIONS)
+        self.last_slate = positions(codes["last_slate"])
+        self.liked_positions = positions(codes["liked_positions"]).tolist()
+        last = positions([-1 if last_liked_code is None else last_liked_code])
+        self.last_liked_position = int(last[0]) if len(last) else None
+
+    @property
+    def nbytes(self):
+        """
+        Приблизительный объём памяти записи, байт.
+        """
+        return (
+            STATE_OVERHEAD_BYTES
+            + self.weights.weights.nbytes
+            + self.weights.likes.nbytes
+            + self.weights.dislikes.nbytes
+            + self.seen.positions.nbytes
+            + self.seen.order.nbytes
+            + self.last_slate.nbytes
+            + 8 * len(self.liked_positions)
+        )
+
+    def to_bytes(self, video_codes=None):
+        """
+        Сериализует запись: заголовок JSON и сырые буферы массивов.
+
+        Args:
+            video_codes (np.ndarray, optional): Коды видео каталога по
+                позициям; если заданы, вместо позиций записываются коды.
+
+        Returns:
+            bytes: Сериализованная запись.
+        """
+        if video_codes is None:
+            positions = {
+                "seen": self.seen.order,  # В порядке показа
+                "last_slate": self.last_slate,
+                "liked_positions": np.asarray(self.liked_positions, dtype=np.int64),
+                "last_liked_position": self.last_liked_position,
+            }
+        else:
+            positions = self._position_codes(video_codes)
+        last_liked = positions.pop("last_liked_position")
+        arrays = {
+            "weights": self.weights.weights,
+            "likes": self.weights.likes,
+            "dislikes": self.weights.dislikes,
+            **positions,
+        }
+        header = json.dumps(
+            {
+                "user_id": self.user_id,
+                "region": self.region,
+                "video_codes": video_codes is not None,
+                "last_liked_position": last_liked,
+                "categories": [str(category) for category in self.weights.categories],
+                "arrays": [
+                    [name, array.dtype.str, len(array)]
+                    for name, array in arrays.items()
+                ],
+            },
+            ensure_ascii=False,
+        ).encode()
+        return b"".join(
+            [len(header).to_bytes(4, "little"), header]
+            + [np.ascontiguousarray(array).tobytes() for array in arrays.values()]
+        )
+
+    @classmethod
+    def from_bytes(cls, data, positions_by_code=None):
+        """
+        Восстанавливает запись из результата to_bytes.
+
+        Позиции, записанные без кодов, нельзя перенести в каталог с
+        обратным индексом, и наоборот: такие позиции не восстанавливаются.
+
+        Args:
+            data (bytes): Сериализованная запись.
+            positions_by_code (np.ndarray, optional): Обратный индекс
+                video_code текущего каталога (code_positions).
+
+        Returns:
+            UserState: Состояние пользователя.
+        """
+        offset = 4 + int.from_bytes(data[:4], "little")
+        header = json.loads(data[4:offset])
+        arrays = {}
+        for name, dtype, count in header["arrays"]:
+            arrays[name] = np.frombuffer(data, dtype, count, offset).copy()
+            offset += arrays[name].nbytes
+
+        weights = CategoryWeights.from_arrays(
+            header["categories"],
+            arrays["weights"],
+            arrays["likes"],
+            arrays["dislikes"],
+        )
+        state = cls(header["user_id"], weights, header["region"])
+        coded = header.get("video_codes", False)
+        if coded and positions_by_code is not None:
+            state._set_positions(
+                arrays, header["last_liked_position"], positions_by_code
+            )
+        elif not coded and positions_by_code is None:
+            state.seen.add(arrays["seen"])
+            state.last_slate = arrays["last_slate"]
+            state.liked_positions = arrays["liked_positions"].tolist()
+            state.last_liked_position = header["last_liked_position"]
+        return state
+
+
+class UserStateStore:
+    """
+    Ограниченное по памяти хранилище состояний пользователей.
+
+    Записи хранятся в памяти в порядке последнего обращения (LRU).
+    Записи, к которым не обращались дольше ttl секунд, и самые давние
+    записи сверх max_bytes вытесняются. Если задан spill_path, вытесненные
+    записи сохраняются в SQLite и возвращаются при следующем обращении
+    по user_id, так что пользователь продолжает с прежним состоянием без
+    повторного проигрывания журнала взаимодействий, в том числе после
+    перезапуска процесса. Без spill_path вытесненные записи удаляются.
+    С кодами видео каталога video_codes позиции видео записываются в файл
+    кодами общего словаря, поэтому запись, сохранённая до изменения
+    каталога, восстанавливается с позициями нового каталога.
+
+    Вытесненная запись, которую ещё держит выполняющийся запрос, остаётся
+    доступной по слабой ссылке: повторное обращение получает тот же объект,
+    а не вторую копию из файла, поэтому изменения запроса не теряются.
+    """
+
+    def __init__(
+        self, max_bytes=256 * 2**20, ttl=24 * 3600, spill_path=None, video_codes=None
+    ):
+        self.max_bytes = max_bytes  # Предел памяти записей, байт
+        self.ttl = ttl  # Время жизни записи в памяти без обращений, сек
+        self.spill_path = spill_path  # Файл для вытесненных записей
+        self.video_codes = None  # Коды видео каталога по позициям
+        self.positions_by_code = None  # Обратный индекс video_code каталога
+        if video_codes is not None:
+            self.video_codes = np.asarray(video_codes)
+            self.positions_by_code = code_positions(self.video_codes)
+        self.nbytes = 0  # Текущий объём записей в памяти, байт
+        self._states = OrderedDict()  # user_id → запись, давние первыми
+        self._sizes = {}  # user_id → учтённый объём записи
+        self._touched = {}  # user_id → время последнего обращения
+        # user_id → вытесненная запись, пока на неё есть ссылки
+        self._evicted = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+        self._connection = None
+        if spill_path is not None:
+            self._connection = sqlite3.connect(
+                spill_path, timeout=30, check_same_thread=False, isolation_level=None
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS user_states "
+                "(user_id TEXT PRIMARY KEY, state BLOB NOT NULL, updated_at REAL)"
+            )
+
+    def __len__(self):
+        return len(self._states)
+
+    def __contains__(self, user_id):
+        return user_id in self._states
+
+    def get(self, user_id):
+        """
+        Возвращает состояние пользователя из памяти или из файла.
+
+        Args:
+            user_id (str): ID пользователя.
+
+        Returns:
+            UserState | None: Состояние или None, если его нет.
+        """
+        REGISTRY.count_cache_call("user_state")
+        with self._lock:
+            self._expire()
+            state = self._states.get(user_id)
+            if state is not None:
+                self._touch(user_id, state)
+                return state
+
+            REGISTRY.count_cache_miss("user_state")
+            state = self._evicted.get(user_id)
+            if state is not None:
+                # Запись вытеснена, но ещё используется: возвращаем её же
+                self._touch(user_id, state)
+                self._evict()
+                return state
+            if self._connection is None:
+                return None
+            with track("user_state_restore") as record:
+                row = self._connection.execute(
+                    "SELECT state FROM user_states WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                state = UserState.from_bytes(row[0], self.positions_by_code)
+                record.rows = 1
+            self._touch(user_id, state)
+            self._evict()
+            return state
+
+    def put(self, state):
+        """
+        Сохраняет состояние пользователя после изменений.
+
+        Args:
+            state (UserState): Состояние пользователя.
+        """
+        with self._lock:
+            self._expire()
+            self._touch(state.user_id, state)
+            self._evict()
+
+    def set_catalog(self, video_codes):
+        """
+        Переводит записи в позиции нового каталога.
+
+        Записи в памяти перекодируются сразу, записи в файле хранят коды
+        видео и переводятся при чтении. Тот же каталог ничего не меняет.
+
+        Args:
+            video_codes (np.ndarray): Колонка video_code каталога.
+        """
+        video_codes = np.asarray(video_codes)
+        with self._lock:
+            if self.video_codes is not None and np.array_equal(
+                self.video_codes, video_codes
+            ):
+                return
+            positions_by_code = code_positions(video_codes)
+            if self.video_codes is not None:
+                for user_id, state in list(self._states.items()):
+                    state.remap(self.video_codes, positions_by_code)
+                    size = state.nbytes
+                    self.nbytes += size - self._sizes[user_id]
+                    self._sizes[user_id] = size
+                for state in list(self._evicted.values()):
+                    state.remap(self.video_codes, positions_by_code)
+            self.video_codes, self.positions_by_code = video_codes, positions_by_code
+
+    def flush(self):
+        """
+        Сохраняет все записи из памяти в файл, не вытесняя их.
+        """
+        with self._lock:
+            self._spill(list(self._states.values()))
+
+    def close(self):
+        """
+        Сохраняет записи в файл и закрывает его.
+        """
+        self.flush()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _touch(self, user_id, state):
+        self._evicted.pop(user_id, None)
+        self._states[user_id] = state
+        self._states.move_to_end(user_id)  # Самая свежая запись — в конце
+        self._touched[user_id] = time.monotonic()
+        size = state.nbytes
+        self.nbytes += size - self._sizes.get(user_id, 0)
+        self._sizes[user_id] = size
+
+    def _expire(self):
+        # Давние записи лежат в начале, поэтому проверяем только их
+        deadline = time.monotonic() - self.ttl
+        expired = []
+        for user_id in self._states:
+            if self._touched[user_id] >= deadline:
+                break
+            expired.append(user_id)
+        self._remove(expired)
+
+    def _evict(self):
+        if self.nbytes <= self.max_bytes:
+            return
+        evicted = []
+        users = iter(self._states)
+        nbytes = self.nbytes
+        # Последнюю запись оставляем, даже если она одна больше предела
+        while (
+            nbytes > self.max_bytes * EVICT_TO_FRACTION
+            and len(evicted) < len(self._states) - 1
+        ):
+            user_id = next(users)
+            evicted.append(user_id)
+            nbytes -= self._sizes[user_id]
+        self._remove(evicted)
+
+    def _remove(self, user_ids):
+        if not user_ids:
+            return
+        self._spill([self._states[user_id] for user_id in user_ids])
+        for user_id in user_ids:
+            self._evicted[user_id] = self._states.pop(user_id)
+            del self._touched[user_id]
+            self.nbytes -= self._sizes.pop(user_id)
+
+    def _spill(self, states):
+        if self._connection is None or not states:
+            return
+        with track("user_state_spill") as record:
+            now = time.time()
+            with self._connection:
+                self._connection.execute("BEGIN IMMEDIATE")
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO user_states (user_id, state, updated_at) "
+                    "VALUES (?, ?, ?)",
+                    [
+                        (state.user_id, state.to_bytes(self.video_codes), now)
+                        for state in states
+                    ],
+                )
+            record.rows = len(states)
+
+
+@st.cache_resource(show_spinner=False)  # Открывается мгновенно
+def get_user_state_store(
+    spill_path="user_states.db", max_bytes=256 * 2**20, ttl=24 * 3600
+):
+    """
+    Возвращает общее для всех сессий хранилище состояний пользователей.
+
+    Args:
+        spill_path (str): Файл для вытесненных записей.
+        max_bytes (int): Предел памяти записей, байт.
+        ttl (float): Время жизни записи в памяти без обращений, сек.
+
+    Returns:
+        UserStateStore: Хранилище состояний.
+    """
+    store = UserStateStore(max_bytes, ttl, spill_path)
+    atexit.register(store.close)  # Сохраняем записи при завершении процесса
+    return store
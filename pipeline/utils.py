@@ -1,37 +1,324 @@
-import streamlit as st
+import hashlib
+import os
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import streamlit as st
+from id_interning import intern_columns, interner_path, load_interner
+from metrics import cached, record_work
+from time_popularity import LOGS_TIMEZONE
+from title_embeddings import build_title_index
+
+# Строковые колонки, которые хранятся словарём, если значения повторяются
+DICTIONARY_COLUMNS = ["category_id", "region", "city", "video_id", "user_id"]
+
+# Колонки логов, нужные для расчёта рангов категорий
+LOG_COLUMNS = ["video_id", "region", "watchtime"]
+
+# Колонки каталога видео, используемые приложением
+VIDEO_COLUMNS = [
+    "video_id",
+    "title",
+    "v_pub_datetime",
+    "category_id",
+    "v_total_comments",
+    "v_year_views",
+    "v_duration",
+    "v_likes",
+    "v_dislikes",
+    "cmments_per_day",
+    "v_long_views_7_days",
+]
+
+
+class DatasetHandle:
+    """
+    Неизменяемый загруженный набор данных с отпечатком содержимого.
+
+    Отпечаток считается один раз при загрузке по пути, времени изменения,
+    размеру и метаданным Parquet-файла. Кешируемые функции хешируют
+    набор данных по отпечатку (DATASET_HASH_FUNCS) за O(1) вместо
+    хеширования всего DataFrame при каждом перезапуске.
+    """
+
+    def __init__(self, path, columns, fingerprint, df):
+        self.path = path  # Путь к файлу
+        self.columns = columns  # Загруженные колонки
+        self.fingerprint = fingerprint  # Отпечаток файла и набора колонок
+        self.df = df  # Загруженный DataFrame, изменять нельзя
+
+    def __len__(self):
+        return len(self.df)
+
+
+# Хеш-функции для кешей Streamlit: набор данных хешируется по отпечатку
+DATASET_HASH_FUNCS = {DatasetHandle: lambda handle: handle.fingerprint}
+
+
+def as_frame(data):
+    """
+    Возвращает DataFrame набора данных или сам переданный DataFrame.
+
+    Args:
+        data (DatasetHandle | pd.DataFrame): Набор данных.
+
+    Returns:
+        pd.DataFrame: DataFrame.
+    """
+    return data.df if isinstance(data, DatasetHandle) else data
+
+
+def dataset_fingerprint(path, file_type="parquet", columns=None):
+    """
+    Считает отпечаток файла без чтения данных.
+
+    Args:
+        path (str): Путь к файлу.
+        file_type (str): Тип файла ("parquet" или "csv").
+        columns (list[str], optional): Загружаемые колонки.
+
+    Returns:
+        str: Отпечаток в шестнадцатеричном виде.
+    """
+    stat = os.stat(path)
+    parts = [os.path.abspath(path), stat.st_mtime_ns, stat.st_size, columns]
+    if file_type == "parquet":
+        metadata = pq.read_metadata(path)  # Читается только футер файла
+        parts += [metadata.num_rows, metadata.num_row_groups, metadata.created_by]
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def load_dataset(path, file_type="parquet", columns=None):
+    """
+    Загружает набор данных, если файл изменился с прошлой загрузки.
+
+    Args:
+        path (str): Путь к файлу.
+        file_type (str): Тип файла ("parquet" или "csv").
+        columns (list[str], optional): Загружаемые колонки, по умолчанию все.
+
+    Returns:
+        DatasetHandle: Набор данных с отпечатком.
+    """
+    fingerprint = dataset_fingerprint(path, file_type, columns)
+    return _load_dataset(path, file_type, columns, fingerprint)
+
+
+@cached("load_file", cache=st.cache_resource, max_entries=8)
+def _load_dataset(path, file_type, columns, fingerprint):
+    df = _read_file(path, file_type, columns)
+    # Коды ID из словаря, общего для файлов каталога данных
+    intern_columns(df, load_interner(interner_path(path)))
+    return DatasetHandle(path, columns, fingerprint, df)
 
 
-@st.cache_data
-def load_file(path, file_type="parquet"):
+def load_file(path, file_type="parquet", columns=None):
     """
     Загружает файл в зависимости от его типа.
 
+    Таблица загружается один раз на процесс и общая для всех сессий,
+    поэтому изменять её нельзя; при изменении файла она загружается заново.
+    Parquet-файл один раз конвертируется в компактный Arrow IPC файл рядом
+    с исходным, который затем отображается в память: числовые и строковые
+    колонки читаются без копирования.
+    К колонкам video_id, user_id и category_id добавляются колонки
+    целочисленных кодов video_code, user_code и category_code из словаря
+    ids.db рядом с файлом.
+
     Args:
         path (str): Путь к файлу.
         file_type (str): Тип файла ("parquet" или "csv").
+        columns (list[str], optional): Загружаемые колонки, по умолчанию все.
 
     Returns:
         pd.DataFrame: Загруженный DataFrame.
     """
+    return load_dataset(path, file_type, columns).df
+
+
+def _read_file(path, file_type, columns):
     if file_type == "parquet":
-        df = pd.read_parquet(path)  # Загружаем данные из файла Parquet
+        table = _read_arrow_cache(path)  # Отображаем компактную копию в память
+        if columns is not None:
+            table = table.select(columns)  # Берём только нужные колонки
+        df = arrow_to_frame(table)
     elif file_type == "csv":
-        df = pd.read_csv(path)  # Загружаем данные из файла CSV
+        df = _compact_dtypes(pd.read_csv(path, usecols=columns))  # Загружаем CSV
+        record_work(bytes_read=os.path.getsize(path))
+    record_work(rows=len(df))
     return df  # Возвращаем загруженный DataFrame
 
 
-def get_current_time_specific_info():
+def _read_arrow_cache(path):
+    """
+    Возвращает отображённую в память компактную Arrow-копию Parquet-файла.
+
+    Копия пересоздаётся, если исходный файл новее неё. Прочитанные байты
+    учитываются только при создании копии: отображение в память не читает
+    данные, страницы подгружаются при обращении к колонкам.
+    """
+    cache_path = f"{path}.arrow"
+    if not os.path.exists(cache_path) or os.path.getmtime(
+        cache_path
+    ) < os.path.getmtime(path):
+        write_arrow_file(_compact_table(pq.read_table(path)), cache_path)
+        record_work(bytes_read=os.path.getsize(cache_path))
+
+    return read_arrow_file(cache_path)
+
+
+def write_arrow_file(table, path):
+    """
+    Атомарно записывает Arrow-таблицу в файл Arrow IPC без сжатия.
+
+    Args:
+        table (pa.Table): Таблица.
+        path (str): Путь к файлу.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)  # Атомарно подменяем файл
+
+
+def read_arrow_file(path):
+    """
+    Отображает файл Arrow IPC в память без копирования данных.
+
+    Args:
+        path (str): Путь к файлу.
+
+    Returns:
+        pa.Table: Таблица, буферы которой ссылаются на отображённый файл.
+    """
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def arrow_to_frame(table):
+    """
+    Переводит Arrow-таблицу в DataFrame с минимумом копирования.
+
+    Строковые колонки остаются в Arrow-памяти, колонки не склеиваются
+    в общий блок.
+
+    Args:
+        table (pa.Table): Таблица.
+
+    Returns:
+        pd.DataFrame: DataFrame.
+    """
+    return table.to_pandas(split_blocks=True, types_mapper=_string_types_mapper)
+
+
+def _compact_table(table):
+    """
+    Приводит колонки Arrow-таблицы к компактным типам.
+
+    Повторяющиеся строковые колонки из DICTIONARY_COLUMNS кодируются
+    отсортированным словарём, целые числа понижаются до минимальной
+    разрядности, а float64 — до float32, если это не теряет точности.
+    """
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if (
+            field.name in DICTIONARY_COLUMNS
+            and pa.types.is_string(field.type)
+            and pc.count_distinct(column).as_py() * 2 <= len(column)
+        ):
+            # Сортированный словарь сохраняет порядок группировок как у строк
+            values = pc.unique(column)
+            values = values.take(pc.sort_indices(values))
+            column = pa.DictionaryArray.from_arrays(
+                pc.index_in(column, value_set=values).combine_chunks(), values
+            )
+        elif pa.types.is_integer(field.type) and len(column) > 0:
+            bounds = pc.min_max(column)
+            for int_type in (pa.int8(), pa.int16(), pa.int32()):
+                if (
+                    int_type.bit_width < field.type.bit_width
+                    and bounds["min"].as_py() is not None
+                    and np.iinfo(int_type.to_pandas_dtype()).min
+                    <= bounds["min"].as_py()
+                    and bounds["max"].as_py()
+                    <= np.iinfo(int_type.to_pandas_dtype()).max
+                ):
+                    column = column.cast(int_type)
+                    break
+        elif pa.types.is_float64(field.type):
+            downcast = column.cast(pa.float32(), safe=False)
+            if pc.all(
+                pc.or_kleene(
+                    pc.equal(downcast.cast(pa.float64()), column), pc.is_nan(column)
+                )
+            ).as_py() in (True, None):
+                column = downcast
+        table = table.set_column(i, field.name, column)
+    return table
+
+
+def _compact_dtypes(df):
+    """
+    Приводит колонки DataFrame к компактным типам.
+    """
+    for column in df.columns:
+        if column in DICTIONARY_COLUMNS and df[column].nunique() * 2 <= len(df):
+            df[column] = df[column].astype("category")
+        elif pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast="integer")
+    return df
+
+
+def _string_types_mapper(arrow_type):
+    """
+    Оставляет строковые колонки в Arrow-памяти вместо объектов Python.
+    """
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def get_current_time_specific_info(cube, region=None, now=None, top_k=10):
     """
     Получает информацию о самых популярных категориях в текущее время суток.
+
+    Args:
+        cube (TimePopularityCube): Куб популярности категорий по часам.
+        region (str, optional): Регион пользователя, если известен.
+        now (pd.Timestamp, optional): Текущее время, по умолчанию сейчас.
+        top_k (int): Количество категорий.
+
+    Returns:
+        pd.DataFrame: DataFrame с колонками 'category_id', 'views', 'share'.
     """
-    # Здесь должна быть ваша реализация получения информации о популярных категориях
-    pass  # Заглушка для будущей реализации
+    now = pd.Timestamp.now(tz=LOGS_TIMEZONE) if now is None else pd.Timestamp(now)
+    if now.tz is not None:
+        now = now.tz_convert(LOGS_TIMEZONE)  # Час суток по времени логов
+    hour = (now.hour + (now.minute >= 30)) % 24  # Округление как в логах
 
+    return cube.top_categories(hour, region, top_k)
 
-def create_embeddings_and_clusters():
+
+def create_embeddings_and_clusters(
+    df_video, path="data/video_stat.parquet.titles", dim=64, n_subcategories=20
+):
     """
-    Создает эмбеддинги и кластеры для подкатегорий.
+    Создает эмбеддинги названий видео и кластеры для подкатегорий.
+
+    Векторы названий сохраняются в файл, отображаемый в память, а кластеры
+    внутри каждой категории служат подкатегориями и индексом поиска
+    похожих видео.
+
+    Args:
+        df_video (pd.DataFrame): DataFrame с данными о видео.
+        path (str): Папка для файлов индекса.
+        dim (int): Размерность эмбеддингов.
+        n_subcategories (int): Максимум подкатегорий в одной категории.
+
+    Returns:
+        TitleIndex: Индекс названий видео.
     """
-    # Здесь должна быть ваша реализация создания эмбеддингов и кластеров
-    pass  # Заглушка для будущей реализации
+    return build_title_index(df_video, path, dim, n_subcategories)
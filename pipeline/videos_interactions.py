@@ -1,43 +1,126 @@
+import numpy as np
 import pandas as pd
+import sqlite3
 import streamlit as st
-from utils import load_file
-import random
+from interaction_store import get_interaction_store
+from metrics import track
+from user_state import get_user_state_store
 
 
-def show_ten_videos(df_video, number_videos_from_cat):
+def select_slate(
+    number_videos_from_cat, sampler, seen, similar_positions=(), category_weights=None
+):
+    """
+    Выбирает позиции видео для подборки из общего каталога.
+
+    Категории выбираются пропорционально количеству видео N из рекомендации
+    с исследованием согласно режиму sampler.
+
+    Args:
+        number_videos_from_cat (pd.DataFrame): DataFrame с категориями и количеством видео.
+        sampler (SlateSampler): Выбор категорий и видео подборки.
+        seen (SeenSet): Позиции уже показанных видео, пополняется выбранными.
+        similar_positions (Sequence[int]): Позиции видео, похожих на последнее
+            понравившееся; ставятся в начало подборки.
+        category_weights (CategoryWeights, optional): Веса пользователя
+            с лайками и дизлайками по категориям для Thompson sampling.
+
+    Returns:
+        list[int]: Позиции выбранных видео в каталоге.
+    """
+    slate_size = int(number_videos_from_cat["N"].sum())  # Размер подборки
+    # Позиции выбранных видео в общем каталоге, первыми — похожие видео
+    slate_positions = [int(position) for position in similar_positions][:slate_size]
+    seen.add(slate_positions)
+    if len(slate_positions) >= slate_size:
+        return slate_positions
+
+    categories = number_videos_from_cat["category_id"].to_numpy()
+    likes = dislikes = None
+    if category_weights is not None:
+        likes, dislikes = category_weights.feedback_counts(categories)
+    (positions,) = sampler.sample(
+        categories,
+        number_videos_from_cat["N"].to_numpy(),
+        [seen],
+        slate_size - len(slate_positions),
+        likes,
+        dislikes,
+    )  # Непоказанные видео категорий, выбранных пропорционально N
+    return slate_positions + positions.tolist()
+
+
+def liked_video_candidates(position, k, seen, coview_index=None, title_index=None):
+    """
+    Подбирает видео для подборки после лайка.
+
+    Сначала идут видео, которые зрители понравившегося видео смотрели
+    также, остаток дополняется видео с похожими названиями.
+
+    Args:
+        position (int): Позиция понравившегося видео в каталоге.
+        k (int): Количество видео.
+        seen (SeenSet): Позиции уже показанных видео.
+        coview_index (CoViewIndex, optional): Индекс совместных просмотров.
+        title_index (TitleIndex, optional): Индекс названий видео.
+
+    Returns:
+        np.ndarray: Позиции видео-кандидатов.
+    """
+    candidates = np.empty(0, dtype=np.int64)
+    if coview_index is not None:
+        candidates = coview_index.neighbours(position, k, seen).astype(np.int64)
+    if len(candidates) < k and title_index is not None:
+        similar = title_index.similar_videos(position, k=k, seen=seen)
+        similar = similar[~np.isin(similar, candidates)]
+        candidates = np.concatenate([candidates, similar])[:k]
+    return candidates
+
+
+def show_ten_videos(
+    df_video,
+    number_videos_from_cat,
+    sampler,
+    user_state,
+    title_index=None,
+    coview_index=None,
+):
     st.markdown(
         "<h3>Выберите видео для подробного просмотра:</h3>", unsafe_allow_html=True
     )
 
-    # Пустой DataFrame для хранения выбранных видео
-    ten_videos_df = pd.DataFrame()
-    # Проходим по каждой категории и выбираем N наиболее популярных видео
-    for _, row in number_videos_from_cat.iterrows():
-        # Закомментированный код для случайного выбора группы пользователей
-        # if "group" not in st.session_state:
-        #     st.session_state.group = random.choice(["A", "B"])
-        # if st.session_state.group == "A":
-        #     category = random.choice(df_video["category_id"].unique())
-        #     N = 1
-        # elif st.session_state.group == "B":
-        #     category = row["category_id"]
-        #     N = row["N"]
-        category = random.choice(
-            df_video["category_id"].unique()
-        )  # Случайный выбор категории
-        N = 1  # Количество видео для выбора
-
-        # Фильтруем по категории и сортируем по популярности
-        filtered_videos = df_video[df_video["category_id"] == category].sort_values(
-            by=["cmments_per_day", "v_long_views_7_days"],
-            ascending=(False, False),
-        )
-        # Выбираем первые N видео
-        top_videos = filtered_videos.iloc[:N]
-        # Добавляем в итоговый DataFrame
-        ten_videos_df = pd.concat([ten_videos_df, top_videos])
-    # Сбрасываем индексы для корректного отображения
-    ten_videos_df = ten_videos_df.reset_index(drop=True)
+    # Позиции видео каталога, уже показанных пользователю
+    shown_positions = user_state.seen
+
+    # После лайка половину подборки занимают видео, которые смотрели зрители
+    # понравившегося видео, и видео с похожими названиями
+    similar_positions = []
+    liked_position = user_state.last_liked_position
+    user_state.last_liked_position = None
+    if liked_position is not None:
+        with track("similar_videos") as record:
+            similar_positions = liked_video_candidates(
+                liked_position,
+                int(number_videos_from_cat["N"].sum()) // 2,
+                shown_positions,
+                coview_index,
+                title_index,
+            )
+            record.rows = len(similar_positions)
+
+    with track("select_slate") as record:
+        slate_positions = select_slate(
+            number_videos_from_cat,
+            sampler,
+            shown_positions,
+            similar_positions=similar_positions,
+            category_weights=user_state.weights,
+        )  # Позиции выбранных видео в общем каталоге
+        record.rows = len(slate_positions)
+    user_state.last_slate = np.asarray(slate_positions, dtype=np.int32)
+    get_user_state_store().put(user_state)  # Учитываем изменения состояния
+    # Собираем подборку одной выборкой по позициям
+    ten_videos_df = df_video.iloc[slate_positions].reset_index(drop=True)
     # st.write(ten_videos_df)
 
     # Отображаем карточки для первых 10 видео
@@ -56,10 +139,6 @@ def show_ten_videos(df_video, number_videos_from_cat):
             )
 
     ten_video_titles = ten_videos_df["title"].tolist()  # Список названий видео
-    ten_video_ids = ten_videos_df["video_id"].tolist()  # Список ID видео
-    st.session_state.df_video = df_video[
-        ~(df_video["video_id"].isin(ten_videos_df["video_id"]))
-    ].copy()  # Обновление DataFrame с видео
 
     with st.form("select_video_form"):
         selected_option = st.selectbox(
@@ -68,32 +147,31 @@ def show_ten_videos(df_video, number_videos_from_cat):
         selected_video_index = ten_video_titles.index(
             selected_option
         )  # Индекс выбранного видео
-        selected_video_id = ten_video_ids[selected_video_index]  # ID выбранного видео
+        # Позиция выбранного видео в каталоге
+        selected_position = slate_positions[selected_video_index]
         select_button = st.form_submit_button(label="Просмотр")  # Кнопка для просмотра
 
         if select_button:
-            st.session_state.selected_video = (
-                selected_video_id  # Сохранение выбранного видео в session_state
-            )
+            st.session_state.selected_video = int(
+                selected_position
+            )  # Сохранение позиции выбранного видео в session_state
             st.rerun()  # Перезагрузка страницы
 
 
-def show_video_info(df_video, user_id):
+def show_video_info(df_video, user_state):
+    user_id = user_state.user_id  # ID пользователя
     interactions = []  # Список для хранения взаимодействий
     video_card = None  # Переменная для хранения информации о видео
 
-    if st.session_state.selected_video:
-        video_card = df_video[df_video["video_id"] == st.session_state.selected_video]
-
-        if video_card.empty:
+    if st.session_state.selected_video is not None:
+        position = st.session_state.selected_video  # Позиция видео в каталоге
+        if not 0 <= position < len(df_video):
             st.session_state.selected_video = (
                 None  # Сброс выбранного видео, если оно не найдено
             )
-            video_card = None
-        else:
-            video_card = video_card.iloc[
-                0
-            ]  # Получение первой строки с информацией о видео
+            return
+
+        video_card = df_video.iloc[position]  # Строка каталога по позиции
 
         st.markdown("<hr>", unsafe_allow_html=True)  # Горизонтальная линия
         with st.form(f"Video_{video_card['video_id']}"):
@@ -133,6 +211,8 @@ def show_video_info(df_video, user_id):
             if submit_button:
                 if like_dislike == "Лайк":
                     interactions.append((video_card, "like"))  # Добавление лайка
+                    # Позиция видео в каталоге для поиска похожих видео
+                    user_state.like(video_card.name)
                 elif like_dislike == "Дизлайк":
                     interactions.append((video_card, "dislike"))  # Добавление дизлайка
                 else:
@@ -144,9 +224,14 @@ def show_video_info(df_video, user_id):
                         (video_card, "comment")
                     )  # Добавление комментария
 
-                st.session_state.interactions_data = log_user_interaction(
+                log_user_interaction(
                     interactions, user_id
                 )  # Логирование взаимодействий
+                for video_row, interaction_type in interactions:
+                    user_state.weights.update(
+                        video_row["category_id"], interaction_type
+                    )  # Обновляем веса категорий пользователя
+                get_user_state_store().put(user_state)  # Учитываем изменения
                 st.success(
                     "Ваши взаимодействия сохранены."
                 )  # Сообщение об успешном сохранении
@@ -160,16 +245,6 @@ def show_video_info(df_video, user_id):
 
 
 def log_user_interaction(interactions, user_id):
-    try:
-        user_interactions_df = load_file(
-            path="user_interactions.csv", file_type="csv"
-        )  # Загрузка существующих взаимодействий
-    except Exception as e:
-        st.error(f"Ошибка при загрузке файла: {e}")  # Сообщение об ошибке при загрузке
-        user_interactions_df = pd.DataFrame(
-            columns=["user_id", "video_id", "category_id", "interaction_type"]
-        )  # Создание пустого DataFrame при ошибке
-
     new_interactions = [
         {
             "user_id": user_id,
@@ -182,11 +257,11 @@ def log_user_interaction(interactions, user_id):
         for video_row, interaction_type in interactions
     ]  # Формирование новых взаимодействий
 
-    user_interactions_df = pd.concat(
-        [user_interactions_df, pd.DataFrame(new_interactions)], ignore_index=True
-    )  # Добавление новых взаимодействий к существующим
-    user_interactions_df.to_csv(
-        "user_interactions.csv", mode="w", index=False
-    )  # Сохранение в CSV
-
-    return user_interactions_df  # Возвращение обновленного DataFrame
+    try:
+        with track("log_user_interaction") as record:
+            # Дозапись в буфер общего журнала; буфер записывается одной
+            # транзакцией вместе с взаимодействиями других сессий
+            get_interaction_store().append(new_interactions)
+            record.rows = len(new_interactions)
+    except sqlite3.Error as e:
+        st.error(f"Ошибка при сохранении взаимодействий: {e}")  # Сообщение об ошибке
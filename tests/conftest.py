@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули конвейера импортируются как модули верхнего уровня, как в pipeline/app.py
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "pipeline"))
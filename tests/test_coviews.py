@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from coviews import CoViewIndex, build_coview_index
+from id_interning import IdInterner, intern_columns
+from popularity_index import SeenSet
+from recommendation_engine import recommend_next_videos
+
+N_VIDEOS = 40
+
+
+@pytest.fixture
+def setup(tmp_path):
+    rng = np.random.default_rng(0)
+    interner = IdInterner(str(tmp_path / "ids.db"))
+    # Порядок каталога отличается от порядка кодов словаря
+    interner.encode("video_id", [f"v{i}" for i in range(N_VIDEOS + 5)][::-1])
+    df_video = intern_columns(
+        pd.DataFrame({"video_id": [f"v{i}" for i in range(N_VIDEOS)]}), interner
+    )
+
+    n_logs = 600
+    df_logs = pd.DataFrame(
+        {
+            "user_id": [f"u{i}" for i in rng.integers(0, 30, n_logs)],
+            # Видео v40…v44 нет в каталоге: такие просмотры пропускаются
+            "video_id": [f"v{i}" for i in rng.integers(0, N_VIDEOS + 5, n_logs)],
+            "event_timestamp": pd.Timestamp("2024-06-01")
+            + pd.to_timedelta(rng.permutation(n_logs), unit="s"),
+        }
+    )
+    logs_path = str(tmp_path / "logs.parquet")
+    df_logs.to_parquet(logs_path, row_group_size=100)
+    yield df_logs, df_video, interner, logs_path
+    interner.close()
+
+
+def naive_counts(df_logs, window):
+    # Пары просмотров одного зрителя в пределах окна, перебором
+    positions = {f"v{i}": i for i in range(N_VIDEOS)}
+    counts = np.zeros((N_VIDEOS, N_VIDEOS))
+    df = df_logs[df_logs["video_id"].isin(positions)].sort_values("event_timestamp")
+    for _, views in df.groupby("user_id"):
+        views = views["video_id"].map(positions).tolist()
+        for i, a in enumerate(views):
+            for b in views[i + 1 : i + 1 + window]:
+                if a != b:
+                    counts[a, b] += 1
+                    counts[b, a] += 1
+    return counts
+
+
+def dense(index):
+    counts = np.zeros((len(index), len(index)))
+    for position in range(len(index)):
+        start, end = index.indptr[position], index.indptr[position + 1]
+        counts[position, index.indices[start:end]] = index.counts[start:end]
+    return counts
+
+
+def test_counts_match_naive_pairs(setup):
+    df_logs, df_video, interner, logs_path = setup
+
+    # Маленькие пакеты и части матрицы: пары на границах частей не теряются
+    index = build_coview_index(
+        [logs_path],
+        df_video,
+        interner,
+        window=3,
+        top_k=N_VIDEOS,
+        batch_size=70,
+        chunk_rows=13,
+    )
+
+    assert len(index) == N_VIDEOS
+    np.testing.assert_array_equal(dense(index), naive_counts(df_logs, window=3))
+    # Зрители нумеруются при построении, общий словарь ими не пополняется
+    assert (interner.encode("user_id", ["u1", "u2"], add=False) == -1).all()
+
+
+def test_top_k_keeps_most_coviewed(setup):
+    df_logs, df_video, interner, logs_path = setup
+    expected = naive_counts(df_logs, window=5)
+
+    index = build_coview_index([logs_path], df_video, interner, window=5, top_k=4)
+
+    for position in range(N_VIDEOS):
+        neighbours = index.neighbours(position, k=10)
+        row = expected[position]
+        # По убыванию числа совместных просмотров, при равенстве — по позиции
+        want = sorted(np.flatnonzero(row), key=lambda other: (-row[other], other))[:4]
+        assert neighbours.tolist() == want
+
+
+def test_lookup_by_video_id_uses_catalog_dictionary(setup):
+    df_logs, df_video, interner, logs_path = setup
+    built = build_coview_index([logs_path], df_video, interner, window=5, top_k=10)
+    index = CoViewIndex(
+        built.indptr,
+        built.indices,
+        built.counts,
+        interner,
+        df_video["video_code"].to_numpy(),
+    )
+
+    assert index.position("v7") == 7
+    assert index.position("v42") == -1  # В словаре, но не в каталоге
+    assert index.position("нет такого") == -1
+
+    top = recommend_next_videos("v7", index, k=3)
+    assert top.tolist() == [f"v{p}" for p in index.neighbours(7, 3)]
+    seen = SeenSet(index.neighbours(7, 1))
+    assert recommend_next_videos("v7", index, k=3, seen=seen).tolist() == (
+        top.tolist()[1:] + [f"v{index.neighbours(7, 4)[3]}"]
+    )
+    assert len(index.neighbours(7, k=0)) == 0
+    assert len(recommend_next_videos("нет такого", index)) == 0
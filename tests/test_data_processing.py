@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from compute_backends import available_backends
+from data_processing import (
+    get_initial_info,
+    get_initial_info_streaming,
+    ranks_from_partials,
+    update_watchtime_partials,
+)
+from id_interning import IdInterner, intern_columns
+from utils import load_dataset
+
+
+def reference_initial_info(df_logs, df_video):
+    # Исходная реализация: inner join, группировка и ранги на pandas
+    df_merged = pd.merge(
+        df_logs[["video_id", "region", "watchtime"]],
+        df_video[["video_id", "category_id"]],
+        on="video_id",
+        how="inner",
+    )
+    df_avg_watchtime = df_merged.groupby(["region", "category_id"], as_index=False).agg(
+        avg_watchtime=("watchtime", "mean")
+    )
+    df_avg_watchtime["rank"] = df_avg_watchtime.groupby("region")["avg_watchtime"].rank(
+        method="first", ascending=False
+    )
+    df_ranks_grouped = (
+        df_avg_watchtime.groupby("category_id")
+        .agg(avg_rank=("rank", "mean"))
+        .reset_index()
+    )
+    df_ranks_grouped = df_ranks_grouped[df_ranks_grouped["avg_rank"] <= 10]
+    df_ranks = df_avg_watchtime[
+        df_avg_watchtime["category_id"].isin(df_ranks_grouped["category_id"].unique())
+    ]
+    return df_ranks, df_ranks_grouped
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    categories = [f"cat{i:02d}" for i in range(15)]
+    df_video = pd.DataFrame(
+        {
+            "video_id": [f"v{i}" for i in range(300)],
+            "category_id": rng.choice(categories, 300),
+        }
+    )
+    n_logs = 5000
+    # Часть просмотров — видео, которых нет в каталоге, и пропуски watchtime
+    video_ids = np.array([f"v{i}" for i in rng.integers(0, 330, n_logs)], dtype=object)
+    watchtime = rng.random(n_logs) * 1000
+    watchtime[rng.random(n_logs) < 0.02] = np.nan
+    df_logs = pd.DataFrame(
+        {
+            "video_id": video_ids,
+            "region": rng.choice(["Москва", "Казань", "Омск", "Тула"], n_logs),
+            "watchtime": watchtime,
+        }
+    )
+    return df_logs, df_video
+
+
+def assert_same_ranks(result, expected):
+    for got, want in zip(result, expected):
+        got = got.sort_values(list(want.columns[:2])).reset_index(drop=True)
+        want = want.sort_values(list(want.columns[:2])).reset_index(drop=True)
+        pd.testing.assert_frame_equal(
+            got[list(want.columns)].astype({"category_id": str}),
+            want.astype({"category_id": str}),
+            check_dtype=False,
+            check_categorical=False,
+        )
+
+
+def test_get_initial_info_matches_reference(data):
+    df_logs, df_video = data
+
+    assert_same_ranks(
+        get_initial_info(df_logs, df_video), reference_initial_info(df_logs, df_video)
+    )
+
+
+def test_get_initial_info_on_interned_codes_matches_reference(data, tmp_path):
+    df_logs, df_video = data
+    interner = IdInterner(str(tmp_path / "ids.db"))
+    coded_logs = intern_columns(df_logs.copy(), interner)
+    coded_video = intern_columns(df_video.copy(), interner)
+    interner.close()
+
+    assert_same_ranks(
+        get_initial_info(coded_logs, coded_video),
+        reference_initial_info(df_logs, df_video),
+    )
+
+
+def test_streaming_matches_reference(data, tmp_path):
+    df_logs, df_video = data
+    # Логи за два «дня» в отдельных файлах
+    paths = [str(tmp_path / "day1.parquet"), str(tmp_path / "day2.parquet")]
+    df_logs.iloc[:2000].to_parquet(paths[0], row_group_size=500)
+    df_logs.iloc[2000:].to_parquet(paths[1], row_group_size=500)
+
+    expected = reference_initial_info(df_logs, df_video)
+    assert_same_ranks(get_initial_info_streaming(paths, df_video), expected)
+
+    # Частичные суммы: второй файл добавляется к уже посчитанному первому
+    partials_path = str(tmp_path / "partials.parquet")
+    get_initial_info_streaming(paths[:1], df_video, partials_path)
+    assert_same_ranks(
+        get_initial_info_streaming(paths, df_video, partials_path), expected
+    )
+
+
+@pytest.mark.parametrize("backend", available_backends())
+def test_backends_match_reference(data, tmp_path, backend):
+    df_logs, df_video = data
+    logs_path, videos_path = str(tmp_path / "logs.parquet"), str(
+        tmp_path / "videos.parquet"
+    )
+    df_logs.to_parquet(logs_path)
+    df_video.to_parquet(videos_path)
+
+    result = get_initial_info(
+        load_dataset(logs_path), load_dataset(videos_path), backend
+    )
+
+    assert_same_ranks(result, reference_initial_info(df_logs, df_video))
+
+
+def test_partials_are_rebuilt_when_sources_change(data, tmp_path):
+    df_logs, df_video = data
+    paths = [str(tmp_path / "day1.parquet"), str(tmp_path / "day2.parquet")]
+    df_logs.iloc[:2000].to_parquet(paths[0])
+    df_logs.iloc[2000:].to_parquet(paths[1])
+    partials_path = str(tmp_path / "partials.parquet")
+    update_watchtime_partials(paths, df_video, partials_path)
+
+    # Первый день перезаписан: учтённые суммы устарели
+    df_logs.iloc[:1000].to_parquet(paths[0])
+    assert_same_ranks(
+        ranks_from_partials(update_watchtime_partials(paths, df_video, partials_path)),
+        reference_initial_info(
+            pd.concat([df_logs.iloc[:1000], df_logs.iloc[2000:]]), df_video
+        ),
+    )
+
+    # Видео перенесены в другую категорию
+    moved = df_video.assign(category_id=df_video["category_id"].iloc[::-1].to_numpy())
+    assert_same_ranks(
+        ranks_from_partials(update_watchtime_partials(paths, moved, partials_path)),
+        reference_initial_info(
+            pd.concat([df_logs.iloc[:1000], df_logs.iloc[2000:]]), moved
+        ),
+    )
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+from id_interning import (
+    IdInterner,
+    code_positions,
+    intern_columns,
+    lookup_positions,
+)
+
+
+def test_codes_survive_reopen(tmp_path):
+    path = str(tmp_path / "ids.db")
+    interner = IdInterner(path)
+    codes = interner.encode("video_id", ["b", "a", "b", None, "c"])
+    interner.close()
+
+    assert codes.tolist() == [0, 1, 0, -1, 2]
+    assert codes.dtype == np.int32
+
+    interner = IdInterner(path)
+    # Известные значения сохраняют коды, новые получают следующие
+    assert interner.encode("video_id", ["c", "d", "a"]).tolist() == [2, 3, 1]
+    assert interner.decode("video_id", [3, -1, 0]).tolist() == ["d", None, "b"]
+    # Колонки кодируются независимо
+    assert interner.encode("user_id", ["a"]).tolist() == [0]
+    interner.close()
+
+
+def test_encode_without_add_keeps_dictionary(tmp_path):
+    interner = IdInterner(str(tmp_path / "ids.db"))
+    interner.encode("video_id", ["a"])
+
+    assert interner.encode("video_id", ["a", "z"], add=False).tolist() == [0, -1]
+    assert interner.encode("video_id", ["z"]).tolist() == [1]
+    interner.close()
+
+
+def test_instances_share_codes_through_file(tmp_path):
+    path = str(tmp_path / "ids.db")
+    first, second = IdInterner(path), IdInterner(path)
+    first.encode("video_id", ["a", "b"])
+
+    # Второй экземпляр дочитывает коды, выданные первым, а не выдаёт свои
+    assert second.encode("video_id", ["c", "b"]).tolist() == [2, 1]
+    assert first.decode("video_id", [2]).tolist() == ["c"]
+    first.close()
+    second.close()
+
+
+def test_many_values_after_merge_into_index(tmp_path):
+    interner = IdInterner(str(tmp_path / "ids.db"))
+    # Поштучные добавления переполняют словарь недавних значений
+    for i in range(1500):
+        interner.encode("user_id", [f"u{i}"])
+    values = [f"u{i}" for i in range(0, 1500, 7)]
+
+    assert interner.encode("user_id", values, add=False).tolist() == list(
+        range(0, 1500, 7)
+    )
+    interner.close()
+
+
+def test_intern_columns_and_positions(tmp_path):
+    interner = IdInterner(str(tmp_path / "ids.db"))
+    interner.encode("video_id", ["x", "y", "z"])
+    df_video = intern_columns(pd.DataFrame({"video_id": ["z", "x"]}), interner)
+
+    assert df_video["video_code"].tolist() == [2, 0]
+    positions = code_positions(df_video["video_code"])
+    # y есть в словаре, но не в каталоге; коды новее индекса и пропуски → -1
+    assert lookup_positions(positions, [0, 1, 2, 7, -1]).tolist() == [
+        1,
+        -1,
+        0,
+        -1,
+        -1,
+    ]
+    interner.close()
@@ -0,0 +1,94 @@
+import sqlite3
+import time
+
+import pytest
+
+from id_interning import IdInterner, code_positions, lookup_positions
+from interaction_store import InteractionStore
+
+INTERACTION = {
+    "user_id": "u1",
+    "video_id": "v1",
+    "category_id": "Юмор",
+    "interaction_type": "like",
+}
+
+
+def count_rows(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_buffer_is_flushed_by_timer(tmp_path):
+    path = str(tmp_path / "interactions.db")
+    store = InteractionStore(path, flush_size=64, flush_interval=1.0)
+    store.append([INTERACTION])
+    assert count_rows(path) == 0  # Запись ждёт в буфере
+
+    deadline = time.monotonic() + 5
+    while count_rows(path) == 0 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert count_rows(path) == 1
+    store.close()
+
+
+def test_close_flushes_buffer_and_history_reads_back(tmp_path):
+    path = str(tmp_path / "interactions.db")
+    store = InteractionStore(path, flush_size=64, flush_interval=60)
+    store.append([INTERACTION, {**INTERACTION, "interaction_type": "comment"}])
+    store.close()
+    assert count_rows(path) == 2
+
+    store = InteractionStore(path)
+    history = store.user_history("u1")
+    store.close()
+    assert history["interaction_type"].tolist() == ["like", "comment"]
+    assert history["video_id"].tolist() == ["v1", "v1"]
+
+
+def test_user_region_is_kept_across_reopen(tmp_path):
+    path = str(tmp_path / "interactions.db")
+    store = InteractionStore(path)
+    assert store.user_region("u1") is None
+    store.set_user_region("u1", "Москва")
+    store.set_user_region("u1", "Казань")
+    store.close()
+
+    store = InteractionStore(path)
+    assert store.user_region("u1") == "Казань"
+    assert store.user_region("u2") is None
+    store.close()
+
+
+def test_codes_come_from_shared_catalog_dictionary(tmp_path):
+    ids = IdInterner(str(tmp_path / "ids.db"))
+    catalog_codes = ids.encode("video_id", ["v0", "v1", "v2"])
+    store = InteractionStore(str(tmp_path / "interactions.db"), ids)
+    store.append([{**INTERACTION, "video_id": "v2"}])
+    history = store.user_history("u1")
+    store.close()
+
+    assert history["video_code"].tolist() == [catalog_codes[2]]
+    positions = lookup_positions(code_positions(catalog_codes), history["video_code"])
+    assert positions.tolist() == [2]
+
+
+def test_journal_reopens_with_its_own_dictionary(tmp_path):
+    (tmp_path / "data").mkdir()
+    ids = IdInterner(str(tmp_path / "data" / "ids.db"))
+    path = str(tmp_path / "interactions.db")
+    store = InteractionStore(path, ids)
+    store.append([INTERACTION])
+    store.close()
+
+    # Без словаря журнал открывается с тем, которым закодирован
+    store = InteractionStore(path)
+    assert store.ids.path == ids.path
+    assert store.user_history("u1")["video_id"].tolist() == ["v1"]
+    store.close()
+
+    with pytest.raises(ValueError):
+        InteractionStore(path, IdInterner(str(tmp_path / "other.db")))
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from popularity_index import REBUILD_FRACTION, SeenSet, build_category_index
+
+
+def make_catalog(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "category_id": rng.choice(["Юмор", "Спорт", "Музыка", None], n),
+            # Мало различных значений: много равенств первого ключа
+            "cmments_per_day": rng.integers(0, 20, n).astype(np.float64),
+            "v_long_views_7_days": rng.integers(0, 1000, n).astype(np.float64),
+        }
+    )
+
+
+def naive_top(df_video, category, n, seen=()):
+    # Популярные видео категории через полную сортировку каталога
+    df = df_video[df_video["category_id"] == category]
+    df = df[~df.index.isin(list(seen))]
+    df = df.sort_values(
+        ["cmments_per_day", "v_long_views_7_days"], ascending=False, kind="stable"
+    )
+    return df.index.to_numpy()[:n]
+
+
+def test_seen_set_is_sorted_and_unique():
+    seen = SeenSet([5, 3, 5])
+    seen.add(np.array([1, 3, 9]))
+
+    assert seen.positions.tolist() == [1, 3, 5, 9]
+    assert len(seen) == 4
+    assert seen.contains(np.array([0, 1, 4, 9, 10])).tolist() == [
+        False,
+        True,
+        False,
+        True,
+        False,
+    ]
+    assert SeenSet().contains(np.array([1, 2])).tolist() == [False, False]
+
+
+def test_top_videos_matches_full_sort():
+    df_video = make_catalog()
+    index = build_category_index(df_video)
+
+    assert set(index.categories) == {"Юмор", "Спорт", "Музыка"}
+    for category in index.categories:
+        assert index.top_videos(category, 25).tolist() == (
+            naive_top(df_video, category, 25).tolist()
+        )
+    assert len(index.top_videos("Нет такой", 10)) == 0
+
+
+def test_top_videos_skips_seen_positions():
+    df_video = make_catalog()
+    index = build_category_index(df_video)
+    seen = SeenSet(index.top_videos("Спорт", 30)[::2])
+    seen.add(naive_top(df_video, "Юмор", 5))
+
+    top = index.top_videos("Спорт", 20, seen)
+
+    assert top.tolist() == naive_top(df_video, "Спорт", 20, seen.positions).tolist()
+    assert not seen.contains(top).any()
+
+
+@pytest.mark.parametrize("changed", [10, int(REBUILD_FRACTION * 2000) + 50])
+def test_update_matches_rebuild(changed):
+    df_video = make_catalog()
+    index = build_category_index(df_video)
+    rng = np.random.default_rng(1)
+    positions = rng.choice(len(df_video), changed, replace=False)
+    df_video.loc[positions, "cmments_per_day"] = rng.integers(0, 20, changed)
+    df_video.loc[positions[::3], "v_long_views_7_days"] = np.nan
+
+    index.update(df_video, positions)
+    rebuilt = build_category_index(df_video)
+
+    assert index.order.tolist() == rebuilt.order.tolist()
+    assert index.offsets == rebuilt.offsets
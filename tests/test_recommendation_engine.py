@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from recommendation_engine import (
+    apportion,
+    recommend_categories,
+    recommend_categories_batch,
+)
+
+
+@pytest.mark.parametrize("total", [1, 7, 10, 100])
+def test_apportion_sums_to_total(total):
+    rng = np.random.default_rng(0)
+    weights = rng.random((50, 8)) * 10
+
+    counts = apportion(weights, total)
+
+    assert counts.shape == weights.shape
+    assert (counts.sum(axis=1) == total).all()
+    # Наибольшие остатки: каждое количество отличается от точной доли меньше чем на 1
+    quotas = weights * total / weights.sum(axis=1, keepdims=True)
+    assert (np.abs(counts - quotas) < 1).all()
+
+
+def test_apportion_is_exact_for_proportional_weights():
+    assert apportion(np.array([2.0, 1.0, 1.0]), 8).tolist() == [4, 2, 2]
+
+
+def test_apportion_clips_negative_weights():
+    counts = apportion(np.array([3.0, -5.0, 1.0]), 10)
+
+    assert counts.tolist() == [8, 0, 2]
+    assert apportion(np.array([-1.0, 2.0]), 4).tolist() == [0, 4]
+
+
+def test_apportion_gives_nothing_without_positive_weights():
+    weights = np.array([[0.0, 0.0], [-1.0, -2.0], [1.0, 1.0]])
+
+    assert apportion(weights, 5).sum(axis=1).tolist() == [0, 0, 5]
+
+
+def test_recommend_categories_batch_matches_single_user():
+    df_ranks_grouped = pd.DataFrame(
+        {"category_id": ["Юмор", "Спорт", "Музыка"], "avg_rank": [1.0, 2.0, 3.0]}
+    )
+    interactions = pd.DataFrame(
+        {
+            "user_id": ["a", "a", "b", "b", "b"],
+            "category_id": ["Юмор", "Спорт", "Музыка", "Музыка", "Юмор"],
+            "interaction_type": ["like", "comment", "like", "like", "dislike"],
+        }
+    )
+
+    batch = recommend_categories_batch(df_ranks_grouped, interactions)
+
+    for user_id, history in interactions.groupby("user_id"):
+        single = recommend_categories(df_ranks_grouped, history)
+        expected = dict(zip(single["category_id"], single["N"]))
+        got = batch[batch["user_id"] == user_id]
+        assert dict(zip(got["category_id"], got["N"])) == expected
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from region_priors import RegionPriors, build_region_priors
+
+
+def make_partials():
+    # Москва и Казань с достаточным числом просмотров, Омск — с малым
+    rows = [
+        ("Москва", "Спорт", 900, 10),
+        ("Москва", "Юмор", 500, 10),
+        ("Москва", "Музыка", 100, 10),
+        ("Казань", "Спорт", 100, 10),
+        ("Казань", "Юмор", 200, 10),
+        ("Казань", "Музыка", 800, 10),
+        ("Омск", "Юмор", 50, 1),
+    ]
+    return pd.DataFrame(
+        rows, columns=["region", "category_id", "watchtime_sum", "watchtime_count"]
+    )
+
+
+def test_known_region_gets_its_own_ranks():
+    priors = build_region_priors(make_partials(), min_views=5)
+
+    ranks = priors.ranks_for("Казань").set_index("category_id")["avg_rank"]
+
+    assert ranks.to_dict() == {"Музыка": 1.0, "Спорт": 3.0, "Юмор": 2.0}
+
+
+def test_unknown_and_sparse_regions_get_global_ranks():
+    priors = build_region_priors(make_partials(), min_views=5)
+
+    assert "Омск" not in priors
+    expected = priors.ranks_for(None)
+    pd.testing.assert_frame_equal(priors.ranks_for("Тула"), expected)
+    pd.testing.assert_frame_equal(priors.ranks_for("Омск"), expected)
+    # Средние ранги по всем регионам, как в get_initial_info
+    ranks = expected.set_index("category_id")["avg_rank"]
+    np.testing.assert_allclose(
+        ranks[["Музыка", "Спорт", "Юмор"]], [2.0, 2.0, 5 / 3], rtol=1e-6
+    )
+
+
+def test_categories_outside_region_top_are_left_out():
+    priors = RegionPriors(
+        np.array([[1.0, 0.0, 2.0]], dtype=np.float32),
+        np.array([1.0, 2.0, 3.0], dtype=np.float32),
+        ["Москва"],
+        ["Музыка", "Спорт", "Юмор"],
+    )
+
+    assert priors.ranks_for("Москва")["category_id"].tolist() == ["Музыка", "Юмор"]
+    assert len(priors.ranks_for("Тула")) == 3
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from popularity_index import SeenSet, build_category_index
+from slate_sampler import SAMPLING_MODES, SlateSampler
+
+
+@pytest.mark.parametrize("mode", SAMPLING_MODES)
+def test_category_counts_fill_the_slate(mode):
+    rng = np.random.default_rng(0)
+    weights = rng.random((200, 6)) * (rng.random((200, 6)) < 0.5)
+    weights[0] = 0  # Пользователь без весов получает равномерное распределение
+
+    counts = SlateSampler(None, mode, seed=0).category_counts(weights, 10)
+
+    assert counts.shape == weights.shape
+    assert (counts.sum(axis=1) == 10).all()
+    assert (counts >= 0).all()
+
+
+def test_proportional_mode_never_picks_zero_weight_categories():
+    weights = np.array([[3.0, 0.0, 1.0, 0.0], [0.0, 0.0, 0.0, 2.0]])
+    sampler = SlateSampler(None, "proportional", seed=0)
+
+    counts = np.concatenate([sampler.category_counts(weights, 10) for _ in range(200)])
+
+    assert (counts[:, [1, 3]][::2] == 0).all()
+    assert (counts[1::2] == [0, 0, 0, 10]).all()
+    # В среднем слоты распределяются по весам
+    share = counts[::2, 0].mean() / 10
+    assert 0.65 < share < 0.85
+
+
+def test_sample_returns_unseen_videos_and_marks_them_seen():
+    df_video = pd.DataFrame(
+        {
+            "category_id": ["a"] * 20 + ["b"] * 20,
+            "cmments_per_day": np.arange(40, dtype=np.float64),
+            "v_long_views_7_days": np.zeros(40),
+        }
+    )
+    sampler = SlateSampler(build_category_index(df_video), seed=0)
+    seen = SeenSet(range(0, 40, 2))
+
+    (slate,) = sampler.sample(["a", "b"], np.array([[1.0, 1.0]]), [seen], 6)
+
+    assert len(slate) == len(set(slate.tolist())) == 6
+    assert (slate % 2 == 1).all()  # Показанные видео пропущены
+    assert seen.contains(slate).all()
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        SlateSampler(None, "greedy")
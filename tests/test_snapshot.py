@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processing import aggregate_watchtime_partials, get_initial_info
+from popularity_index import build_category_index
+from region_priors import build_region_priors
+from snapshot import build_snapshot, read_snapshot
+from synthetic_data import generate_dataset
+from time_popularity import build_time_popularity_cube
+from utils import LOG_COLUMNS, VIDEO_COLUMNS, load_dataset
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    return generate_dataset(str(tmp_path_factory.mktemp("data")), 20_000, seed=1)
+
+
+def test_cleanup_removes_only_stale_snapshots(dataset, tmp_path):
+    logs_path, videos_path = dataset
+    root = tmp_path / "out"
+    stale = root / "v1-0123456789abcdef"
+    # Папки рядом со снимками, которые не являются снимками
+    kept = [
+        root / "video_stat.parquet.titles",
+        root / "video_stat.parquet.deltas",
+        root / "v1-0123456789abcdeg",
+        root / "v1-fedcba9876543210",  # Без манифеста
+    ]
+    for folder in [stale] + kept:
+        folder.mkdir(parents=True)
+        (folder / "data.bin").write_bytes(b"1")
+    (stale / "manifest.json").write_text("{}")
+    (kept[2] / "manifest.json").write_text("{}")
+
+    path = build_snapshot(logs_path, videos_path, str(root))
+
+    assert os.path.isfile(os.path.join(path, "manifest.json"))
+    assert not stale.exists()
+    for folder in kept:
+        assert (folder / "data.bin").exists()
+
+
+def test_round_trip_reproduces_state(dataset, tmp_path):
+    logs_path, videos_path = dataset
+    logs = load_dataset(logs_path, columns=LOG_COLUMNS)
+    videos = load_dataset(videos_path, columns=VIDEO_COLUMNS)
+    df_ranks, df_ranks_grouped = get_initial_info(logs, videos)
+    category_index = build_category_index(videos.df)
+    cube = build_time_popularity_cube([logs_path], videos.df)
+
+    snapshot = read_snapshot(
+        build_snapshot(logs_path, videos_path, str(tmp_path)), videos_path
+    )
+
+    pd.testing.assert_frame_equal(
+        snapshot.df_ranks.reset_index(drop=True),
+        df_ranks.reset_index(drop=True),
+        check_dtype=False,
+        check_categorical=False,
+    )
+    pd.testing.assert_frame_equal(
+        snapshot.df_ranks_grouped.reset_index(drop=True),
+        df_ranks_grouped.reset_index(drop=True),
+        check_dtype=False,
+        check_categorical=False,
+    )
+    pd.testing.assert_frame_equal(snapshot.videos.df, videos.df, check_dtype=False)
+    assert snapshot.videos.fingerprint == videos.fingerprint
+
+    np.testing.assert_array_equal(snapshot.category_index.order, category_index.order)
+    assert snapshot.category_index.offsets == category_index.offsets
+    category = category_index.categories[0]
+    np.testing.assert_array_equal(
+        snapshot.category_index.top_videos(category, 10),
+        category_index.top_videos(category, 10),
+    )
+
+    np.testing.assert_array_equal(snapshot.time_cube.counts, cube.counts)
+    assert snapshot.time_cube.regions.tolist() == cube.regions.tolist()
+    assert snapshot.time_cube.categories.tolist() == cube.categories.tolist()
+    pd.testing.assert_frame_equal(
+        snapshot.time_cube.top_categories(12, cube.regions[0]),
+        cube.top_categories(12, cube.regions[0]),
+    )
+
+    priors = build_region_priors(aggregate_watchtime_partials([logs_path], videos.df))
+    np.testing.assert_array_equal(snapshot.region_priors.ranks, priors.ranks)
+    assert snapshot.region_priors.regions.tolist() == priors.regions.tolist()
@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import stats_updates
+from popularity_index import build_category_index
+from stats_updates import StatsUpdater, get_stats_updater
+
+CATEGORIES = ["Юмор", "Спорт", "Музыка"]
+
+
+def make_catalog(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "video_id": [f"v{i}" for i in range(n)],
+            "category_id": rng.choice(CATEGORIES, n),
+            "cmments_per_day": rng.integers(0, 20, n).astype(np.float32),
+            "v_long_views_7_days": rng.integers(0, 1000, n).astype(np.int32),
+            "v_likes": rng.integers(0, 100, n).astype(np.int32),
+        }
+    )
+
+
+def make_delta(seed=1):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "video_id": [f"v{i}" for i in rng.choice(300, 40, replace=False)]
+            + ["нет в каталоге"],
+            "cmments_per_day": rng.integers(0, 40, 41).astype(np.float64),
+            "v_long_views_7_days": np.append(rng.integers(0, 10**6, 40), np.nan),
+            "v_likes": rng.integers(0, 10**10, 41),  # Не помещается в int32
+        }
+    )
+
+
+def assert_index_matches_rebuild(index, df_video):
+    rebuilt = build_category_index(df_video)
+    for category in CATEGORIES:
+        np.testing.assert_array_equal(
+            index.top_videos(category, 50), rebuilt.top_videos(category, 50)
+        )
+
+
+def test_apply_updates_columns_and_index():
+    df_video = make_catalog()
+    index = build_category_index(df_video)
+    delta = make_delta()
+    updater = StatsUpdater(df_video, index, "нет папки")
+
+    assert updater.apply(delta) == 40
+
+    positions = delta["video_id"].str[1:].iloc[:40].astype(int).to_numpy()
+    for column in ["cmments_per_day", "v_long_views_7_days", "v_likes"]:
+        np.testing.assert_array_equal(
+            df_video[column].to_numpy()[positions], delta[column].iloc[:40]
+        )
+    assert df_video["v_likes"].dtype == np.int64  # Колонка расширена
+    assert updater.version == 1
+    assert_index_matches_rebuild(index, df_video)
+
+
+def test_applied_deltas_survive_restart(tmp_path):
+    deltas = tmp_path / "deltas"
+    deltas.mkdir()
+    make_delta().to_parquet(deltas / "001.parquet")
+    state_path = str(tmp_path / "snapshot" / "stats")
+    expected = make_catalog()
+    StatsUpdater(
+        expected, build_category_index(expected), str(deltas), state_path
+    ).poll()
+
+    # Перезапуск: каталог и индекс снова из снимка
+    df_video = make_catalog()
+    index = build_category_index(df_video)
+    restored = StatsUpdater(df_video, index, str(deltas), state_path)
+
+    assert restored.pending() == []
+    pd.testing.assert_frame_equal(df_video, expected)
+    assert_index_matches_rebuild(index, df_video)
+
+    # Применяются только новые файлы
+    make_delta(seed=2).to_parquet(deltas / "002.parquet")
+    assert restored.pending() == ["002.parquet"]
+
+
+def test_new_snapshot_stops_previous_updater(tmp_path):
+    videos_path = str(tmp_path / "video_stat.parquet")
+
+    def snapshot(name):
+        df_video = make_catalog()
+        return SimpleNamespace(
+            path=str(tmp_path / name),
+            videos=SimpleNamespace(df=df_video, path=videos_path),
+            category_index=build_category_index(df_video),
+        )
+
+    first, second = snapshot("v1-a"), snapshot("v1-b")
+    old = get_stats_updater(first, first.path, interval=0.05)
+    new = get_stats_updater(second, second.path, interval=0.05)
+
+    assert old._thread is None and old._stop.is_set()
+    assert new._thread.is_alive()
+    assert stats_updates._RUNNING[f"{videos_path}.deltas"] is new
+    new.stop()
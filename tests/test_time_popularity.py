@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from time_popularity import TimePopularityCube
+
+CATEGORIES = ["Музыка", "Спорт", "Юмор"]
+
+
+def make_cube():
+    views = pd.DataFrame(
+        {
+            "region": ["Москва", "Москва", "Казань", "Казань", "Омск"],
+            "hour": [20, 20, 20, 20, 20],
+            "category_id": ["Спорт", "Юмор", "Музыка", "Юмор", "Спорт"],
+            "views": [500, 100, 300, 250, 30],
+        }
+    )
+    return TimePopularityCube.from_views(views, CATEGORIES)
+
+
+def test_top_categories_for_known_region():
+    top = make_cube().top_categories(20, "Казань", top_k=2)
+
+    assert top["category_id"].tolist() == ["Музыка", "Юмор"]
+    assert top["views"].tolist() == [300, 250]
+    np.testing.assert_allclose(top["share"], [300 / 550, 250 / 550])
+
+
+def test_unknown_region_falls_back_to_all_regions():
+    cube = make_cube()
+
+    top = cube.top_categories(20, "Тула", top_k=3)
+
+    # Просмотры всех регионов: Спорт 530, Юмор 350, Музыка 300
+    assert top["category_id"].tolist() == ["Спорт", "Юмор", "Музыка"]
+    assert top["views"].tolist() == [530, 350, 300]
+    pd.testing.assert_frame_equal(top, cube.top_categories(20, None, top_k=3))
+
+
+def test_region_with_few_views_falls_back():
+    cube = make_cube()
+
+    sparse = cube.top_categories(20, "Омск", top_k=1, min_views=100)
+    dense = cube.top_categories(20, "Омск", top_k=1, min_views=10)
+
+    # 30 просмотров меньше порога — берём просмотры всех регионов
+    assert sparse["category_id"].tolist() == ["Спорт"]
+    assert sparse["views"].tolist() == [530]
+    assert dense["views"].tolist() == [30]
+
+
+def test_save_and_load_keep_counts_and_fingerprint(tmp_path):
+    cube = make_cube()
+    cube.fingerprint = "logs:videos"
+    path = str(tmp_path / "cube.npz")
+
+    cube.save(path)
+    loaded = TimePopularityCube.load(path)
+
+    np.testing.assert_array_equal(loaded.counts, cube.counts)
+    assert loaded.regions.tolist() == cube.regions.tolist()
+    assert loaded.fingerprint == "logs:videos"
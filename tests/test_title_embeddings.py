@@ -0,0 +1,44 @@
+import json
+
+import pandas as pd
+
+from title_embeddings import build_title_index, load_title_index
+
+
+def test_similar_videos_stays_in_small_category(tmp_path):
+    # В категории "small" одна подкатегория, меньше nprobe
+    words = ["кот", "собака", "футбол", "новости", "рецепт", "музыка", "игра"]
+    titles = [f"{words[i % 7]} {words[(i // 7) % 7]} {i}" for i in range(400)]
+    df_video = pd.DataFrame(
+        {
+            "title": titles + ["кот футбол", "кот собака", "кот рецепт"],
+            "category_id": ["big"] * 400 + ["small"] * 3,
+        }
+    )
+    index = build_title_index(df_video, str(tmp_path / "titles"))
+    assert len(set(index.list_categories)) == 2
+
+    similar = index.similar_videos(400, k=10, nprobe=3)
+
+    assert sorted(similar.tolist()) == [401, 402]
+    assert (df_video["category_id"].to_numpy()[similar] == "small").all()
+
+
+def test_index_is_rebuilt_when_catalog_fingerprint_changes(tmp_path):
+    videos_path = str(tmp_path / "video_stat.parquet")
+    df_video = pd.DataFrame(
+        {"title": [f"кот {i}" for i in range(60)], "category_id": ["a"] * 60}
+    )
+
+    first = load_title_index(df_video, videos_path, "каталог-1")
+    with open(f"{videos_path}.titles/meta.json") as file:
+        assert json.load(file)["fingerprint"] == "каталог-1"
+    assert len(load_title_index(df_video, videos_path, "каталог-1").vectors) == 60
+
+    # Каталог с тем же путём, но другими строками
+    changed = pd.concat([df_video, df_video.head(10)], ignore_index=True)
+    second = load_title_index(changed, videos_path, "каталог-2")
+
+    assert len(first.vectors) == 60 and len(second.vectors) == 70
+    with open(f"{videos_path}.titles/meta.json") as file:
+        assert json.load(file)["fingerprint"] == "каталог-2"
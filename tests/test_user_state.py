@@ -0,0 +1,153 @@
+import gc
+
+import numpy as np
+import pandas as pd
+
+from popularity_index import SeenSet
+from recommendation_engine import CategoryWeights
+from user_state import UserState, UserStateStore
+
+PRIOR = pd.DataFrame({"category_id": ["Юмор", "Спорт", "Музыка"], "N": [5, 3, 2]})
+
+
+def make_state(user_id):
+    state = UserState(user_id, CategoryWeights(PRIOR), region="Москва")
+    state.seen.add([7, 3, 11])
+    return state
+
+
+def fill_until_evicted(store, user_id):
+    # Добавляем записи, пока запись user_id не будет вытеснена
+    for i in range(100):
+        store.put(make_state(f"other-{i}"))
+        if user_id not in store:
+            return
+    raise AssertionError("запись не вытеснена")
+
+
+def test_evicted_state_in_use_is_returned_instead_of_spilled_copy(tmp_path):
+    store = UserStateStore(max_bytes=5000, spill_path=str(tmp_path / "states.db"))
+    state = make_state("u1")
+    store.put(state)
+    fill_until_evicted(store, "u1")
+
+    # Запрос, который держит запись, меняет её уже после вытеснения
+    state.like(42)
+
+    restored = store.get("u1")
+    assert restored is state
+    assert restored.liked_positions == [42]
+    assert "u1" in store
+    store.close()
+
+
+def test_evicted_state_is_restored_from_spill(tmp_path):
+    store = UserStateStore(max_bytes=5000, spill_path=str(tmp_path / "states.db"))
+    state = make_state("u1")
+    state.weights.update("Спорт", "like")
+    state.like(42)
+    store.put(state)
+    fill_until_evicted(store, "u1")
+    del state
+    gc.collect()
+
+    restored = store.get("u1")
+    assert restored.user_id == "u1" and restored.region == "Москва"
+    assert restored.seen.positions.tolist() == [3, 7, 11]
+    assert restored.liked_positions == [42]
+    assert restored.weights.likes.tolist() == [0, 1, 0]
+    store.close()
+
+
+def test_evicted_state_without_spill_is_dropped():
+    store = UserStateStore(max_bytes=5000)
+    store.put(make_state("u1"))
+    fill_until_evicted(store, "u1")
+    gc.collect()
+    assert store.get("u1") is None
+
+
+def test_seen_set_limit_drops_oldest_positions():
+    seen = SeenSet(limit=3)
+    seen.add([5, 1, 2])
+    seen.add([1, 7, 7])
+
+    assert seen.order.tolist() == [1, 2, 7]
+    assert seen.positions.tolist() == [1, 2, 7]
+    assert seen.contains(np.array([5, 7])).tolist() == [False, True]
+
+
+def test_seen_order_survives_serialization():
+    state = make_state("u1")
+    state.seen.add([2, 100])
+
+    restored = UserState.from_bytes(state.to_bytes())
+
+    assert restored.seen.order.tolist() == [7, 3, 11, 2, 100]
+    assert restored.seen.positions.tolist() == [2, 3, 7, 11, 100]
+    assert restored.seen.limit == state.seen.limit
+
+
+def test_user_state_round_trip():
+    state = make_state("пользователь-1")
+    state.weights.update("Юмор", "comment")
+    state.weights.update("Спорт", "dislike")
+    state.last_slate = np.array([11, 4, 9], dtype=np.int32)
+    state.like(4)
+    state.like(9)
+
+    restored = UserState.from_bytes(state.to_bytes())
+
+    assert restored.user_id == state.user_id
+    assert restored.region == state.region
+    assert restored.weights.categories.tolist() == ["Юмор", "Спорт", "Музыка"]
+    for name in ("weights", "likes", "dislikes"):
+        np.testing.assert_array_equal(
+            getattr(restored.weights, name), getattr(state.weights, name)
+        )
+    np.testing.assert_array_equal(restored.seen.positions, state.seen.positions)
+    np.testing.assert_array_equal(restored.last_slate, state.last_slate)
+    assert restored.liked_positions == [4, 9]
+    assert restored.last_liked_position == 9
+    # Восстановленные веса продолжают обновляться
+    restored.weights.update("Музыка", "like")
+    assert restored.weights.likes.tolist() == [0, 0, 1]
+    assert restored.weights.recommend()["N"].sum() == 10
+
+
+def test_spilled_positions_follow_catalog_changes(tmp_path):
+    spill_path = str(tmp_path / "states.db")
+    old_codes = np.array([10, 11, 12, 13, 14], dtype=np.int32)
+    store = UserStateStore(spill_path=spill_path, video_codes=old_codes)
+    state = make_state("u1")
+    state.seen = SeenSet([0, 2, 4], limit=state.seen.limit)
+    state.last_slate = np.array([4, 2], dtype=np.int32)
+    state.like(2)
+    state.like(3)
+    store.put(state)
+    store.close()
+
+    # Новый каталог: строки переставлены, видео 13 и 14 удалены
+    new_codes = np.array([12, 15, 10, 11], dtype=np.int32)
+    store = UserStateStore(spill_path=spill_path, video_codes=new_codes)
+    restored = store.get("u1")
+    store.close()
+
+    assert restored.seen.order.tolist() == [2, 0]  # Коды 10 и 12
+    assert restored.last_slate.tolist() == [0]
+    assert restored.liked_positions == [0]
+    assert restored.last_liked_position is None  # Видео 13 удалено
+
+
+def test_set_catalog_remaps_states_in_memory():
+    store = UserStateStore(video_codes=np.array([10, 11, 12], dtype=np.int32))
+    state = make_state("u1")
+    state.seen = SeenSet([0, 1], limit=state.seen.limit)
+    state.like(1)
+    store.put(state)
+
+    store.set_catalog(np.array([11, 10], dtype=np.int32))
+
+    assert store.get("u1") is state
+    assert state.seen.order.tolist() == [1, 0]
+    assert state.last_liked_position == 0